@@ -32,19 +32,23 @@ class BaseMarketAgent(ABC):
         data = context.get("data", {})
         return all(field in data and data[field] for field in required_fields)
     
-    async def register_with_core(self, core_url: str = "http://localhost:8000"):
+    async def register_with_core(self, core_url: str = "http://localhost:8000/api/v1"):
         """Registrar agente con chatbot-ingestor-core"""
         if not self.core_connector:
             from integrations.core_connector import CoreConnector
             self.core_connector = CoreConnector(core_url)
         
         trigger_condition = self.config.get("trigger_condition")
-        endpoint = f"{core_url}/agents/{self.name}/execute"
+        # El core invoca al agente en la API de análisis, no en su propia URL
+        endpoint = self.config.get("endpoint") or f"http://localhost:8001/agents/{self.name}/execute"
         
         await self.core_connector.register_agent(
             agent_name=self.name,
             trigger_condition=trigger_condition,
-            endpoint=endpoint
+            endpoint=endpoint,
+            batch_endpoint=self.config.get("batch_endpoint"),
+            delta=self.config.get("delta", False),
+            required_fields=self.config.get("required_fields")
         )
     
     async def update_context_results(self, session_id: str, results: Dict[str, Any]):
@@ -0,0 +1,23 @@
+"""Instancias de los agentes que el core puede invocar (por HTTP o en su mismo proceso)"""
+from typing import Dict
+import os
+
+from configs.agent_configs import AGENT_CONFIGS
+from agents.base_agent import BaseMarketAgent
+from agents.primary_analysis.primary_agent import PrimaryAnalysisAgent
+from agents.secondary_analysis.secondary_agent import SecondaryAnalysisAgent
+from agents.report_generator.report_agent import ReportGeneratorAgent
+
+AGENT_CLASSES = {
+    "primary_analysis": PrimaryAnalysisAgent,
+    "secondary_analysis": SecondaryAnalysisAgent,
+    "report_generator": ReportGeneratorAgent
+}
+
+def create_agent(agent_name: str) -> BaseMarketAgent:
+    """Crear un agente con su configuración y las claves de los proveedores de IA"""
+    return AGENT_CLASSES[agent_name]({
+        **AGENT_CONFIGS[agent_name],
+        "openai_api_key": os.getenv("OPENAI_API_KEY"),
+        "anthropic_api_key": os.getenv("ANTHROPIC_API_KEY")
+    })
@@ -1,69 +1,223 @@
 """API para integración con chatbot-ingestor-core"""
-from fastapi import FastAPI, WebSocket, HTTPException
-from typing import Dict, Any
-import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, WebSocket, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ValidationError
+from typing import Dict, Any, List
 import asyncio
+import os
 from datetime import datetime
 
 from configs.app_config import load_config
+from agents.base_agent import BaseMarketAgent
+from agents.factory import AGENT_CLASSES, create_agent
 from agents.market_orchestrator.orchestrator_agent import MarketOrchestratorAgent
+from integrations.http_client import get_shared_pool
+from utils import wire
+from utils.compression import CompressionMiddleware
+from utils.context_cache import ContextCache
+from utils.exceptions import ContextVersionMismatch
+from utils.session_store import create_session_store
 
-app = FastAPI(title="Market Analysis API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Abrir y cerrar el pool HTTP compartido y el almacén de sesiones con la app"""
+    http_client = get_shared_pool()
+    await http_client.start()
+    await session_store.start()
+    try:
+        yield
+    finally:
+        await session_store.close()
+        await http_client.close()
+
+app = FastAPI(title="Market Analysis API", lifespan=lifespan, default_response_class=ORJSONResponse)
+# Los resultados de agentes en JSON pueden ocupar cientos de KB; el formato
+# MessagePack+zstd ya viene comprimido y el middleware lo deja pasar tal cual
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024")),
+    gzip_level=int(os.getenv("RESPONSE_GZIP_LEVEL", "6")),
+    brotli_quality=int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+)
 config = load_config()
 orchestrator = MarketOrchestratorAgent(config)
 
-# Almacenamiento temporal de sesiones
-sessions: Dict[str, Dict[str, Any]] = {}
+# Sesiones con caducidad; fuera de memoria se comparten entre workers y sobreviven a reinicios
+session_store = create_session_store(
+    config["sessions"]["store_url"],
+    ttl=config["sessions"]["ttl"],
+    max_size=config["sessions"]["max_size"]
+)
+
+# Agentes invocables por el core; se instancian bajo demanda
+_agents: Dict[str, BaseMarketAgent] = {}
+
+# Últimos contextos recibidos por (agente, sesión): el core puede enviar solo deltas
+context_cache = ContextCache(max_size=int(os.getenv("CONTEXT_CACHE_SIZE", "1024")))
+
+class AgentBatchRequest(BaseModel):
+    """Lote de contextos para un mismo agente"""
+    contexts: List[Dict[str, Any]]
+
+def get_agent(agent_name: str) -> BaseMarketAgent:
+    """Obtener (o crear) la instancia de un agente"""
+    if agent_name not in AGENT_CLASSES:
+        raise HTTPException(status_code=404, detail="Agente no encontrado")
+    
+    if agent_name not in _agents:
+        _agents[agent_name] = create_agent(agent_name)
+    return _agents[agent_name]
+
+def _dump_result(result: Any) -> Dict[str, Any]:
+    """Serializar AgentResult (o dict) para la respuesta"""
+    return result.model_dump() if hasattr(result, "model_dump") else result
+
+async def read_payload(request: Request) -> Any:
+    """Leer el cuerpo en JSON o MessagePack (opcionalmente zstd)"""
+    content_type = request.headers.get("content-type", wire.JSON).split(";")[0].strip()
+    if not wire.supports(content_type):
+        raise HTTPException(status_code=415, detail=f"Formato no soportado: {content_type}")
+    try:
+        return wire.decode(await request.body(), content_type, request.headers.get("content-encoding"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Cuerpo inválido: {str(e)}")
+
+def wire_response(request: Request, data: Any) -> Response:
+    """Responder en el formato que prefiera el cliente (Accept / Accept-Encoding)"""
+    content_type, compress = wire.negotiate(request.headers.get("accept"), request.headers.get("accept-encoding"))
+    body, headers = wire.encode(data, content_type, compress)
+    # Anunciar las codificaciones que aceptamos en peticiones (RFC 7694)
+    headers["Accept-Encoding"] = wire.accept_encoding_header()
+    return Response(content=body, media_type=headers.pop("Content-Type"), headers=headers)
+
+@app.post("/agents/{agent_name}/execute")
+async def execute_agent(agent_name: str, request: Request):
+    """Ejecutar un agente con el contexto de una sesión"""
+    agent = get_agent(agent_name)
+    try:
+        context = context_cache.resolve(agent_name, await read_payload(request))
+    except ContextVersionMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    result = await agent.execute(context)
+    return wire_response(request, _dump_result(result))
+
+@app.post("/agents/{agent_name}/execute_batch")
+async def execute_agent_batch(agent_name: str, request: Request):
+    """Ejecutar un agente sobre un lote de contextos
+    
+    Los contextos idénticos del lote se ejecutan una sola vez y comparten resultado.
+    Los deltas cuya base no está en caché se rechazan con status 409 por elemento.
+    """
+    agent = get_agent(agent_name)
+    try:
+        batch = AgentBatchRequest.model_validate(await read_payload(request))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    positions: Dict[str, int] = {}
+    distinct: List[Dict[str, Any]] = []
+    order = []
+    for payload in batch.contexts:
+        try:
+            context = context_cache.resolve(agent_name, payload)
+        except ContextVersionMismatch as e:
+            order.append(e)
+            continue
+        key = wire.dumps(context, sort_keys=True)
+        if key not in positions:
+            positions[key] = len(distinct)
+            distinct.append(context)
+        order.append(positions[key])
+    
+    outcomes = await asyncio.gather(*(agent.execute(context) for context in distinct), return_exceptions=True)
+    items = [
+        {"ok": False, "error": str(outcome)} if isinstance(outcome, Exception) else {"ok": True, "result": _dump_result(outcome)}
+        for outcome in outcomes
+    ]
+    results = [
+        {"ok": False, "error": str(i), "status": 409} if isinstance(i, ContextVersionMismatch) else items[i]
+        for i in order
+    ]
+    return wire_response(request, {"results": results})
 
 @app.post("/sessions")
 async def create_session():
     """Crear nueva sesión de análisis"""
-    session_id = f"session_{datetime.now().timestamp()}"
-    sessions[session_id] = {
+    session_id = await session_store.create({
         "status": "created",
         "created_at": datetime.now().isoformat(),
         "context": {}
-    }
+    })
     return {"session_id": session_id}
 
 @app.get("/sessions/{session_id}")
 async def get_session(session_id: str):
     """Obtener estado de la sesión"""
-    if session_id not in sessions:
+    session = await session_store.get(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Sesión no encontrada")
-    return sessions[session_id]
+    return session
+
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas operativas de la API"""
+    return {
+        "http_pool": get_shared_pool().stats(),
+        "context_cache": context_cache.stats(),
+        "sessions": session_store.stats()
+    }
 
 @app.websocket("/chat/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
     """Endpoint WebSocket para chat en tiempo real"""
     await websocket.accept()
     
-    if session_id not in sessions:
+    session = await session_store.get(session_id)
+    if session is None:
         await websocket.close(code=4004, reason="Sesión no encontrada")
         return
     
+    close_code, close_reason = 1000, None
     try:
         while True:
             # Recibir mensaje del core
             message = await websocket.receive_text()
-            data = json.loads(message)
+            data = wire.loads(message)
             
-            # Actualizar contexto de la sesión
-            sessions[session_id]["context"].update(data.get("context", {}))
+            # Actualizar contexto de la sesión de forma atómica: otro worker pudo modificarla
+            def merge(stored: Dict[str, Any]) -> Dict[str, Any]:
+                stored["context"].update(data.get("context", {}))
+                return stored
+            
+            session = await session_store.update(session_id, merge)
+            if session is None:
+                close_code, close_reason = 4004, "Sesión caducada"
+                break
             
             # Ejecutar análisis
-            result = await orchestrator.execute(sessions[session_id]["context"])
+            result = await orchestrator.execute(session["context"])
             
             # Enviar resultado al core
-            await websocket.send_json({
+            await websocket.send_text(wire.dumps({
                 "type": "analysis_result",
                 "data": result
-            })
+            }).decode("utf-8"))
             
     except Exception as e:
-        await websocket.send_json({
+        await websocket.send_text(wire.dumps({
             "type": "error",
             "message": str(e)
-        })
+        }).decode("utf-8"))
     finally:
-        await websocket.close() 
\ No newline at end of file
+        await websocket.close(code=close_code, reason=close_reason)
+
+if __name__ == "__main__":
+    import uvicorn
+    
+    uvicorn.run(
+        app,
+        host=config["api"]["host"],
+        port=config["api"]["port"],
+        uds=config["api"]["uds"]
+    )
\ No newline at end of file
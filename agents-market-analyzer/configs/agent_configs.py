@@ -1,4 +1,18 @@
 """Configuraciones para los agentes de Market Analyzer"""
+from typing import Dict, Optional
+import os
+
+# "inprocess" cuando el core y el analizador comparten proceso: el core enlaza
+# los agentes con `bind_local_agents` y los invoca sin HTTP (y sin lotes)
+AGENT_TRANSPORT = os.getenv("AGENT_TRANSPORT", "http")
+
+def _endpoints(agent_name: str) -> Dict[str, Optional[str]]:
+    if AGENT_TRANSPORT == "inprocess":
+        return {"endpoint": f"inprocess://{agent_name}", "batch_endpoint": None}
+    return {
+        "endpoint": f"http://localhost:8001/agents/{agent_name}/execute",
+        "batch_endpoint": f"http://localhost:8001/agents/{agent_name}/execute_batch"
+    }
 
 AGENT_CONFIGS = {
     "primary_analysis": {
@@ -11,7 +25,8 @@ AGENT_CONFIGS = {
             "completion_threshold": 0.8,
             "required_fields_present": True
         },
-        "endpoint": "http://localhost:8001/agents/primary_analysis/execute"
+        **_endpoints("primary_analysis"),
+        "delta": True
     },
     "secondary_analysis": {
         "ai_provider": "anthropic", 
@@ -23,7 +38,8 @@ AGENT_CONFIGS = {
             "depends_on": ["primary_analysis"],
             "primary_analysis_complete": True
         },
-        "endpoint": "http://localhost:8001/agents/secondary_analysis/execute"
+        **_endpoints("secondary_analysis"),
+        "delta": True
     },
     "report_generator": {
         "ai_provider": "openai",
@@ -35,6 +51,7 @@ AGENT_CONFIGS = {
             "depends_on": ["primary_analysis", "secondary_analysis"],
             "all_analyses_complete": True
         },
-        "endpoint": "http://localhost:8001/agents/report_generator/execute"
+        **_endpoints("report_generator"),
+        "delta": True
     }
 } 
\ No newline at end of file
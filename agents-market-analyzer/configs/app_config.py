@@ -12,9 +12,18 @@ def load_config() -> Dict[str, Any]:
         },
         "api": {
             "host": os.getenv("API_HOST", "0.0.0.0"),
-            "port": int(os.getenv("API_PORT", "8000")),
+            # 8000 es el core, que espera los agentes en 8001 (ver configs/agent_configs.py)
+            "port": int(os.getenv("API_PORT", "8001")),
+            # Socket Unix (p. ej. /run/analyzer.sock); si se define sustituye a host/puerto
+            "uds": os.getenv("API_UDS"),
             "debug": os.getenv("API_DEBUG", "true").lower() == "true"
         },
+        "sessions": {
+            # memory:// (un solo worker), sqlite:///data/sessions.db (workers del mismo host) o redis://...
+            "store_url": os.getenv("SESSION_STORE_URL", "memory://"),
+            "ttl": float(os.getenv("SESSION_TTL", "86400")),
+            "max_size": int(os.getenv("SESSION_STORE_MAX_SIZE", "10000"))
+        },
         "storage": {
             "path": os.getenv("STORAGE_PATH", "data"),
             "version": "1.0"
@@ -24,6 +33,13 @@ def load_config() -> Dict[str, Any]:
             "api_key": os.getenv("MARKET_DATA_API_KEY", ""),
             "timeout": int(os.getenv("MARKET_DATA_TIMEOUT", "30"))
         },
+        "http": {
+            "limit": int(os.getenv("HTTP_POOL_LIMIT", "100")),
+            "limit_per_host": int(os.getenv("HTTP_POOL_PER_HOST", "20")),
+            "keepalive_timeout": float(os.getenv("HTTP_KEEPALIVE", "30")),
+            "total_timeout": float(os.getenv("HTTP_TIMEOUT", "60")),
+            "connect_timeout": float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+        },
         "ai": {
             "provider": os.getenv("AI_PROVIDER", "openai"),
             "model": os.getenv("AI_MODEL", "gpt-4"),
@@ -1,72 +1,117 @@
 import aiohttp
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
+from integrations.http_client import HTTPClientPool, get_shared_pool
+from utils import wire
+from utils.context_cache import ContextCache
+from utils.jsonpatch import apply_patch
+
 class CoreConnector:
     """Conector para comunicación con chatbot-ingestor-core"""
     
-    def __init__(self, core_api_url: str = "http://localhost:8000"):
+    def __init__(self, core_api_url: str = "http://localhost:8000/api/v1", http_client: Optional[HTTPClientPool] = None):
         self.core_api_url = core_api_url
-        self._session: Optional[aiohttp.ClientSession] = None
+        self.http_client = http_client or get_shared_pool()
+        # Última versión recibida de cada sesión, para pedir solo los cambios
+        self._contexts = ContextCache(max_size=256)
     
     async def __aenter__(self):
-        self._session = aiohttp.ClientSession()
+        await self.http_client.start()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self._session:
-            await self._session.close()
+        # Las conexiones vuelven al pool compartido; quien lo creó lo cierra
+        pass
+    
+    async def _target(self, path: str) -> Tuple[aiohttp.ClientSession, str]:
+        """Sesión del pool compartido y URL final (TCP o socket Unix según `core_api_url`)"""
+        return await self.http_client.session_for(f"{self.core_api_url}{path}")
+    
+    def _headers(self) -> Dict[str, str]:
+        """Negociar MessagePack/zstd con el core; JSON si no lo soporta"""
+        return {"Accept": wire.accept_header(), "Accept-Encoding": wire.accept_encoding_header()}
     
-    async def register_agent(self, agent_name: str, trigger_condition: Dict[str, Any], endpoint: str):
-        """Registrar agente con el AgentOrchestrator del core"""
-        if not self._session:
-            self._session = aiohttp.ClientSession()
-            
-        async with self._session.post(
-            f"{self.core_api_url}/agents/register",
+    async def _read(self, response: aiohttp.ClientResponse) -> Any:
+        """Decodificar la respuesta según su Content-Type/Content-Encoding"""
+        return wire.decode(await response.read(), response.content_type, response.headers.get("Content-Encoding"))
+    
+    async def register_agent(self, agent_name: str, trigger_condition: Dict[str, Any], endpoint: str, batch_endpoint: Optional[str] = None, delta: bool = False, required_fields: Optional[List[str]] = None):
+        """Registrar agente con el AgentOrchestrator del core (registro persistente)"""
+        session, url = await self._target("/agents/register")
+        
+        async with session.post(
+            url,
             json={
                 "name": agent_name,
                 "trigger_condition": trigger_condition,
-                "endpoint": endpoint
-            }
+                "endpoint": endpoint,
+                "required_fields": required_fields,
+                "batch_endpoint": batch_endpoint,
+                "delta": delta
+            },
+            headers=self._headers()
         ) as response:
-            return await response.json()
+            return await self._read(response)
+    
+    async def get_context(self, session_id: str, since: Optional[int] = None) -> Dict[str, Any]:
+        """Obtener contexto actual de una sesión
+        
+        Si ya se tiene una versión (`since` o la última recibida), el core responde
+        solo con un JSON Patch que se aplica aquí; devuelve siempre el contexto completo.
+        """
+        cached = self._contexts.get(session_id)
+        if since is None and cached is not None:
+            since = cached[0]
+        
+        status, body = await self._fetch_context(session_id, since)
+        if status != 200 or not isinstance(body, dict):
+            return body
+        if "patch" in body:
+            if cached is not None and cached[0] == body["base_version"]:
+                body = apply_patch(cached[1], body["patch"])
+            else:
+                # Sin la versión base no se puede aplicar: pedir el contexto completo
+                status, body = await self._fetch_context(session_id, None)
+                if status != 200:
+                    return body
+        self._contexts.put(session_id, body.get("context_version"), body)
+        return body
     
-    async def get_context(self, session_id: str) -> Dict[str, Any]:
-        """Obtener contexto actual de una sesión"""
-        if not self._session:
-            self._session = aiohttp.ClientSession()
-            
-        async with self._session.get(
-            f"{self.core_api_url}/sessions/{session_id}"
+    async def _fetch_context(self, session_id: str, since: Optional[int]) -> Tuple[int, Any]:
+        session, url = await self._target(f"/sessions/{session_id}")
+        async with session.get(
+            url,
+            params={"since": since} if since is not None else None,
+            headers=self._headers()
         ) as response:
-            return await response.json()
+            return response.status, await self._read(response)
     
     async def update_agent_results(self, session_id: str, agent_name: str, results: Dict[str, Any]):
         """Actualizar contexto con resultados del agente"""
-        if not self._session:
-            self._session = aiohttp.ClientSession()
-            
-        async with self._session.patch(
-            f"{self.core_api_url}/sessions/{session_id}/agent_results",
+        session, url = await self._target(f"/sessions/{session_id}/agent_results")
+        
+        async with session.patch(
+            url,
             json={
                 "agent_name": agent_name,
                 "results": results
-            }
+            },
+            headers=self._headers()
         ) as response:
-            return await response.json()
+            return await self._read(response)
     
     async def notify_completion(self, session_id: str, agent_name: str, status: str):
         """Notificar al core que el agente terminó"""
-        if not self._session:
-            self._session = aiohttp.ClientSession()
-            
-        async with self._session.post(
-            f"{self.core_api_url}/sessions/{session_id}/agent_status",
+        session, url = await self._target(f"/sessions/{session_id}/agent_status")
+        
+        async with session.post(
+            url,
             json={
                 "agent_name": agent_name,
                 "status": status,
                 "completed_at": datetime.now().isoformat()
-            }
+            },
+            headers=self._headers()
         ) as response:
-            return await response.json() 
\ No newline at end of file
+            return await self._read(response) 
\ No newline at end of file
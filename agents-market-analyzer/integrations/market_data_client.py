@@ -3,27 +3,29 @@ from typing import Dict, Any, List, Optional
 import aiohttp
 from datetime import datetime
 
+from integrations.http_client import HTTPClientPool, get_shared_pool
 from utils.exceptions import DataSourceError
 from utils.logger import AppLogger
 
 class MarketDataClient:
     """Cliente para acceder a fuentes de datos de mercado"""
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], http_client: Optional[HTTPClientPool] = None):
         """Inicializa el cliente"""
         self.config = config
         self.logger = AppLogger(__name__)
+        self.http_client = http_client or get_shared_pool()
         self.session: Optional[aiohttp.ClientSession] = None
     
     async def __aenter__(self):
         """Context manager entry"""
-        self.session = aiohttp.ClientSession()
+        self.session = await self.http_client.get_session()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Context manager exit"""
-        if self.session:
-            await self.session.close()
+        # La sesión pertenece al pool compartido; solo se suelta la referencia
+        self.session = None
     
     async def get_market_data(self, market_id: str, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
         """Obtiene datos de mercado"""
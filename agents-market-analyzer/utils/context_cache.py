@@ -0,0 +1,68 @@
+"""Caché de contextos de sesión recibidos del core, base para aplicar deltas"""
+from typing import Any, Dict, Hashable, Optional, Tuple
+from collections import OrderedDict
+
+from utils.exceptions import ContextVersionMismatch
+from utils.jsonpatch import apply_patch
+
+class ContextCache:
+    """Último contexto conocido por clave, junto con su versión o huella"""
+    
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[Any, Dict[str, Any]]]" = OrderedDict()
+        self.counters = {"full": 0, "delta": 0, "mismatches": 0}
+    
+    def get(self, key: Hashable) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """(versión, contexto) guardados para `key`, o None"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+    
+    def put(self, key: Hashable, version: Any, context: Dict[str, Any]):
+        self._entries[key] = (version, context)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def resolve(self, agent_name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Reconstruir el contexto completo a partir de lo que envió el core
+        
+        - Contexto completo con `context_digest`: se guarda y se devuelve.
+        - `context_delta`: se aplica el patch sobre el contexto en caché; si la
+          base no coincide se lanza ContextVersionMismatch (el core reenvía completo).
+        - Cualquier otro cuerpo se devuelve tal cual.
+        Los agentes no deben mutar el contexto devuelto: es la base del siguiente delta.
+        """
+        delta = payload.get("context_delta")
+        if delta is not None:
+            key = (agent_name, payload.get("session_id"))
+            entry = self.get(key)
+            if entry is not None and entry[0] == delta["digest"]:
+                # Reenvío de un delta ya aplicado (p. ej. petición duplicada)
+                return entry[1]
+            if entry is None or entry[0] != delta["base_digest"]:
+                self.counters["mismatches"] += 1
+                raise ContextVersionMismatch(f"Contexto base no disponible para {key[1]}")
+            
+            try:
+                context = apply_patch(entry[1], delta["patch"])
+            except ValueError as e:
+                self._entries.pop(key, None)
+                self.counters["mismatches"] += 1
+                raise ContextVersionMismatch(str(e))
+            self.counters["delta"] += 1
+            self.put(key, delta["digest"], context)
+            return context
+        
+        if "context_digest" in payload and payload.get("session_id"):
+            context = {k: v for k, v in payload.items() if k != "context_digest"}
+            self.counters["full"] += 1
+            self.put((agent_name, context["session_id"]), payload["context_digest"], context)
+            return context
+        
+        return payload
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "max_size": self.max_size, **self.counters}
\ No newline at end of file
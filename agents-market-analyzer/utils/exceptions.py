@@ -22,4 +22,8 @@ class DataSourceError(MarketAnalysisError):
 
 class AgentError(MarketAnalysisError):
     """Error en ejecución de agente"""
-    pass 
\ No newline at end of file
+    pass
+
+class ContextVersionMismatch(IntegrationError):
+    """Delta de contexto sobre una versión que no está en caché"""
+    pass
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""JSON Patch (RFC 6902) para aplicar los deltas de contexto que envía el core"""
+# Duplicado en chatbot-ingestor-core/core/jsonpatch.py (los proyectos se despliegan por
+# separado y no comparten paquete): cualquier cambio debe llevarse a ambas copias
+from typing import Any, Dict, List
+import copy
+
+Patch = List[Dict[str, Any]]
+
+def _escape(key: str) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+def make_patch(old: Any, new: Any, path: str = "") -> Patch:
+    """Operaciones JSON Patch (RFC 6902) que transforman `old` en `new`
+    
+    Los diccionarios se comparan clave a clave; listas y escalares distintos
+    se reemplazan enteros.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops: Patch = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                ops.extend(make_patch(old[key], value, child))
+        return ops
+    
+    if old == new and type(old) is type(new):
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
+
+def apply_patch(document: Any, patch: Patch) -> Any:
+    """Aplicar un JSON Patch (add/remove/replace) sobre una copia del documento"""
+    document = copy.deepcopy(document)
+    for op in patch:
+        kind = op.get("op")
+        if kind not in ("add", "remove", "replace"):
+            raise ValueError(f"Operación de patch no soportada: {kind}")
+        
+        value = copy.deepcopy(op.get("value"))
+        if op["path"] == "":
+            if kind == "remove":
+                raise ValueError("No se puede eliminar la raíz del documento")
+            document = value
+            continue
+        
+        *parents, last = [_unescape(token) for token in op["path"].split("/")[1:]]
+        target = document
+        try:
+            for token in parents:
+                target = target[int(token)] if isinstance(target, list) else target[token]
+            if isinstance(target, list):
+                index = len(target) if last == "-" else int(last)
+                if kind == "add":
+                    target.insert(index, value)
+                elif kind == "remove":
+                    del target[index]
+                else:
+                    target[index] = value
+            elif kind == "remove":
+                del target[last]
+            elif kind == "replace" and last not in target:
+                raise KeyError(last)
+            else:
+                target[last] = value
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            raise ValueError(f"Ruta de patch inválida: {op['path']}") from e
+    return document
\ No newline at end of file
@@ -0,0 +1,329 @@
+"""Almacenamiento de sesiones de la API de análisis (memoria LRU, SQLite o Redis) con TTL"""
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import sqlite3
+import time
+import uuid
+
+from utils import wire
+
+# Redis es opcional: sin él solo están disponibles los almacenes en memoria y SQLite
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import WatchError
+except ImportError:
+    aioredis = None
+    WatchError = None
+
+# Una sesión se modifica con `update(session_id, fn)`: `fn` recibe la sesión
+# guardada y devuelve la nueva, sin que otro worker escriba entremedias
+Updater = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+def new_session_id() -> str:
+    """Identificador único aunque se creen sesiones a la vez en varios workers"""
+    return f"session_{uuid.uuid4().hex}"
+
+class SessionStore(ABC):
+    """Sesiones por id con caducidad deslizante: cada lectura o escritura renueva el TTL"""
+    
+    def __init__(self, ttl: float = 86400.0):
+        self.ttl = ttl
+        self.counters = {"hits": 0, "misses": 0, "writes": 0, "expired": 0, "evicted": 0}
+    
+    async def start(self):
+        """Abrir conexiones (no-op si el backend no las necesita)"""
+        pass
+    
+    async def close(self):
+        pass
+    
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Sesión guardada o None si no existe o caducó"""
+        pass
+    
+    @abstractmethod
+    async def put(self, session_id: str, session: Dict[str, Any]):
+        pass
+    
+    @abstractmethod
+    async def update(self, session_id: str, fn: Updater) -> Optional[Dict[str, Any]]:
+        """Leer, modificar con `fn` y guardar de forma atómica
+        
+        Devuelve la sesión nueva, o None si no existe o caducó (sin crearla).
+        """
+        pass
+    
+    @abstractmethod
+    async def delete(self, session_id: str):
+        pass
+    
+    async def create(self, session: Dict[str, Any]) -> str:
+        session_id = new_session_id()
+        await self.put(session_id, session)
+        return session_id
+    
+    def _count(self, session: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        self.counters["hits" if session is not None else "misses"] += 1
+        return session
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "ttl": self.ttl, **self.counters}
+
+class MemorySessionStore(SessionStore):
+    """Sesiones en el proceso, acotadas en número: válido con un solo worker
+    
+    Como cada acceso renueva el TTL y mueve la sesión al final, el orden LRU es
+    también el de caducidad: las caducadas se retiran siempre por el principio.
+    """
+    
+    def __init__(self, ttl: float = 86400.0, max_size: int = 10000):
+        super().__init__(ttl)
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+    
+    def _expire(self, now: float):
+        while self._entries:
+            session_id, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                return
+            del self._entries[session_id]
+            self.counters["expired"] += 1
+    
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return self._count(None)
+        self._entries[session_id] = (now + self.ttl, entry[1])
+        self._entries.move_to_end(session_id)
+        return self._count(entry[1])
+    
+    async def put(self, session_id: str, session: Dict[str, Any]):
+        now = time.monotonic()
+        self._expire(now)
+        self._entries[session_id] = (now + self.ttl, session)
+        self._entries.move_to_end(session_id)
+        self.counters["writes"] += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.counters["evicted"] += 1
+    
+    async def update(self, session_id: str, fn: Updater) -> Optional[Dict[str, Any]]:
+        # Sin `await` entre la lectura y la escritura: atómico dentro del proceso
+        session = await self.get(session_id)
+        if session is None:
+            return None
+        session = fn(session)
+        await self.put(session_id, session)
+        return session
+    
+    async def delete(self, session_id: str):
+        self._entries.pop(session_id, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "size": len(self._entries), "max_size": self.max_size}
+
+class SQLiteSessionStore(SessionStore):
+    """Sesiones en un fichero SQLite local: sobreviven a reinicios y no ocupan memoria
+    
+    En modo WAL varios workers del mismo host comparten el fichero. Las
+    consultas se ejecutan en un hilo propio para no bloquear el event loop, y
+    las sesiones caducadas se purgan cada `purge_interval` segundos.
+    """
+    
+    def __init__(self, path: str = "data/sessions.db", ttl: float = 86400.0, purge_interval: float = 60.0):
+        super().__init__(ttl)
+        self.path = path
+        self.purge_interval = purge_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-store")
+        self._db: Optional[sqlite3.Connection] = None
+        self._purger: Optional[asyncio.Task] = None
+    
+    async def _run(self, fn, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+    
+    def _open(self):
+        if self._db is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA busy_timeout=5000")
+        db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+        self._db = db
+    
+    async def start(self):
+        await self._run(self._open)
+        if self.purge_interval and self._purger is None:
+            self._purger = asyncio.create_task(self._purge_loop())
+    
+    async def close(self):
+        if self._purger is not None:
+            self._purger.cancel()
+            try:
+                await self._purger
+            except asyncio.CancelledError:
+                pass
+            self._purger = None
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+    
+    def _get(self, session_id: str) -> Optional[bytes]:
+        self._open()
+        # Tiempo de reloj (no monotónico): el fichero se comparte entre procesos
+        now = time.time()
+        row = self._db.execute("SELECT data FROM sessions WHERE id = ? AND expires_at > ?", (session_id, now)).fetchone()
+        if row is None:
+            return None
+        self._db.execute("UPDATE sessions SET expires_at = ? WHERE id = ?", (now + self.ttl, session_id))
+        return row[0]
+    
+    def _put(self, session_id: str, data: bytes):
+        self._open()
+        self._db.execute(
+            "INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+            (session_id, data, time.time() + self.ttl)
+        )
+    
+    def _update(self, session_id: str, fn: Updater) -> Optional[Dict[str, Any]]:
+        self._open()
+        # BEGIN IMMEDIATE toma el bloqueo de escritura antes de leer: otro
+        # proceso con el mismo fichero no puede escribir la sesión entremedias
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = self._db.execute("SELECT data FROM sessions WHERE id = ? AND expires_at > ?", (session_id, now)).fetchone()
+            if row is None:
+                self._db.execute("COMMIT")
+                return None
+            session = fn(wire.loads(row[0]))
+            self._db.execute("UPDATE sessions SET data = ?, expires_at = ? WHERE id = ?", (wire.dumps(session), now + self.ttl, session_id))
+            self._db.execute("COMMIT")
+            return session
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+    
+    def _delete(self, session_id: str):
+        self._open()
+        self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+    
+    def _purge(self) -> int:
+        self._open()
+        return self._db.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+    
+    async def _purge_loop(self):
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            self.counters["expired"] += await self._run(self._purge)
+    
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        data = await self._run(self._get, session_id)
+        return self._count(wire.loads(data) if data is not None else None)
+    
+    async def put(self, session_id: str, session: Dict[str, Any]):
+        await self._run(self._put, session_id, wire.dumps(session))
+        self.counters["writes"] += 1
+    
+    async def update(self, session_id: str, fn: Updater) -> Optional[Dict[str, Any]]:
+        session = self._count(await self._run(self._update, session_id, fn))
+        if session is not None:
+            self.counters["writes"] += 1
+        return session
+    
+    async def delete(self, session_id: str):
+        await self._run(self._delete, session_id)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "path": self.path}
+
+class RedisSessionStore(SessionStore):
+    """Sesiones en Redis (o compatible) con caducidad nativa: compartidas entre workers y hosts"""
+    
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379/0",
+        ttl: float = 86400.0,
+        prefix: str = "analyzer:session:",
+        client: Any = None,
+        update_attempts: int = 10
+    ):
+        super().__init__(ttl)
+        if client is None and aioredis is None:
+            raise RuntimeError("RedisSessionStore requiere el paquete redis")
+        self.url = url
+        self.prefix = prefix
+        self.update_attempts = update_attempts
+        self.counters["conflicts"] = 0
+        self._client = client
+    
+    async def start(self):
+        if self._client is None:
+            self._client = aioredis.from_url(self.url)
+    
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+    
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        await self.start()
+        key = self.prefix + session_id
+        # GET + EXPIRE en vez de GETEX: lo soportan también los servidores compatibles más antiguos
+        async with self._client.pipeline(transaction=False) as pipe:
+            data, _ = await pipe.get(key).expire(key, int(self.ttl)).execute()
+        return self._count(wire.loads(data) if data is not None else None)
+    
+    async def put(self, session_id: str, session: Dict[str, Any]):
+        await self.start()
+        await self._client.set(self.prefix + session_id, wire.dumps(session), ex=int(self.ttl))
+        self.counters["writes"] += 1
+    
+    async def update(self, session_id: str, fn: Updater) -> Optional[Dict[str, Any]]:
+        await self.start()
+        key = self.prefix + session_id
+        # WATCH/MULTI: si otro worker escribe la clave entre la lectura y el
+        # EXEC, la transacción se descarta y se vuelve a intentar
+        async with self._client.pipeline(transaction=True) as pipe:
+            for _ in range(self.update_attempts):
+                try:
+                    await pipe.watch(key)
+                    data = await pipe.get(key)
+                    if data is None:
+                        await pipe.unwatch()
+                        return self._count(None)
+                    session = fn(wire.loads(data))
+                    pipe.multi()
+                    pipe.set(key, wire.dumps(session), ex=int(self.ttl))
+                    await pipe.execute()
+                except WatchError:
+                    self.counters["conflicts"] += 1
+                    continue
+                self.counters["writes"] += 1
+                return self._count(session)
+        raise RuntimeError(f"No se pudo actualizar la sesión {session_id}: demasiados conflictos")
+    
+    async def delete(self, session_id: str):
+        await self.start()
+        await self._client.delete(self.prefix + session_id)
+
+def create_session_store(url: str = "memory://", ttl: float = 86400.0, max_size: int = 10000) -> SessionStore:
+    """Almacén según URL: `memory://`, `sqlite:///ruta/relativa.db` (`sqlite:////ruta/absoluta.db`) o `redis://...`"""
+    if url.startswith("memory://"):
+        return MemorySessionStore(ttl=ttl, max_size=max_size)
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(path=url[len("sqlite:///"):] or "data/sessions.db", ttl=ttl)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSessionStore(url, ttl=ttl)
+    raise ValueError(f"Backend de sesiones no soportado: {url}")
\ No newline at end of file
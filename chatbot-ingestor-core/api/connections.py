@@ -0,0 +1,568 @@
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+from collections import deque
+import asyncio
+import time
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import TypeAdapter
+
+from core import wire
+from core.broker import MessageBroker
+from .models.schemas import ClientControl, ClientFrame, MuxClientFrame, MuxControl, WebSocketMessage
+
+# Validación directa desde el texto recibido: el JSON se parsea una sola vez
+_client_frames = TypeAdapter(ClientFrame)
+mux_frames = TypeAdapter(MuxClientFrame)
+
+# Canal que reciben todos los workers (avisos de administración)
+BROADCAST_CHANNEL = "broadcast"
+
+# Políticas ante cola de salida llena, de más a menos tolerante:
+# - coalesce: un mensaje nuevo reemplaza al encolado con la misma clave
+#   (estado de un mismo agente, snapshot de contexto); si aun así no cabe, drop_oldest
+# - drop_oldest: descartar el evento de estado más antiguo y si no hay, disconnect
+# - disconnect: cerrar el socket del cliente lento
+OVERFLOW_POLICIES = ("coalesce", "drop_oldest", "disconnect")
+
+# Código de cierre para clientes que no consumen a tiempo o que superan los
+# límites de conexiones ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# Código de cierre de los sockets retirados por inactividad o sin latido ("going away")
+REAPED_CLOSE_CODE = 1001
+
+class ConnectionRejected(Exception):
+    """El socket supera el límite global o por IP de conexiones"""
+    pass
+
+def session_channel(session_id: str) -> str:
+    return f"session:{session_id}"
+
+def _coalesce_key(message: Dict[str, Any]) -> Optional[tuple]:
+    """Clave de los mensajes sustituibles por uno más reciente (incluye la sesión)"""
+    kind = message.get("type")
+    if kind == "snapshot":
+        return ("snapshot", message.get("session_id"))
+    if kind == "status" and isinstance(message.get("data"), dict) and "agent" in message["data"]:
+        return ("status", message.get("session_id"), message["data"]["agent"])
+    return None
+
+class SocketWriter:
+    """Cola de salida acotada de un socket, vaciada por su propia tarea"""
+    
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_size: int = 64,
+        policy: str = "coalesce",
+        send_timeout: float = 10.0,
+        client_ip: str = "unknown",
+        multiplexed: bool = False
+    ):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de desbordamiento no soportada: {policy}")
+        self.websocket = websocket
+        self.client_ip = client_ip
+        # Un socket multiplexado lleva varias sesiones: sus mensajes van etiquetados con `session_id`
+        self.multiplexed = multiplexed
+        self.sessions: Set[str] = set()
+        self.max_size = max_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.slow_consumer = False
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._ready = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._task: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Task] = None
+        # Latido: `last_seen` cuenta cualquier trama del cliente (pongs incluidos),
+        # `last_activity` solo los mensajes de chat
+        self.last_seen = self.last_activity = self.last_ping = time.monotonic()
+        # Turnos en curso: un socket esperando a sus agentes no está inactivo
+        self.in_flight = 0
+        self.reap_reason: Optional[str] = None
+        self._interrupted = asyncio.Event()
+    
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    def send(self, message: Dict[str, Any]) -> bool:
+        """Encolar un mensaje; False si se descartó o el socket está cerrado"""
+        if self.closed:
+            return False
+        
+        if self.policy == "coalesce" and self._replace(message):
+            return True
+        if len(self._queue) >= self.max_size and not self._make_room():
+            self._close_slow_consumer()
+            return False
+        
+        self._queue.append(message)
+        self._drained.clear()
+        self._ready.set()
+        return True
+    
+    def _replace(self, message: Dict[str, Any]) -> bool:
+        key = _coalesce_key(message)
+        if key is None:
+            return False
+        for index, queued in enumerate(self._queue):
+            if _coalesce_key(queued) == key:
+                # Un snapshot con deltas de su sesión detrás es la base de esos deltas: no se toca
+                if key[0] == "snapshot" and self._delta_after(index, message.get("session_id")):
+                    return False
+                # En su sitio: reencolarlo al final lo dejaría detrás de mensajes más nuevos
+                self._queue[index] = message
+                self.coalesced += 1
+                self._ready.set()
+                return True
+        return False
+    
+    def _delta_after(self, index: int, session_id: Optional[str]) -> bool:
+        for position, queued in enumerate(self._queue):
+            if position > index and queued.get("type") == "delta" and queued.get("session_id") == session_id:
+                return True
+        return False
+    
+    def _make_room(self) -> bool:
+        if self.policy == "disconnect":
+            return False
+        for queued in self._queue:
+            if queued.get("type") == "status":
+                self._queue.remove(queued)
+                self.dropped += 1
+                return True
+        return False
+    
+    def _close_slow_consumer(self):
+        self.slow_consumer = True
+        self._shutdown(SLOW_CONSUMER_CLOSE_CODE)
+    
+    def reap(self, reason: str):
+        """Cerrar un socket inactivo o sin latido e interrumpir su bucle de recepción"""
+        self.reap_reason = reason
+        self._shutdown(REAPED_CLOSE_CODE)
+    
+    def _shutdown(self, code: int):
+        self.closed = True
+        self._queue.clear()
+        self._drained.set()
+        self._ready.set()
+        self._interrupted.set()
+        if self._closing is None:
+            # Con referencia: el event loop solo guarda referencias débiles a las tareas
+            self._closing = asyncio.create_task(self._close_socket(code))
+    
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+    
+    async def receive(self, frames: TypeAdapter = _client_frames) -> Any:
+        """Siguiente mensaje validado del cliente (los pongs se consumen aquí)"""
+        while True:
+            receive = asyncio.ensure_future(self.websocket.receive_text())
+            interrupted = asyncio.ensure_future(self._interrupted.wait())
+            done, _ = await asyncio.wait({receive, interrupted}, return_when=asyncio.FIRST_COMPLETED)
+            if receive not in done:
+                receive.cancel()
+                raise WebSocketDisconnect(code=REAPED_CLOSE_CODE if self.reap_reason else SLOW_CONSUMER_CLOSE_CODE)
+            interrupted.cancel()
+            
+            # Una trama mal formada también demuestra que el cliente sigue vivo
+            self.last_seen = time.monotonic()
+            message = frames.validate_json(receive.result())
+            if isinstance(message, ClientControl) and message.type == "pong":
+                continue
+            self.last_activity = self.last_seen
+            return message
+    
+    def ping(self):
+        self.last_ping = time.monotonic()
+        self.send({"type": "ping"})
+    
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            if self.closed:
+                return
+            if not self._queue:
+                self._ready.clear()
+                self._drained.set()
+                continue
+            
+            message = self._queue.popleft()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(wire.dumps(message).decode("utf-8")), self.send_timeout)
+                self.sent += 1
+            except asyncio.TimeoutError:
+                self._close_slow_consumer()
+                return
+            except Exception:
+                # Socket roto: el bucle de recepción se encarga de la baja
+                self.closed = True
+                self._queue.clear()
+                self._drained.set()
+                return
+    
+    async def close(self, flush: bool = True):
+        """Detener la escritura; con `flush` se espera a vaciar la cola (con límite)"""
+        if flush and not self.closed:
+            try:
+                await asyncio.wait_for(self._drained.wait(), self.send_timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.closed = True
+        self._queue.clear()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._closing is not None:
+            await self._closing
+
+class MultiplexedSessions:
+    """Turnos de chat por sesión sobre un socket (/chat y /chat/mux), en orden y con cola acotada"""
+    
+    def __init__(
+        self,
+        writer: SocketWriter,
+        handler: Callable[[str, Any], Awaitable[None]],
+        max_sessions: int = 1000,
+        max_pending: int = 8,
+        max_inflight: int = 16
+    ):
+        self.writer = writer
+        self.handler = handler
+        self.max_sessions = max_sessions
+        self.max_pending = max_pending
+        self.processed = 0
+        self.backpressure = 0
+        self._queues: Dict[str, asyncio.Queue] = {}
+        # Última tarea de cada sesión; `_tasks` incluye también las que aún
+        # procesan lo encolado antes de un `close`
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._inflight = asyncio.Semaphore(max_inflight)
+    
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._queues
+    
+    def __len__(self) -> int:
+        return len(self._queues)
+    
+    @property
+    def pending(self) -> int:
+        return sum(queue.qsize() for queue in self._queues.values())
+    
+    def open(self, session_id: str) -> bool:
+        """Crear la cola y la tarea de la sesión; False si se supera `max_sessions`"""
+        if session_id in self._queues:
+            return True
+        if len(self._queues) >= self.max_sessions:
+            return False
+        queue = self._queues[session_id] = asyncio.Queue()
+        # Si la sesión se está cerrando, la nueva tarea espera a que la anterior
+        # termine: nunca hay dos procesando la misma sesión a la vez
+        previous = self._workers.get(session_id)
+        worker = self._workers[session_id] = asyncio.create_task(self._run(session_id, queue, previous))
+        self._tasks.add(worker)
+        worker.add_done_callback(self._tasks.discard)
+        return True
+    
+    def submit(self, session_id: str, frame: Any) -> bool:
+        """Encolar una trama en su sesión; False si la sesión tiene `max_pending` en espera"""
+        queue = self._queues[session_id]
+        if isinstance(frame, MuxControl) and frame.type == "close":
+            del self._queues[session_id]
+        elif queue.qsize() >= self.max_pending:
+            self.backpressure += 1
+            return False
+        queue.put_nowait(frame)
+        return True
+    
+    async def _run(self, session_id: str, queue: asyncio.Queue, previous: Optional[asyncio.Task] = None):
+        if previous is not None:
+            await asyncio.wait({previous})
+        while True:
+            frame = await queue.get()
+            async with self._inflight:
+                self.writer.in_flight += 1
+                try:
+                    await self.handler(session_id, frame)
+                except Exception as e:
+                    # El error afecta solo a esta sesión, no al socket
+                    self.writer.send({**WebSocketMessage(type="error", data={"error": str(e)}).model_dump(), "session_id": session_id})
+                finally:
+                    self.writer.in_flight -= 1
+                    # El tiempo de inactividad cuenta desde la respuesta, no desde la pregunta
+                    self.writer.last_activity = time.monotonic()
+            self.processed += 1
+            if isinstance(frame, MuxControl) and frame.type == "close":
+                # La sesión pudo reabrirse con otra tarea mientras se cerraba
+                if self._workers.get(session_id) is asyncio.current_task():
+                    del self._workers[session_id]
+                return
+    
+    async def cancel(self):
+        """Detener todas las sesiones sin procesar lo pendiente (socket cerrado)"""
+        workers = list(self._tasks)
+        self._queues.clear()
+        self._workers.clear()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+class ConnectionManager:
+    """Sockets de chat abiertos en este worker, suscritos a sus sesiones en el broker"""
+    
+    def __init__(
+        self,
+        broker: MessageBroker,
+        queue_size: int = 64,
+        overflow_policy: str = "coalesce",
+        send_timeout: float = 10.0,
+        max_connections: int = 10000,
+        max_per_ip: int = 50,
+        ping_interval: float = 20.0,
+        idle_timeout: float = 600.0,
+        reap_interval: float = 5.0,
+        mux_queue_size: int = 1024,
+        mux_max_sessions: int = 1000,
+        mux_max_pending: int = 8,
+        mux_max_inflight: int = 16
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de desbordamiento no soportada: {overflow_policy}")
+        self.broker = broker
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.max_connections = max_connections
+        self.max_per_ip = max_per_ip
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.mux_queue_size = mux_queue_size
+        self.mux_max_sessions = mux_max_sessions
+        self.mux_max_pending = mux_max_pending
+        self.mux_max_inflight = mux_max_inflight
+        self.connections: Dict[str, Set[SocketWriter]] = {}
+        self._writers: Set[SocketWriter] = set()
+        self._multiplexed: Dict[SocketWriter, MultiplexedSessions] = {}
+        self._mux_totals = {"processed": 0, "backpressure": 0}
+        self._by_ip: Dict[str, int] = {}
+        self._totals = {"sent": 0, "dropped": 0, "coalesced": 0, "slow_consumers": 0}
+        self._rejected = {"global": 0, "per_ip": 0}
+        self._reaped = {"idle": 0, "heartbeat": 0}
+        self._reaper: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        await self.broker.start()
+        await self.broker.subscribe(BROADCAST_CHANNEL, self._deliver_broadcast)
+        if self.reap_interval and self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_loop())
+    
+    async def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+        for sessions in list(self._multiplexed.values()):
+            await sessions.cancel()
+        for writer in list(self._writers):
+            await writer.close(flush=False)
+        await self.broker.close()
+        self.connections.clear()
+        self._writers.clear()
+        self._multiplexed.clear()
+        self._by_ip.clear()
+    
+    @property
+    def active(self) -> int:
+        return len(self._writers)
+    
+    def register(self, websocket: WebSocket, multiplexed: bool = False) -> SocketWriter:
+        """Registrar un socket antes de aceptarlo; lanza ConnectionRejected si se superan los límites"""
+        client_ip = websocket.client.host if websocket.client else "unknown"
+        if self.active >= self.max_connections:
+            self._rejected["global"] += 1
+            raise ConnectionRejected(f"Límite global de conexiones alcanzado ({self.max_connections})")
+        if self._by_ip.get(client_ip, 0) >= self.max_per_ip:
+            self._rejected["per_ip"] += 1
+            raise ConnectionRejected(f"Límite de conexiones por IP alcanzado ({self.max_per_ip})")
+        
+        # Un socket multiplexado comparte la cola entre todas sus sesiones
+        queue_size = self.mux_queue_size if multiplexed else self.queue_size
+        writer = SocketWriter(websocket, queue_size, self.overflow_policy, self.send_timeout, client_ip, multiplexed)
+        self._by_ip[client_ip] = self._by_ip.get(client_ip, 0) + 1
+        self._writers.add(writer)
+        return writer
+    
+    def multiplex(self, writer: SocketWriter, handler: Callable[[str, Any], Awaitable[None]]) -> MultiplexedSessions:
+        """Sesiones de un socket multiplexado, cada una procesada en orden por `handler`"""
+        sessions = self._multiplexed[writer] = MultiplexedSessions(
+            writer,
+            handler,
+            max_sessions=self.mux_max_sessions,
+            max_pending=self.mux_max_pending,
+            max_inflight=self.mux_max_inflight
+        )
+        return sessions
+    
+    async def attach(self, session_id: str, writer: SocketWriter):
+        """Asociar un socket a una sesión; el primero de la sesión suscribe su canal"""
+        writers = self.connections.setdefault(session_id, set())
+        if writer in writers:
+            return
+        writers.add(writer)
+        writer.sessions.add(session_id)
+        if len(writers) == 1:
+            await self.broker.subscribe(session_channel(session_id), lambda message: self.send_local(session_id, message))
+    
+    async def detach(self, session_id: str, writer: SocketWriter):
+        writers = self.connections.get(session_id)
+        if not writers or writer not in writers:
+            return
+        writers.discard(writer)
+        writer.sessions.discard(session_id)
+        if not writers:
+            del self.connections[session_id]
+            await self.broker.unsubscribe(session_channel(session_id))
+    
+    async def connect(self, session_id: str, websocket: WebSocket) -> SocketWriter:
+        """Registrar un socket de una sola sesión y suscribirse a ella si es el primero"""
+        writer = self.register(websocket)
+        await self.attach(session_id, writer)
+        return writer
+    
+    async def disconnect(self, session_id: str, writer: SocketWriter, flush: bool = True):
+        await self.unregister(writer, flush=flush)
+    
+    async def unregister(self, writer: SocketWriter, flush: bool = True):
+        """Dar de baja un socket: detiene sus sesiones multiplexadas y lo desasocia de todas"""
+        sessions = self._multiplexed.pop(writer, None)
+        if sessions is not None:
+            await sessions.cancel()
+            self._mux_totals["processed"] += sessions.processed
+            self._mux_totals["backpressure"] += sessions.backpressure
+        await writer.close(flush=flush)
+        if writer not in self._writers:
+            return
+        self._writers.discard(writer)
+        for session_id in list(writer.sessions):
+            await self.detach(session_id, writer)
+        remaining = self._by_ip.get(writer.client_ip, 1) - 1
+        if remaining:
+            self._by_ip[writer.client_ip] = remaining
+        else:
+            self._by_ip.pop(writer.client_ip, None)
+        self._totals["sent"] += writer.sent
+        self._totals["dropped"] += writer.dropped
+        self._totals["coalesced"] += writer.coalesced
+        self._totals["slow_consumers"] += writer.slow_consumer
+    
+    def reap(self) -> int:
+        """Cerrar sockets sin latido o inactivos y enviar pings a los que toque"""
+        now = time.monotonic()
+        reaped = 0
+        for writer in list(self._writers):
+            if writer.closed:
+                continue
+            # Dos intervalos de ping sin ninguna trama del cliente: conexión muerta
+            if self.ping_interval and now - writer.last_seen > 2 * self.ping_interval:
+                reason = "heartbeat"
+            elif self.idle_timeout and not writer.in_flight and now - writer.last_activity > self.idle_timeout:
+                reason = "idle"
+            else:
+                if self.ping_interval and now - writer.last_ping >= self.ping_interval:
+                    writer.ping()
+                continue
+            writer.reap(reason)
+            self._reaped[reason] += 1
+            reaped += 1
+        return reaped
+    
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            self.reap()
+    
+    async def push(self, session_id: str, message: Dict[str, Any]):
+        """Enviar a los sockets de una sesión, estén en el worker que estén"""
+        await self.broker.publish(session_channel(session_id), message)
+    
+    async def broadcast(self, message: Dict[str, Any]):
+        """Enviar a todos los sockets de todos los workers"""
+        await self.broker.publish(BROADCAST_CHANNEL, message)
+    
+    async def send_local(self, session_id: str, message: Dict[str, Any]) -> int:
+        """Encolar en los sockets de la sesión en este worker (no espera al envío)"""
+        tagged = {**message, "session_id": session_id}
+        return sum(
+            writer.send(tagged if writer.multiplexed else message)
+            for writer in list(self.connections.get(session_id, ()))
+        )
+    
+    async def _deliver_broadcast(self, message: Dict[str, Any]):
+        # Una vez por socket, aunque un socket multiplexado lleve muchas sesiones
+        for writer in list(self._writers):
+            writer.send(message)
+    
+    def stats(self) -> Dict[str, Any]:
+        writers = list(self._writers)
+        multiplexed = list(self._multiplexed.values())
+        mux_totals = dict(self._mux_totals)
+        for sessions in multiplexed:
+            mux_totals["processed"] += sessions.processed
+            mux_totals["backpressure"] += sessions.backpressure
+        depths = [writer.depth for writer in writers]
+        totals = dict(self._totals)
+        for writer in writers:
+            totals["sent"] += writer.sent
+            totals["dropped"] += writer.dropped
+            totals["coalesced"] += writer.coalesced
+            totals["slow_consumers"] += writer.slow_consumer
+        return {
+            "sessions": len(self.connections),
+            "sockets": len(writers),
+            "max_connections": self.max_connections,
+            "max_per_ip": self.max_per_ip,
+            "distinct_ips": len(self._by_ip),
+            "max_sockets_per_ip": max(self._by_ip.values(), default=0),
+            "rejected": dict(self._rejected),
+            "reaped": dict(self._reaped),
+            "ping_interval": self.ping_interval,
+            "idle_timeout": self.idle_timeout,
+            "queue_size": self.queue_size,
+            "overflow_policy": self.overflow_policy,
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            **totals,
+            "multiplexed": {
+                "sockets": len(multiplexed),
+                "sessions": sum(len(sessions) for sessions in multiplexed),
+                "pending": sum(sessions.pending for sessions in multiplexed),
+                "queue_size": self.mux_queue_size,
+                "max_sessions": self.mux_max_sessions,
+                "max_pending": self.mux_max_pending,
+                "max_inflight": self.mux_max_inflight,
+                **mux_totals
+            },
+            "broker": self.broker.stats()
+        }
\ No newline at end of file
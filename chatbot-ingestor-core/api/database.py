@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
@@ -24,6 +25,57 @@ AsyncSessionLocal = sessionmaker(
 # Base para los modelos
 Base = declarative_base()
 
+# Columnas añadidas a tablas ya existentes: `create_all` solo crea tablas que faltan.
+# El DEFAULT es obligatorio para añadir columnas NOT NULL en SQLite.
+ADDED_COLUMNS = {
+    "sessions": {
+        "context_version": "INTEGER NOT NULL DEFAULT 0",
+        "tenant_id": "VARCHAR"
+    }
+}
+
+def migrate(connection):
+    """Adaptar BD existentes: columnas de ADDED_COLUMNS y restricciones nuevas (al arrancar, vía run_sync)"""
+    inspector = inspect(connection)
+    _unique_agent_revisions(connection, inspector)
+    for table, columns in ADDED_COLUMNS.items():
+        if not inspector.has_table(table):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for name, definition in columns.items():
+            if name in existing:
+                continue
+            try:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {definition}"))
+            except OperationalError as e:
+                # Otro worker la añadió entre la inspección y el ALTER
+                if "duplicate column" not in str(e).lower():
+                    raise
+
+def _unique_agent_revisions(connection, inspector):
+    """Revisión única en registros de agentes creados antes de exigirla"""
+    if not inspector.has_table("agent_registrations"):
+        return
+    unique = [c["column_names"] for c in inspector.get_unique_constraints("agent_registrations")]
+    unique += [i["column_names"] for i in inspector.get_indexes("agent_registrations") if i.get("unique")]
+    if ["revision"] in unique:
+        return
+    
+    duplicated = connection.execute(text(
+        "SELECT COUNT(*) FROM (SELECT revision FROM agent_registrations GROUP BY revision HAVING COUNT(*) > 1)"
+    )).scalar()
+    if duplicated:
+        latest = connection.execute(text("SELECT MAX(revision) FROM agent_registrations")).scalar() or 0
+        names = connection.execute(text("SELECT name FROM agent_registrations ORDER BY revision, name")).scalars().all()
+        for offset, name in enumerate(names, start=1):
+            connection.execute(
+                text("UPDATE agent_registrations SET revision = :revision WHERE name = :name"),
+                {"revision": latest + offset, "name": name}
+            )
+    connection.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_agent_registrations_revision ON agent_registrations (revision)"
+    ))
+
 # Dependency para obtener la sesión de BD
 async def get_db():
     async with AsyncSessionLocal() as session:
@@ -1,13 +1,95 @@
 from fastapi import Depends
-from typing import Annotated
+from typing import Annotated, AsyncContextManager, AsyncIterator, Callable, List
+from contextlib import asynccontextmanager
+import importlib
+import json
+import os
+import sys
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core import ContextManager, ValidationEngine, AgentOrchestrator, ChatbotIngestor
-from .database import get_db
+from core import ContextManager, ValidationEngine, AgentOrchestrator, AgentScheduler, ChatbotIngestor
+from core.admission import FairQueue
+from core.broker import create_broker
+from core.context import ContextSnapshots
+from core.http_client import HTTPClientPool
+from core.ratelimit import LoadShedder, RateLimiter, RateLimits
+from core.registry import AgentRegistry
+from core.transports import INPROCESS_SCHEME
+from .database import get_db, AsyncSessionLocal
+from .connections import ConnectionManager
 
 # Instancias singleton de los componentes core
+_http_client = HTTPClientPool(
+    limit=int(os.getenv("AGENT_HTTP_POOL_LIMIT", "100")),
+    limit_per_host=int(os.getenv("AGENT_HTTP_POOL_PER_HOST", "20")),
+    keepalive_timeout=float(os.getenv("AGENT_HTTP_KEEPALIVE", "30")),
+    # 0 = sin límite total (los agentes pueden tardar minutos); AGENT_HTTP_READ_TIMEOUT
+    # corta conexiones sin datos y cada agente puede fijar su propio `timeout`
+    total_timeout=float(os.getenv("AGENT_HTTP_TIMEOUT", "0")) or None,
+    connect_timeout=float(os.getenv("AGENT_HTTP_CONNECT_TIMEOUT", "5")),
+    sock_read_timeout=float(os.getenv("AGENT_HTTP_READ_TIMEOUT", "900")) or None
+)
 _validation_engine = ValidationEngine()
-_agent_orchestrator = AgentOrchestrator()
+_agent_admission = FairQueue(
+    max_concurrency=int(os.getenv("AGENT_MAX_CONCURRENCY", "32")),
+    batch_limit=int(os.environ["AGENT_BATCH_CONCURRENCY"]) if "AGENT_BATCH_CONCURRENCY" in os.environ else None,
+    weights=json.loads(os.getenv("AGENT_TENANT_WEIGHTS", "{}"))
+)
+_agent_orchestrator = AgentOrchestrator(http_client=_http_client, admission=_agent_admission)
+_agent_scheduler = AgentScheduler(_agent_orchestrator, max_concurrency=8)
+_agent_registry = AgentRegistry(AsyncSessionLocal, poll_interval=float(os.getenv("AGENT_REGISTRY_POLL_INTERVAL", "5")))
+# memory:// solo sirve con un worker; con varios, BROKER_URL=redis://...
+_connection_manager = ConnectionManager(
+    create_broker(os.getenv("BROKER_URL", "memory://")),
+    queue_size=int(os.getenv("WS_SEND_QUEUE_SIZE", "64")),
+    overflow_policy=os.getenv("WS_OVERFLOW_POLICY", "coalesce"),
+    send_timeout=float(os.getenv("WS_SEND_TIMEOUT", "10")),
+    max_connections=int(os.getenv("WS_MAX_CONNECTIONS", "10000")),
+    max_per_ip=int(os.getenv("WS_MAX_PER_IP", "50")),
+    ping_interval=float(os.getenv("WS_PING_INTERVAL", "20")),
+    idle_timeout=float(os.getenv("WS_IDLE_TIMEOUT", "600")),
+    reap_interval=float(os.getenv("WS_REAP_INTERVAL", "5")),
+    mux_queue_size=int(os.getenv("WS_MUX_SEND_QUEUE_SIZE", "1024")),
+    mux_max_sessions=int(os.getenv("WS_MUX_MAX_SESSIONS", "1000")),
+    mux_max_pending=int(os.getenv("WS_MUX_MAX_PENDING", "8")),
+    mux_max_inflight=int(os.getenv("WS_MUX_MAX_INFLIGHT", "16"))
+)
+_context_snapshots = ContextSnapshots(max_size=int(os.getenv("CONTEXT_SNAPSHOT_CACHE", "2048")))
+# Tasas en peticiones por segundo (0 desactiva el límite) y ráfaga máxima
+_rate_limits = RateLimits(
+    session_create_per_ip=RateLimiter(
+        rate=float(os.getenv("RATE_SESSION_CREATE_PER_IP", "1")),
+        burst=float(os.getenv("RATE_SESSION_CREATE_BURST", "10"))
+    ),
+    chat_per_session=RateLimiter(
+        rate=float(os.getenv("RATE_CHAT_PER_SESSION", "5")),
+        burst=float(os.getenv("RATE_CHAT_SESSION_BURST", "10"))
+    ),
+    chat_per_ip=RateLimiter(
+        rate=float(os.getenv("RATE_CHAT_PER_IP", "20")),
+        burst=float(os.getenv("RATE_CHAT_IP_BURST", "40"))
+    )
+)
+_load_shedder = LoadShedder(
+    max_loop_lag=float(os.getenv("SHED_MAX_LOOP_LAG", "0.25")),
+    max_queue_depth=int(os.getenv("SHED_MAX_QUEUE_DEPTH", "256")),
+    queue_depth=_agent_admission.depth
+)
+
+def bind_local_agents(orchestrator: AgentOrchestrator, project_path: str) -> List[str]:
+    """Enlazar en este proceso los agentes del analizador con endpoint `inprocess://`"""
+    if project_path not in sys.path:
+        sys.path.append(project_path)
+    agent_configs = importlib.import_module("configs.agent_configs").AGENT_CONFIGS
+    create_agent = importlib.import_module("agents.factory").create_agent
+    
+    bound = []
+    for name, config in agent_configs.items():
+        endpoint = config.get("endpoint") or ""
+        if endpoint.startswith(INPROCESS_SCHEME):
+            orchestrator.bind_local_agent(endpoint[len(INPROCESS_SCHEME):] or name, create_agent(name))
+            bound.append(name)
+    return bound
 
 async def get_context_manager(db: AsyncSession = Depends(get_db)) -> ContextManager:
     """Dependency para obtener el ContextManager"""
@@ -21,16 +103,57 @@ async def get_agent_orchestrator() -> AgentOrchestrator:
     """Dependency para obtener el AgentOrchestrator"""
     return _agent_orchestrator
 
+async def get_http_client() -> HTTPClientPool:
+    """Dependency para obtener el pool HTTP compartido"""
+    return _http_client
+
+async def get_agent_registry() -> AgentRegistry:
+    """Dependency para obtener el registro persistente de agentes"""
+    return _agent_registry
+
+async def get_connection_manager() -> ConnectionManager:
+    """Dependency para obtener los sockets de chat de este worker"""
+    return _connection_manager
+
+async def get_rate_limits() -> RateLimits:
+    """Dependency para obtener los límites de tasa de entrada"""
+    return _rate_limits
+
+async def get_load_shedder() -> LoadShedder:
+    """Dependency para obtener el control de admisión por sobrecarga"""
+    return _load_shedder
+
+async def get_context_snapshots() -> ContextSnapshots:
+    """Dependency para obtener las versiones de sesión servidas"""
+    return _context_snapshots
+
 async def get_chatbot_ingestor(
     context_manager: ContextManager = Depends(get_context_manager),
     validation_engine: ValidationEngine = Depends(get_validation_engine),
     agent_orchestrator: AgentOrchestrator = Depends(get_agent_orchestrator)
 ) -> ChatbotIngestor:
     """Dependency para obtener el ChatbotIngestor"""
-    return ChatbotIngestor(context_manager, validation_engine, agent_orchestrator)
+    return ChatbotIngestor(context_manager, validation_engine, agent_orchestrator, _agent_scheduler)
+
+@asynccontextmanager
+async def chat_turn() -> AsyncIterator[ChatbotIngestor]:
+    """Ingestor con una sesión de BD propia para un turno de un socket de chat"""
+    async with AsyncSessionLocal() as db:
+        yield ChatbotIngestor(ContextManager(db), _validation_engine, _agent_orchestrator, _agent_scheduler)
+
+async def get_chat_turn() -> Callable[[], AsyncContextManager[ChatbotIngestor]]:
+    """Dependency para abrir turnos de chat con su propia sesión de BD"""
+    return chat_turn
 
 # Type aliases para las dependencias
 ContextManagerDep = Annotated[ContextManager, Depends(get_context_manager)]
 ValidationEngineDep = Annotated[ValidationEngine, Depends(get_validation_engine)]
 AgentOrchestratorDep = Annotated[AgentOrchestrator, Depends(get_agent_orchestrator)]
-ChatbotIngestorDep = Annotated[ChatbotIngestor, Depends(get_chatbot_ingestor)] 
\ No newline at end of file
+HTTPClientDep = Annotated[HTTPClientPool, Depends(get_http_client)]
+AgentRegistryDep = Annotated[AgentRegistry, Depends(get_agent_registry)]
+ConnectionManagerDep = Annotated[ConnectionManager, Depends(get_connection_manager)]
+ContextSnapshotsDep = Annotated[ContextSnapshots, Depends(get_context_snapshots)]
+RateLimitsDep = Annotated[RateLimits, Depends(get_rate_limits)]
+LoadShedderDep = Annotated[LoadShedder, Depends(get_load_shedder)]
+ChatbotIngestorDep = Annotated[ChatbotIngestor, Depends(get_chatbot_ingestor)]
+ChatTurnDep = Annotated[Callable[[], AsyncContextManager[ChatbotIngestor]], Depends(get_chat_turn)] 
\ No newline at end of file
@@ -1,13 +1,52 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+import os
 import uvicorn
 
+from core.compression import CompressionMiddleware
 from .routes import router
+from .database import engine, migrate
+from .models.db_models import Base
+from .dependencies import bind_local_agents, get_http_client, get_agent_orchestrator, get_agent_registry, get_connection_manager, get_load_shedder
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Abrir y cerrar recursos compartidos con el ciclo de vida de la app"""
+    http_client = await get_http_client()
+    await http_client.start()
+    # Crea solo las tablas que falten (p. ej. el registro de agentes en BD existentes)
+    # y añade las columnas nuevas de las tablas que ya existían
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(migrate)
+    
+    orchestrator = await get_agent_orchestrator()
+    # Despliegue en una sola máquina: LOCAL_AGENTS_PATH=<raíz de agents-market-analyzer>
+    if os.getenv("LOCAL_AGENTS_PATH"):
+        bind_local_agents(orchestrator, os.environ["LOCAL_AGENTS_PATH"])
+    registry = await get_agent_registry()
+    await registry.start(orchestrator)
+    connections = await get_connection_manager()
+    await connections.start()
+    load_shedder = await get_load_shedder()
+    await load_shedder.start()
+    try:
+        yield
+    finally:
+        await load_shedder.close()
+        await connections.close()
+        await registry.stop()
+        await orchestrator.close()
 
 app = FastAPI(
     title="Chatbot Ingestor Core",
     description="Framework conversacional para ingesta de datos con validación en tiempo real",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson serializa las respuestas JSON bastante más rápido que el encoder estándar
+    default_response_class=ORJSONResponse
 )
 
 # Configurar CORS
@@ -19,6 +58,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Comprimir respuestas grandes (detalle de sesión, métricas) con brotli o gzip
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024")),
+    gzip_level=int(os.getenv("RESPONSE_GZIP_LEVEL", "6")),
+    brotli_quality=int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+)
+
 # Incluir rutas
 app.include_router(router, prefix="/api/v1")
 
@@ -27,5 +74,15 @@ if __name__ == "__main__":
         "api.main:app",
         host="0.0.0.0",
         port=8000,
+        # API_UDS=/run/core.sock para escuchar en un socket Unix en vez de TCP
+        uds=os.getenv("API_UDS"),
+        # permessage-deflate en el chat, con nivel y ventana ajustables (WS_DEFLATE_*);
+        # en producción: uvicorn ... --ws api.ws_protocol:TunedDeflateWebSocketProtocol
+        ws="api.ws_protocol:TunedDeflateWebSocketProtocol",
+        ws_per_message_deflate=os.getenv("WS_DEFLATE", "1") != "0",
+        # Tras un balanceador, FORWARDED_ALLOW_IPS con su dirección (o "*") para
+        # tomar la IP del cliente de X-Forwarded-For en los límites por IP
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
         reload=True
     ) 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, JSON, ForeignKey, Integer
+from sqlalchemy import Column, String, DateTime, JSON, ForeignKey, Integer, Boolean
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -11,11 +11,14 @@ class Session(Base):
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_role = Column(String, nullable=False)
+    tenant_id = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     context = Column(JSON, default=dict)
     completion_status = Column(JSON, default=dict)
     validation_state = Column(JSON, default=dict)
     agent_triggers = Column(JSON, default=dict)
+    # Se incrementa en cada cambio de `context`; permite enviar solo diferencias
+    context_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     # Relación con mensajes
     messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
@@ -32,4 +35,20 @@ class Message(Base):
     meta = Column(JSON, default=dict)
 
     # Relación con sesión
-    session = relationship("Session", back_populates="messages") 
\ No newline at end of file
+    session = relationship("Session", back_populates="messages") 
+
+class AgentRegistration(Base):
+    """Modelo para el registro persistente de agentes"""
+    __tablename__ = "agent_registrations"
+
+    name = Column(String, primary_key=True)
+    endpoint = Column(String, nullable=False)
+    trigger_condition = Column(JSON, nullable=False)
+    required_fields = Column(JSON, nullable=True)
+    batch_endpoint = Column(String, nullable=True)
+    options = Column(JSON, default=dict)  # idempotent, hedge, cacheable, delta, max_concurrency, timeout, shared_cache
+    active = Column(Boolean, nullable=False, default=True)
+    # Revisión global creciente: cada worker aplica solo los cambios posteriores a la suya.
+    # Única: dos workers que calculen la misma a la vez no pueden confirmarla ambos
+    revision = Column(Integer, nullable=False, unique=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
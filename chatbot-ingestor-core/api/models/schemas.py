@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional, Literal
+from typing import Dict, List, Optional, Literal, Union
 from datetime import datetime
 from pydantic import BaseModel
 
@@ -6,6 +6,8 @@ class UserSessionCreate(BaseModel):
     """Modelo para crear una nueva sesión"""
     user_role: Literal["admin", "user", "analyst"]
     initial_data: Optional[Dict] = None
+    # Organización/cliente: clave de reparto justo de la capacidad de agentes
+    tenant_id: Optional[str] = None
 
 class SessionResponse(BaseModel):
     """Respuesta de creación de sesión"""
@@ -18,19 +20,79 @@ class SessionDetailResponse(BaseModel):
     session_id: str
     user_role: str
     created_at: datetime
+    context_version: int = 0
     completion_status: Dict[str, float]
     data: Dict
     validation_state: Dict
     agent_triggers: Dict
 
+class SessionDeltaResponse(BaseModel):
+    """Cambios de una sesión desde una versión que el cliente ya tiene"""
+    session_id: str
+    base_version: int
+    context_version: int
+    patch: List[Dict]
+
+class AgentRegistrationRequest(BaseModel):
+    """Alta de un agente en el orquestador"""
+    name: str
+    trigger_condition: Dict
+    endpoint: str
+    required_fields: Optional[List[str]] = None
+    batch_endpoint: Optional[str] = None
+    idempotent: bool = True
+    hedge: bool = False
+    cacheable: bool = True
+    delta: bool = False
+    max_concurrency: Optional[int] = None
+    timeout: Optional[float] = None
+    shared_cache: bool = False
+
+class AgentRegistrationResponse(BaseModel):
+    """Agente registrado y revisión del registro"""
+    name: str
+    revision: int
+    watches: List[str]
+    depends_on: List[str]
+
+class AgentResultsUpdate(BaseModel):
+    """Resultados que un agente publica para una sesión"""
+    agent_name: str
+    results: Dict
+
+class AgentStatusUpdate(BaseModel):
+    """Cambio de estado de un agente en una sesión"""
+    agent_name: str
+    status: str
+    completed_at: Optional[datetime] = None
+
 class ChatMessage(BaseModel):
     """Modelo para mensajes del chat"""
     text: str
     timestamp: datetime
     metadata: Optional[Dict] = None
 
+class ClientControl(BaseModel):
+    """Mensajes de control del cliente (no son turnos de chat)"""
+    type: Literal["resync", "pong"]
+
+# Tramas que puede enviar el cliente por el socket de chat
+ClientFrame = Union[ClientControl, ChatMessage]
+
+class MuxControl(BaseModel):
+    """Control de una sesión en el socket multiplexado"""
+    type: Literal["open", "close", "resync"]
+    session_id: str
+
+class MuxChatMessage(ChatMessage):
+    """Mensaje de chat dirigido a una sesión del socket multiplexado"""
+    session_id: str
+
+# Tramas del socket multiplexado (el pong es del socket, no de una sesión)
+MuxClientFrame = Union[MuxControl, MuxChatMessage, ClientControl]
+
 class WebSocketMessage(BaseModel):
     """Modelo para mensajes WebSocket"""
-    type: Literal["message", "status", "error"]
+    type: Literal["message", "status", "error", "snapshot", "delta", "closed"]
     data: Dict
     timestamp: datetime = datetime.utcnow() 
\ No newline at end of file
@@ -1,33 +1,119 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import APIRouter, BackgroundTasks, WebSocket, WebSocketDisconnect, HTTPException, Request, Response
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional, Union
+import math
+from pydantic import ValidationError
 
 from .models.schemas import (
     UserSessionCreate,
     SessionResponse,
     SessionDetailResponse,
-    ChatMessage,
+    SessionDeltaResponse,
+    AgentRegistrationRequest,
+    AgentRegistrationResponse,
+    AgentResultsUpdate,
+    AgentStatusUpdate,
+    ClientControl,
+    MuxControl,
     WebSocketMessage
 )
 from .dependencies import (
     ContextManagerDep,
     ValidationEngineDep,
     AgentOrchestratorDep,
-    ChatbotIngestorDep
+    HTTPClientDep,
+    ContextSnapshotsDep,
+    AgentRegistryDep,
+    ConnectionManagerDep,
+    ChatTurnDep,
+    RateLimitsDep,
+    LoadShedderDep
 )
+from .connections import ConnectionRejected, MultiplexedSessions, SLOW_CONSUMER_CLOSE_CODE, mux_frames
+from core import wire
+from core.admission import BATCH
+from core.context import ContextStream
+from core.ratelimit import LoadShedder, RateLimits
 
 router = APIRouter()
 
-# Almacén de conexiones WebSocket activas
-active_connections: Dict[str, WebSocket] = {}
+def _client_ip(request: Request) -> str:
+    # Tras un balanceador es la IP del balanceador salvo que uvicorn confíe en él:
+    # --proxy-headers --forwarded-allow-ips=<IP del balanceador> (FORWARDED_ALLOW_IPS)
+    return request.client.host if request.client else "unknown"
+
+def _too_many_requests(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+def _rejection(code: str, error: str, retry_after: float) -> WebSocketMessage:
+    return WebSocketMessage(type="error", data={"code": code, "error": error, "retry_after": retry_after})
+
+def _admit_chat(load_shedder: LoadShedder, rate_limits: RateLimits, session_id: str, client_ip: Optional[str]) -> Optional[WebSocketMessage]:
+    """Trama de rechazo si el mensaje no se admite (antes de tocar la BD o invocar agentes)"""
+    overload = load_shedder.check()
+    if overload:
+        return _rejection("overloaded", f"Servidor sobrecargado ({overload})", load_shedder.retry_after)
+    retry_after = rate_limits.chat(session_id, client_ip)
+    if retry_after:
+        return _rejection("rate_limited", "Demasiados mensajes, espera antes de reintentar", retry_after)
+    return None
+
+async def _chat_snapshot(chat_turn, session_id: str, stream: ContextStream) -> WebSocketMessage:
+    async with chat_turn() as chatbot_ingestor:
+        context = await chatbot_ingestor.context.get_context(session_id)
+        completion = await chatbot_ingestor.context.get_completion_status(session_id)
+    return WebSocketMessage(type="snapshot", data=stream.snapshot(context, completion))
+
+async def _chat_reply(chat_turn, session_id: str, text: str, stream: Optional[ContextStream]) -> WebSocketMessage:
+    """Procesar un turno con el ingestor (sesión de BD solo durante el turno)"""
+    async with chat_turn() as chatbot_ingestor:
+        result = await chatbot_ingestor.process_message(
+            text,
+            session_id,
+            "user"  # TODO: Obtener rol real del contexto
+        )
+        completion = await chatbot_ingestor.context.get_completion_status(session_id) if stream is not None else None
+    
+    reply = {
+        "response": result.response_text,
+        "validation": result.validation_status,
+        "agents": result.agents_triggered,
+        "next_action": result.next_suggested_action
+    }
+    if stream is None:
+        reply["context"] = result.context_updated
+    else:
+        reply.update(stream.delta(result.context_updated, completion))
+    return WebSocketMessage(type="message" if stream is None else "delta", data=reply)
+
+async def _dispatch_dependents(chat_turn, connections, session_id: str, agent_name: str):
+    """Ejecutar los agentes que observan el estado recién guardado y avisar a los sockets"""
+    async with chat_turn() as chatbot_ingestor:
+        # Trabajo en segundo plano: no debe retrasar los turnos interactivos
+        entries = await chatbot_ingestor.agent_state_changed(session_id, [agent_name], lane=BATCH)
+    for name, entry in entries.items():
+        await connections.push(session_id, WebSocketMessage(
+            type="status",
+            data={"agent": name, **entry}
+        ).model_dump())
 
 @router.post("/sessions", response_model=SessionResponse)
 async def create_session(
     user_data: UserSessionCreate,
-    context_manager: ContextManagerDep
+    request: Request,
+    context_manager: ContextManagerDep,
+    rate_limits: RateLimitsDep,
+    load_shedder: LoadShedderDep
 ) -> SessionResponse:
-    """Crear nueva sesión conversacional"""
-    session_id = await context_manager.create_session(user_data.user_role)
+    """Crear nueva sesión conversacional (429 si el servidor está saturado o la IP excede su tasa)"""
+    overload = load_shedder.check()
+    if overload:
+        raise _too_many_requests(f"Servidor sobrecargado ({overload})", load_shedder.retry_after)
+    retry_after = rate_limits.session_create_per_ip.acquire(_client_ip(request))
+    if retry_after:
+        raise _too_many_requests("Demasiadas sesiones creadas desde esta IP", retry_after)
+    
+    session_id = await context_manager.create_session(user_data.user_role, user_data.tenant_id)
     context = await context_manager.get_context(session_id)
     
     return SessionResponse(
@@ -36,20 +122,24 @@ async def create_session(
         created_at=context["created_at"]
     )
 
-@router.get("/sessions/{session_id}", response_model=SessionDetailResponse)
+@router.get("/sessions/{session_id}", response_model=Union[SessionDetailResponse, SessionDeltaResponse])
 async def get_session(
     session_id: str,
-    context_manager: ContextManagerDep
-) -> SessionDetailResponse:
-    """Obtener estado completo de sesión"""
+    request: Request,
+    context_manager: ContextManagerDep,
+    context_snapshots: ContextSnapshotsDep,
+    since: Optional[int] = None
+) -> Union[SessionDetailResponse, SessionDeltaResponse]:
+    """Obtener estado de sesión (JSON o MessagePack/zstd según Accept; JSON Patch con `since`)"""
     try:
         context = await context_manager.get_context(session_id)
         completion = await context_manager.get_completion_status(session_id)
         
-        return SessionDetailResponse(
+        detail = SessionDetailResponse(
             session_id=session_id,
             user_role=context["user_role"],
             created_at=context["created_at"],
+            context_version=context["context_version"],
             completion_status=completion,
             data=context["data"],
             validation_state=context["validation_state"],
@@ -57,48 +147,303 @@ async def get_session(
         )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    
+    document = detail.model_dump(mode="json")
+    patch = context_snapshots.delta(session_id, since, document) if since is not None else None
+    context_snapshots.record(session_id, detail.context_version, document)
+    payload = detail if patch is None else SessionDeltaResponse(
+        session_id=session_id,
+        base_version=since,
+        context_version=detail.context_version,
+        patch=patch
+    )
+    
+    content_type, compress = wire.negotiate(request.headers.get("accept"), request.headers.get("accept-encoding"))
+    if content_type == wire.JSON and not compress:
+        # Serializar desde el modelo en un solo paso (sin revalidar contra response_model)
+        return Response(content=payload.model_dump_json(), media_type=wire.JSON)
+    body, headers = wire.encode(payload.model_dump(mode="json"), content_type, compress)
+    return Response(content=body, media_type=headers.pop("Content-Type"), headers=headers)
+
+@router.patch("/sessions/{session_id}/agent_results")
+async def update_agent_results(
+    session_id: str,
+    update: AgentResultsUpdate,
+    background_tasks: BackgroundTasks,
+    context_manager: ContextManagerDep,
+    connections: ConnectionManagerDep,
+    chat_turn: ChatTurnDep
+) -> Dict:
+    """Guardar resultados de un agente y avisar a los sockets de la sesión"""
+    try:
+        entry = await context_manager.update_agent_trigger(
+            session_id, update.agent_name, status="completed", result=update.results
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    await connections.push(session_id, WebSocketMessage(
+        type="status",
+        data={"agent": update.agent_name, **entry}
+    ).model_dump())
+    background_tasks.add_task(_dispatch_dependents, chat_turn, connections, session_id, update.agent_name)
+    return {"session_id": session_id, "agent_name": update.agent_name, "status": entry["status"]}
+
+@router.post("/sessions/{session_id}/agent_status")
+async def update_agent_status(
+    session_id: str,
+    update: AgentStatusUpdate,
+    background_tasks: BackgroundTasks,
+    context_manager: ContextManagerDep,
+    connections: ConnectionManagerDep,
+    chat_turn: ChatTurnDep
+) -> Dict:
+    """Registrar el estado de un agente y avisar a los sockets de la sesión"""
+    fields = {"status": update.status}
+    if update.completed_at:
+        fields["completed_at"] = update.completed_at.isoformat()
+    try:
+        await context_manager.update_agent_trigger(session_id, update.agent_name, **fields)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    await connections.push(session_id, WebSocketMessage(
+        type="status",
+        data={"agent": update.agent_name, **fields}
+    ).model_dump())
+    background_tasks.add_task(_dispatch_dependents, chat_turn, connections, session_id, update.agent_name)
+    return {"session_id": session_id, "agent_name": update.agent_name, "status": update.status}
+
+@router.post("/broadcast")
+async def broadcast(message: WebSocketMessage, connections: ConnectionManagerDep) -> Dict:
+    """Difundir un mensaje a todos los chats abiertos, en todos los workers"""
+    await connections.broadcast(message.model_dump())
+    return {"status": "sent"}
+
+@router.post("/agents/register", response_model=AgentRegistrationResponse)
+async def register_agent(
+    registration: AgentRegistrationRequest,
+    agent_orchestrator: AgentOrchestratorDep,
+    agent_registry: AgentRegistryDep
+) -> AgentRegistrationResponse:
+    """Registrar (o actualizar) un agente de forma persistente"""
+    try:
+        revision = await agent_registry.save(agent_orchestrator, **registration.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    config = agent_orchestrator.registered_agents[registration.name]
+    return AgentRegistrationResponse(
+        name=registration.name,
+        revision=revision,
+        watches=sorted(config.watches),
+        depends_on=config.depends_on
+    )
+
+@router.get("/agents")
+async def list_agents(agent_orchestrator: AgentOrchestratorDep, agent_registry: AgentRegistryDep) -> Dict:
+    """Agentes registrados en este worker"""
+    return {
+        "revision": agent_registry.revision,
+        "agents": {
+            name: {"endpoint": config.endpoint, "trigger_spec": config.trigger_spec, "depends_on": config.depends_on}
+            for name, config in agent_orchestrator.registered_agents.items()
+        }
+    }
+
+@router.delete("/agents/{agent_name}")
+async def unregister_agent(
+    agent_name: str,
+    agent_orchestrator: AgentOrchestratorDep,
+    agent_registry: AgentRegistryDep
+) -> Dict:
+    """Dar de baja un agente registrado"""
+    if not await agent_registry.remove(agent_orchestrator, agent_name):
+        raise HTTPException(status_code=404, detail=f"Agente no encontrado: {agent_name}")
+    return {"name": agent_name, "revision": agent_registry.revision}
+
+@router.get("/metrics")
+async def get_metrics(
+    validation_engine: ValidationEngineDep,
+    agent_orchestrator: AgentOrchestratorDep,
+    http_client: HTTPClientDep,
+    context_snapshots: ContextSnapshotsDep,
+    connections: ConnectionManagerDep,
+    rate_limits: RateLimitsDep,
+    load_shedder: LoadShedderDep
+) -> Dict:
+    """Métricas operativas de los componentes core"""
+    return {
+        "validation_cache": validation_engine.cache_stats(),
+        "http_pool": http_client.stats(),
+        "agents": agent_orchestrator.metrics(),
+        "agent_cache": agent_orchestrator.cache_stats(),
+        "agent_coalescing": agent_orchestrator.coalescing_stats(),
+        "agent_batching": agent_orchestrator.batching_stats(),
+        "agent_context_deltas": agent_orchestrator.delta_stats(),
+        "agent_admission": agent_orchestrator.admission_stats(),
+        "context_snapshots": context_snapshots.stats(),
+        "websockets": connections.stats(),
+        "rate_limits": rate_limits.stats(),
+        "load_shedding": load_shedder.stats()
+    }
 
 @router.websocket("/chat/{session_id}")
 async def chat_websocket(
     websocket: WebSocket,
     session_id: str,
-    context_manager: ContextManagerDep,
-    chatbot_ingestor: ChatbotIngestorDep
+    chat_turn: ChatTurnDep,
+    connections: ConnectionManagerDep,
+    rate_limits: RateLimitsDep,
+    load_shedder: LoadShedderDep,
+    protocol: str = "full"
 ):
     """Chat en tiempo real - bidireccional"""
-    await websocket.accept()
-    active_connections[session_id] = websocket
+    # Con el servidor saturado no se aceptan sockets nuevos
+    if load_shedder.check():
+        await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        return
+    # Los envíos del servidor a esta sesión llegan vía broker desde cualquier worker
+    # Todo envío pasa por la cola acotada del socket: un cliente lento no frena este bucle
+    try:
+        writer = await connections.connect(session_id, websocket)
+    except ConnectionRejected:
+        await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        return
+    try:
+        await websocket.accept()
+    except Exception:
+        await connections.disconnect(session_id, writer, flush=False)
+        raise
+    writer.start()
+    stream = ContextStream() if protocol == "delta" else None
     
+    async def handle(_, message):
+        # Tarea propia del socket: el bucle de recepción sigue leyendo (pongs
+        # incluidos) mientras los agentes trabajan, y los turnos van en orden
+        if isinstance(message, ClientControl):
+            writer.send((await _chat_snapshot(chat_turn, session_id, stream)).model_dump())
+        else:
+            writer.send((await _chat_reply(chat_turn, session_id, message.text, stream)).model_dump())
+    
+    turns = MultiplexedSessions(writer, handle, max_sessions=1, max_pending=connections.mux_max_pending, max_inflight=1)
+    turns.open(session_id)
     try:
+        if stream is not None:
+            writer.send((await _chat_snapshot(chat_turn, session_id, stream)).model_dump())
+        
         while True:
             # Recibir mensaje del cliente
-            data = await websocket.receive_json()
-            message = ChatMessage(**data)
+            message = await writer.receive()
+            if isinstance(message, ClientControl):
+                if stream is not None and message.type == "resync":
+                    turns.submit(session_id, message)
+                continue
+            
+            rejection = _admit_chat(load_shedder, rate_limits, session_id, writer.client_ip)
+            if rejection is None and not turns.submit(session_id, message):
+                rejection = _rejection("backpressure", "Demasiados mensajes pendientes en la sesión", load_shedder.retry_after)
+            if rejection is not None:
+                writer.send(rejection.model_dump())
             
-            # Procesar mensaje con el ingestor
-            result = await chatbot_ingestor.process_message(
-                message.text,
-                session_id,
-                "user"  # TODO: Obtener rol real del contexto
-            )
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        writer.send(WebSocketMessage(
+            type="error",
+            data={"error": str(e)}
+        ).model_dump())
+    finally:
+        await turns.cancel()
+        await connections.disconnect(session_id, writer)
+
+@router.websocket("/mux")
+async def chat_multiplexed(
+    websocket: WebSocket,
+    chat_turn: ChatTurnDep,
+    connections: ConnectionManagerDep,
+    rate_limits: RateLimitsDep,
+    load_shedder: LoadShedderDep,
+    protocol: str = "full"
+):
+    """Chat multiplexado: muchas sesiones por un único socket (integradores B2B)"""
+    if load_shedder.check():
+        await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        return
+    try:
+        writer = connections.register(websocket, multiplexed=True)
+    except ConnectionRejected:
+        await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        return
+    try:
+        await websocket.accept()
+    except Exception:
+        await connections.unregister(writer, flush=False)
+        raise
+    writer.start()
+    delta = protocol == "delta"
+    streams: Dict[str, ContextStream] = {}
+    
+    def send(session_id: str, message: WebSocketMessage):
+        writer.send({**message.model_dump(), "session_id": session_id})
+    
+    async def handle(session_id: str, frame):
+        # Tarea propia de la sesión: las tramas llegan aquí en orden
+        if isinstance(frame, MuxControl):
+            if frame.type == "close":
+                streams.pop(session_id, None)
+                if session_id not in sessions:
+                    await connections.detach(session_id, writer)
+                send(session_id, WebSocketMessage(type="closed", data={}))
+            elif delta:
+                stream = streams.setdefault(session_id, ContextStream())
+                send(session_id, await _chat_snapshot(chat_turn, session_id, stream))
+            return
+        stream = streams.setdefault(session_id, ContextStream()) if delta else None
+        if stream is not None and stream.version is None:
+            send(session_id, await _chat_snapshot(chat_turn, session_id, stream))
+        send(session_id, await _chat_reply(chat_turn, session_id, frame.text, stream))
+    
+    sessions = connections.multiplex(writer, handle)
+    try:
+        while True:
+            try:
+                frame = await writer.receive(mux_frames)
+            except ValidationError as e:
+                # Una trama mal formada se rechaza sin cerrar las demás sesiones del socket
+                writer.send(WebSocketMessage(
+                    type="error",
+                    data={"code": "invalid_frame", "error": "Trama no válida", "details": e.errors(include_url=False, include_context=False, include_input=False)}
+                ).model_dump())
+                continue
+            if isinstance(frame, ClientControl):
+                continue
+            session_id = frame.session_id
             
-            # Enviar respuesta al cliente
-            await websocket.send_json(WebSocketMessage(
-                type="message",
-                data={
-                    "response": result.response_text,
-                    "context": result.context_updated,
-                    "validation": result.validation_status,
-                    "agents": result.agents_triggered,
-                    "next_action": result.next_suggested_action
-                }
-            ).dict())
+            if session_id not in sessions:
+                if isinstance(frame, MuxControl) and frame.type == "close":
+                    continue
+                if not sessions.open(session_id):
+                    send(session_id, _rejection("too_many_sessions", f"Límite de sesiones por socket alcanzado ({sessions.max_sessions})", 0))
+                    continue
+                await connections.attach(session_id, writer)
             
+            if not isinstance(frame, MuxControl):
+                # Sin límite por IP: un socket multiplexado lleva muchas sesiones de la
+                # misma IP y ya lo acotan max_sessions/max_inflight y el límite por sesión
+                rejection = _admit_chat(load_shedder, rate_limits, session_id, None)
+                if rejection is not None:
+                    send(session_id, rejection)
+                    continue
+            if not sessions.submit(session_id, frame):
+                send(session_id, _rejection("backpressure", "Demasiados mensajes pendientes en la sesión", load_shedder.retry_after))
+    
     except WebSocketDisconnect:
-        active_connections.pop(session_id, None)
+        pass
     except Exception as e:
-        await websocket.send_json(WebSocketMessage(
+        writer.send(WebSocketMessage(
             type="error",
             data={"error": str(e)}
-        ).dict())
-        active_connections.pop(session_id, None) 
\ No newline at end of file
+        ).model_dump())
+    finally:
+        await connections.unregister(writer)
\ No newline at end of file
@@ -0,0 +1,20 @@
+from typing import Any
+import os
+
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+
+# Con uvicorn lanzado a mano: --ws api.ws_protocol:TunedDeflateWebSocketProtocol
+class TunedDeflateWebSocketProtocol(WebSocketProtocol):
+    """Protocolo WebSocket de uvicorn con permessage-deflate ajustable"""
+    
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        if self.config.ws_per_message_deflate:
+            self.available_extensions = [ServerPerMessageDeflateFactory(
+                server_max_window_bits=int(os.getenv("WS_DEFLATE_WINDOW_BITS", "12")),
+                compress_settings={
+                    "level": int(os.getenv("WS_DEFLATE_LEVEL", "6")),
+                    "memLevel": int(os.getenv("WS_DEFLATE_MEM_LEVEL", "5"))
+                }
+            )]
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""Benchmark: CPU de compresión frente a bytes ahorrados (respuestas HTTP y permessage-deflate)
+
+Uso (desde chatbot-ingestor-core):
+    python -m benchmarks.compression --fields 100 1000 5000 --frames 200
+"""
+import argparse
+import time
+import zlib
+from datetime import datetime
+
+from api.models.schemas import SessionDetailResponse, WebSocketMessage
+from core import wire
+from core.compression import BROTLI, GZIP, CompressionMiddleware, brotli
+
+HTTP_SETTINGS = [(GZIP, 1), (GZIP, 6), (GZIP, 9), (BROTLI, 1), (BROTLI, 4), (BROTLI, 6), (BROTLI, 9)]
+# (nivel, bits de ventana, memLevel): el primero es el valor por defecto de websockets
+DEFLATE_SETTINGS = [(6, 15, 8), (6, 12, 5), (1, 12, 5), (6, 10, 4), (9, 12, 5)]
+
+def session_detail(fields: int) -> bytes:
+    """Detalle de sesión en JSON con `fields` campos de contexto y resultados de agentes"""
+    data = {
+        f"field_{i}": {"value": f"valor del campo {i}", "score": round(i / 7, 4), "source": "chat", "tags": ["mercado", "pyme"]}
+        for i in range(fields)
+    }
+    agent_triggers = {
+        "market_analysis": {"status": "completed", "result": {f"segment_{i}": {"share": i / fields, "growth": 0.05} for i in range(fields // 4)}}
+    }
+    detail = SessionDetailResponse(
+        session_id="bench",
+        user_role="user",
+        created_at=datetime.utcnow(),
+        context_version=fields,
+        completion_status={"general": 0.8},
+        data=data,
+        validation_state={},
+        agent_triggers=agent_triggers
+    )
+    return detail.model_dump_json().encode("utf-8")
+
+def chat_frames(frames: int) -> list:
+    """Tramas de respuesta del chat: mismo esqueleto con contenido que cambia poco a poco"""
+    result = []
+    for i in range(frames):
+        message = WebSocketMessage(type="delta", data={
+            "response": "He actualizado la información de tu empresa",
+            "validation": {f"field_{i}": {"is_valid": True, "message": "Correcto", "suggestions": []}},
+            "agents": ["market_analysis"] if i % 5 == 0 else [],
+            "next_action": "Cuéntame sobre tus competidores",
+            "base_version": i,
+            "context_version": i + 1,
+            "patch": [{"op": "add", "path": f"/data/field_{i}", "value": f"valor del campo {i}"}],
+            "completion": {"general": round(i / frames, 2)}
+        })
+        result.append(wire.dumps(message.model_dump()))
+    return result
+
+def compress_http(body: bytes, encoding: str, level: int, repeat: int) -> tuple:
+    middleware = CompressionMiddleware(None, gzip_level=level, brotli_quality=level)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        compressor = middleware._compressor(encoding)
+        out = compressor.compress(body) + compressor.finish()
+    return (time.perf_counter() - start) / repeat, len(out)
+
+def compress_frames(frames: list, level: int, window_bits: int, mem_level: int) -> tuple:
+    # Igual que permessage-deflate con contexto entre mensajes: deflate crudo + Z_SYNC_FLUSH
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -window_bits, mem_level)
+    total = 0
+    start = time.perf_counter()
+    for frame in frames:
+        total += len(compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return time.perf_counter() - start, total
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fields", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    
+    print("Respuestas HTTP (detalle de sesión)")
+    print(f"{'campos':>8}{'original':>11}{'codec':>8}{'nivel':>6}{'comprimido':>12}{'ratio':>7}{'CPU (ms)':>10}{'KB ahorrados/ms':>17}")
+    for fields in args.fields:
+        body = session_detail(fields)
+        for encoding, level in HTTP_SETTINGS:
+            if encoding == BROTLI and brotli is None:
+                continue
+            elapsed, size = compress_http(body, encoding, level, args.repeat)
+            saved = (len(body) - size) / 1024
+            print(f"{fields:>8}{len(body):>11}{encoding:>8}{level:>6}{size:>12}{len(body) / size:>7.1f}{elapsed * 1000:>10.2f}{saved / (elapsed * 1000):>17.0f}")
+    
+    frames = chat_frames(args.frames)
+    raw = sum(len(frame) for frame in frames)
+    print(f"\npermessage-deflate ({args.frames} tramas de chat, {raw} bytes sin comprimir)")
+    print(f"{'nivel':>6}{'ventana':>9}{'memLevel':>10}{'bytes':>9}{'ratio':>7}{'µs/trama':>10}{'estado zlib (KB)':>18}")
+    for level, window_bits, mem_level in DEFLATE_SETTINGS:
+        elapsed, size = compress_frames(frames, level, window_bits, mem_level)
+        # Memoria del compresor según zlib: 2^(wbits+2) + 2^(memLevel+9)
+        state = ((1 << (window_bits + 2)) + (1 << (mem_level + 9))) / 1024
+        print(f"{level:>6}{window_bits:>9}{mem_level:>10}{size:>9}{raw / size:>7.1f}{elapsed / len(frames) * 1e6:>10.1f}{state:>18.0f}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
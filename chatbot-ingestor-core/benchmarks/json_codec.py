@@ -0,0 +1,75 @@
+"""Benchmark: coste de codificar/decodificar un turno de chat (json estándar vs orjson + pydantic)
+
+Uso (desde chatbot-ingestor-core):
+    python -m benchmarks.json_codec --fields 10 100 1000 --turns 2000
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from pydantic import TypeAdapter
+
+from api.models.schemas import ChatMessage, ClientFrame, SessionDetailResponse, WebSocketMessage
+from core import wire
+
+def build_turn(fields: int) -> tuple:
+    """Trama entrante, respuesta WebSocket y detalle de sesión con `fields` campos de contexto"""
+    data = {f"field_{i}": {"value": f"valor {i}", "score": i / 7, "tags": ["a", "b", "c"]} for i in range(fields)}
+    context = {
+        "session_id": "bench",
+        "user_role": "user",
+        "created_at": datetime.utcnow(),
+        "context_version": fields,
+        "data": data,
+        "validation_state": {},
+        "agent_triggers": {}
+    }
+    inbound = json.dumps({"text": "mi empresa es una startup", "timestamp": datetime.utcnow().isoformat()})
+    reply = WebSocketMessage(type="message", data={
+        "response": "Entendido",
+        "context": context,
+        "validation": {},
+        "agents": [],
+        "next_action": None
+    })
+    detail = SessionDetailResponse(completion_status={"general": 1.0}, **context)
+    return inbound, reply, detail
+
+def stdlib_turn(inbound: str, reply: WebSocketMessage, detail: SessionDetailResponse):
+    # Camino anterior: receive_json + ChatMessage(**data), model_dump(mode="json") + send_json
+    ChatMessage(**json.loads(inbound))
+    json.dumps(reply.model_dump(mode="json"), separators=(",", ":"), ensure_ascii=False)
+    json.dumps(detail.model_dump(mode="json"), separators=(",", ":"), ensure_ascii=False)
+
+def fast_turn(inbound: str, reply: WebSocketMessage, detail: SessionDetailResponse, frames: TypeAdapter):
+    # Camino actual: validate_json directo y orjson sobre el volcado en modo python
+    frames.validate_json(inbound)
+    wire.dumps(reply.model_dump()).decode("utf-8")
+    detail.model_dump_json()
+
+def measure(fn, turns: int, *args) -> float:
+    for _ in range(min(turns, 100)):
+        fn(*args)
+    start = time.perf_counter()
+    for _ in range(turns):
+        fn(*args)
+    return (time.perf_counter() - start) / turns * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fields", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--turns", type=int, default=2000)
+    args = parser.parse_args()
+    
+    frames = TypeAdapter(ClientFrame)
+    print(f"{'campos':>8}{'bytes':>10}{'json (µs)':>12}{'orjson (µs)':>13}{'speedup':>9}")
+    for fields in args.fields:
+        inbound, reply, detail = build_turn(fields)
+        size = len(wire.dumps(reply.model_dump()))
+        baseline = measure(stdlib_turn, args.turns, inbound, reply, detail)
+        fast = measure(fast_turn, args.turns, inbound, reply, detail, frames)
+        print(f"{fields:>8}{size:>10}{baseline:>12.1f}{fast:>13.1f}{baseline / fast:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
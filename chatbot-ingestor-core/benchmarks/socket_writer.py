@@ -0,0 +1,105 @@
+"""Benchmark: cola de salida de SocketWriter ante un cliente lento (políticas y coalescencia)
+
+Simula un socket que tarda `--latency` ms por trama mientras el servidor emite
+`--rate` mensajes/s de snapshots, deltas y estados de agentes, y comprueba en
+el lado del cliente que cada delta llega sobre la versión que tiene y que el
+último estado de cada agente es el último emitido.
+
+Uso (desde chatbot-ingestor-core):
+    python -m benchmarks.socket_writer --messages 2000 --rate 2000 --latency 1 --queue 64
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from api.connections import OVERFLOW_POLICIES, SocketWriter
+from core import wire
+
+class SlowClient:
+    """WebSocket de pruebas que tarda `latency` segundos por trama y valida el orden"""
+    
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.received = 0
+        self.version = 0
+        self.broken_deltas = 0
+        self.statuses = {}
+        self.closed_with = None
+    
+    async def send_text(self, text: str):
+        await asyncio.sleep(self.latency)
+        message = wire.loads(text)
+        self.received += 1
+        kind, data = message.get("type"), message.get("data") or {}
+        if kind == "snapshot":
+            self.version = data["context_version"]
+        elif kind == "delta":
+            if data["base_version"] != self.version:
+                self.broken_deltas += 1
+            self.version = data["context_version"]
+        elif kind == "status":
+            self.statuses[data["agent"]] = data["seq"]
+    
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+async def run(policy: str, messages: int, rate: float, latency: float, queue: int, seed: int, burst: int = 20) -> dict:
+    rng = random.Random(seed)
+    client = SlowClient(latency)
+    writer = SocketWriter(client, max_size=queue, policy=policy, send_timeout=5.0)
+    writer.start()
+    
+    version, last_status, enqueued, enqueue_time = 0, {}, 0, 0.0
+    for i in range(messages):
+        roll = rng.random()
+        if roll < 0.1:
+            # Reconexión del stream: snapshot completo, base de los deltas siguientes
+            message = {"type": "snapshot", "data": {"context_version": version}}
+        elif roll < 0.4:
+            message = {"type": "delta", "data": {"base_version": version, "context_version": version + 1}}
+            version += 1
+        else:
+            agent = f"agent_{rng.randrange(4)}"
+            last_status[agent] = i
+            message = {"type": "status", "data": {"agent": agent, "seq": i}}
+        start = time.perf_counter()
+        enqueued += writer.send(message)
+        enqueue_time += time.perf_counter() - start
+        if i % burst == burst - 1:
+            await asyncio.sleep(burst / rate)
+    
+    await writer.close(flush=True)
+    lost_statuses = sum(1 for agent, seq in last_status.items() if client.statuses.get(agent) != seq)
+    return {
+        "policy": policy,
+        "enqueued": enqueued,
+        "sent": writer.sent,
+        "coalesced": writer.coalesced,
+        "dropped": writer.dropped,
+        "slow_consumer": writer.slow_consumer,
+        "broken_deltas": client.broken_deltas,
+        "lost_statuses": lost_statuses,
+        "enqueue_us": enqueue_time / messages * 1e6
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=2000.0, help="mensajes/s emitidos por el servidor")
+    parser.add_argument("--latency", type=float, default=1.0, help="ms por trama en el cliente")
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    
+    print(f"{'política':>12}{'encoladas':>11}{'enviadas':>10}{'fusionadas':>12}{'descartadas':>13}{'lento':>7}{'deltas rotos':>14}{'estados perdidos':>18}{'µs/envío':>10}")
+    for policy in OVERFLOW_POLICIES:
+        result = asyncio.run(run(policy, args.messages, args.rate, args.latency / 1000, args.queue, args.seed))
+        print(
+            f"{result['policy']:>12}{result['enqueued']:>11}{result['sent']:>10}{result['coalesced']:>12}"
+            f"{result['dropped']:>13}{str(result['slow_consumer']):>7}{result['broken_deltas']:>14}"
+            f"{result['lost_statuses']:>18}{result['enqueue_us']:>10.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
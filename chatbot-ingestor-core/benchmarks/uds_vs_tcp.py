@@ -0,0 +1,97 @@
+"""Benchmark: latencia y throughput de invocación de agentes por TCP loopback vs socket Unix
+
+Uso (desde chatbot-ingestor-core):
+    python -m benchmarks.uds_vs_tcp --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+from core.http_client import HTTPClientPool
+from core.transports import HTTPTransport
+
+def build_agent_app() -> FastAPI:
+    """Agente mínimo que devuelve el contexto recibido, para medir solo el transporte"""
+    app = FastAPI()
+    
+    @app.post("/agents/echo/execute")
+    async def execute(request: Request):
+        return Response(content=await request.body(), media_type=request.headers.get("content-type"))
+    
+    return app
+
+def start_server(app: FastAPI, **bind) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", access_log=False, **bind))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+async def measure(endpoint: str, payload: dict, requests: int, concurrency: int) -> dict:
+    pool = HTTPClientPool(limit=concurrency, limit_per_host=concurrency)
+    transport = HTTPTransport(pool)
+    try:
+        for _ in range(50):
+            await transport.send("echo", endpoint, payload)
+        
+        latencies = []
+        for _ in range(min(requests, 1000)):
+            start = time.perf_counter()
+            await transport.send("echo", endpoint, payload)
+            latencies.append(time.perf_counter() - start)
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def one():
+            async with semaphore:
+                await transport.send("echo", endpoint, payload)
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        await pool.close()
+    
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "rps": requests / elapsed
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--payload-fields", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    
+    socket_path = os.path.join(tempfile.mkdtemp(), "agent.sock")
+    start_server(build_agent_app(), host="127.0.0.1", port=args.port)
+    start_server(build_agent_app(), uds=socket_path)
+    
+    payload = {
+        "session_id": "bench",
+        "data": {f"field_{i}": f"valor {i}" for i in range(args.payload_fields)},
+        "agent_triggers": {}
+    }
+    targets = {
+        "tcp": f"http://127.0.0.1:{args.port}/agents/echo/execute",
+        "uds": f"unix://{socket_path}/agents/echo/execute"
+    }
+    
+    results = {name: asyncio.run(measure(url, payload, args.requests, args.concurrency)) for name, url in targets.items()}
+    print(f"{'transporte':<12}{'p50 (ms)':>10}{'p99 (ms)':>10}{'req/s':>10}")
+    for name, result in results.items():
+        print(f"{name:<12}{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}{result['rps']:>10.0f}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
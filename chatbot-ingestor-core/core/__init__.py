@@ -1,13 +1,20 @@
 from .context import ContextManager
-from .validation import ValidationEngine, ValidationResult
+from .validation import ValidationEngine, ValidationResult, BulkValidationResult
 from .orchestrator import AgentOrchestrator
+from .exceptions import AgentInvocationError, AgentUnavailableError
+from .scheduler import AgentScheduler, ScheduleReport
 from .ingestor import ChatbotIngestor, ProcessResult
 
 __all__ = [
     'ContextManager',
     'ValidationEngine',
     'ValidationResult',
+    'BulkValidationResult',
     'AgentOrchestrator',
+    'AgentInvocationError',
+    'AgentUnavailableError',
+    'AgentScheduler',
+    'ScheduleReport',
     'ChatbotIngestor',
     'ProcessResult'
 ] 
\ No newline at end of file
@@ -0,0 +1,173 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
+import asyncio
+import heapq
+import itertools
+import time
+
+from .resilience import LatencyTracker
+
+# Carriles de prioridad: el interactivo se atiende siempre antes que el batch
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANES = (INTERACTIVE, BATCH)
+
+class _Waiter:
+    __slots__ = ("agent", "tenant", "lane", "tag", "seq", "future", "enqueued_at")
+    
+    def __init__(self, agent: str, tenant: str, lane: str, tag: float, seq: int):
+        self.agent = agent
+        self.tenant = tenant
+        self.lane = lane
+        self.tag = tag
+        self.seq = seq
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+class FairQueue:
+    """Admisión de invocaciones de agentes por carril, con reparto justo entre tenants y límites"""
+    
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        batch_limit: Optional[int] = None,
+        weights: Optional[Dict[str, float]] = None
+    ):
+        self.max_concurrency = max_concurrency
+        self.batch_limit = max(1, max_concurrency * 3 // 4) if batch_limit is None else batch_limit
+        self.weights = dict(weights or {})
+        self._agent_limits: Dict[str, int] = {}
+        self._queues: Dict[str, Dict[str, List[Tuple[float, int, _Waiter]]]] = {lane: {} for lane in LANES}
+        self._queued = {lane: 0 for lane in LANES}
+        self._virtual_time = {lane: 0.0 for lane in LANES}
+        self._finish_tags: Dict[tuple, float] = {}
+        self._seq = itertools.count()
+        self._running = {lane: 0 for lane in LANES}
+        self._running_by_agent: Dict[str, int] = {}
+        self._admitted = {lane: 0 for lane in LANES}
+        self._wait = {lane: LatencyTracker(window=1000) for lane in LANES}
+    
+    def set_agent_limit(self, agent_name: str, limit: Optional[int]):
+        """Concurrencia máxima de un agente (None = solo el límite global)"""
+        if limit is None:
+            self._agent_limits.pop(agent_name, None)
+        else:
+            self._agent_limits[agent_name] = limit
+        self._dispatch()
+    
+    @asynccontextmanager
+    async def slot(self, agent_name: str, tenant: str = "default", lane: str = INTERACTIVE) -> AsyncIterator[None]:
+        """Esperar turno y ocupar un hueco mientras dura el bloque"""
+        await self.acquire(agent_name, tenant, lane)
+        try:
+            yield
+        finally:
+            self.release(agent_name, lane)
+    
+    async def acquire(self, agent_name: str, tenant: str = "default", lane: str = INTERACTIVE):
+        """Encolar la petición y esperar a que el planificador la admita"""
+        if lane not in self._queues:
+            raise ValueError(f"Carril no soportado: {lane}")
+        
+        key = (lane, tenant)
+        tag = max(self._virtual_time[lane], self._finish_tags.get(key, 0.0)) + 1.0 / self.weights.get(tenant, 1.0)
+        self._finish_tags[key] = tag
+        waiter = _Waiter(agent_name, tenant, lane, tag, next(self._seq))
+        heapq.heappush(self._queues[lane].setdefault(agent_name, []), (tag, waiter.seq, waiter))
+        self._queued[lane] += 1
+        self._dispatch()
+        
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Ya se había admitido: devolver el hueco
+                self.release(agent_name, lane)
+            else:
+                # Sigue en su heap hasta llegar a la cima; ya no cuenta como encolada
+                self._queued[lane] -= 1
+            raise
+    
+    def release(self, agent_name: str, lane: str = INTERACTIVE):
+        """Liberar un hueco y admitir a los siguientes"""
+        self._running[lane] -= 1
+        remaining = self._running_by_agent.get(agent_name, 1) - 1
+        if remaining:
+            self._running_by_agent[agent_name] = remaining
+        else:
+            self._running_by_agent.pop(agent_name, None)
+        self._dispatch()
+    
+    def _has_capacity(self, agent_name: str, lane: str) -> bool:
+        if sum(self._running.values()) >= self.max_concurrency:
+            return False
+        if lane == BATCH and self._running[BATCH] >= self.batch_limit:
+            return False
+        limit = self._agent_limits.get(agent_name)
+        return limit is None or self._running_by_agent.get(agent_name, 0) < limit
+    
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """Menor etiqueta admisible, recorriendo los carriles por prioridad"""
+        for lane in LANES:
+            heaps = self._queues[lane]
+            best = None
+            for agent_name in list(heaps):
+                heap = heaps[agent_name]
+                while heap and heap[0][2].future.done():
+                    heapq.heappop(heap)
+                if not heap:
+                    del heaps[agent_name]
+                    continue
+                if self._has_capacity(agent_name, lane) and (best is None or heap[0] < best):
+                    best = heap[0]
+            if best is not None:
+                return best[2]
+        return None
+    
+    def _dispatch(self):
+        while sum(self._running.values()) < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            
+            heap = self._queues[waiter.lane][waiter.agent]
+            heapq.heappop(heap)
+            if not heap:
+                del self._queues[waiter.lane][waiter.agent]
+            self._queued[waiter.lane] -= 1
+            self._virtual_time[waiter.lane] = waiter.tag
+            # Un tenant sin más peticiones por delante de V equivale a uno nuevo: no acumular
+            # etiquetas de tenants efímeros (p. ej. una por sesión)
+            key = (waiter.lane, waiter.tenant)
+            if self._finish_tags.get(key, 0.0) <= waiter.tag:
+                self._finish_tags.pop(key, None)
+            self._running[waiter.lane] += 1
+            self._running_by_agent[waiter.agent] = self._running_by_agent.get(waiter.agent, 0) + 1
+            self._admitted[waiter.lane] += 1
+            self._wait[waiter.lane].record(time.monotonic() - waiter.enqueued_at)
+            waiter.future.set_result(None)
+    
+    def depth(self) -> int:
+        """Peticiones esperando turno en todos los carriles"""
+        return sum(self._queued.values())
+    
+    def stats(self) -> Dict[str, Any]:
+        """Profundidad de colas, ocupación y tiempos de espera por carril"""
+        queued_by_tenant: Dict[str, int] = {}
+        for heaps in self._queues.values():
+            for heap in heaps.values():
+                for _, _, waiter in heap:
+                    if not waiter.future.done():
+                        queued_by_tenant[waiter.tenant] = queued_by_tenant.get(waiter.tenant, 0) + 1
+        
+        return {
+            "max_concurrency": self.max_concurrency,
+            "batch_limit": self.batch_limit,
+            "running": dict(self._running),
+            "running_by_agent": dict(self._running_by_agent),
+            "queued": dict(self._queued),
+            "queued_by_tenant": queued_by_tenant,
+            "admitted": dict(self._admitted),
+            "wait_p50": {lane: tracker.percentile(50) for lane, tracker in self._wait.items()},
+            "wait_p99": {lane: tracker.percentile(99) for lane, tracker in self._wait.items()}
+        }
\ No newline at end of file
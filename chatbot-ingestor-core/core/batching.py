@@ -0,0 +1,89 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+
+BatchSender = Callable[[List[Dict[str, Any]]], Awaitable[List[Any]]]
+
+class AgentBatcher:
+    """Agrupa invocaciones pendientes de un agente durante una ventana breve"""
+    
+    def __init__(self, send_batch: BatchSender, window: float = 0.005, max_batch: int = 32):
+        self.send_batch = send_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # El event loop solo guarda referencias débiles a las tareas: sin esto podrían recolectarse a medias
+        self._dispatching: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+    
+    async def submit(self, payload: Dict[str, Any]) -> Any:
+        """Encolar un contexto y esperar su resultado individual"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((payload, future))
+        
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+    
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._dispatching.add(task)
+            task.add_done_callback(self._dispatching.discard)
+    
+    async def _dispatch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        
+        try:
+            results = await self.send_batch([payload for payload, _ in batch])
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+    
+    async def close(self):
+        """Cancelar los lotes en curso (sus llamadas reciben CancelledError)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for _, future in self._pending:
+            future.cancel()
+        self._pending = []
+        for task in list(self._dispatching):
+            task.cancel()
+        await asyncio.gather(*self._dispatching, return_exceptions=True)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de agrupación"""
+        return {
+            "pending": len(self._pending),
+            "in_flight": len(self._dispatching),
+            "batches": self.batches,
+            "items": self.items,
+            "largest_batch": self.largest_batch,
+            "avg_batch": self.items / self.batches if self.batches else 0.0
+        }
\ No newline at end of file
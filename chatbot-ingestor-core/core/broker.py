@@ -0,0 +1,208 @@
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+
+from . import wire
+
+# Redis es opcional: sin él solo está disponible el broker en memoria (un único worker)
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+class MessageBroker(ABC):
+    """Pub/sub entre workers para hacer llegar mensajes a sockets de otro proceso"""
+    
+    def __init__(self):
+        self._handlers: Dict[str, Handler] = {}
+        self.published = 0
+        self.delivered = 0
+        self.handler_errors = 0
+    
+    async def start(self):
+        """Abrir conexiones (no-op si el backend no las necesita)"""
+        pass
+    
+    async def close(self):
+        """Cerrar conexiones y olvidar suscripciones"""
+        self._handlers.clear()
+    
+    @abstractmethod
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        """Publicar un mensaje JSON en un canal"""
+        pass
+    
+    async def subscribe(self, channel: str, handler: Handler):
+        """Entregar a `handler` los mensajes del canal (uno por canal y worker)"""
+        self._handlers[channel] = handler
+    
+    async def unsubscribe(self, channel: str):
+        self._handlers.pop(channel, None)
+    
+    async def _dispatch(self, channel: str, message: Dict[str, Any]):
+        handler = self._handlers.get(channel)
+        if handler is None:
+            return
+        try:
+            await handler(message)
+            self.delivered += 1
+        except Exception:
+            # Un socket roto no debe tumbar la entrega al resto de canales
+            self.handler_errors += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "subscriptions": len(self._handlers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "handler_errors": self.handler_errors
+        }
+
+class InMemoryBroker(MessageBroker):
+    """Broker dentro del proceso: válido con un solo worker y para pruebas"""
+    
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        self.published += 1
+        await self._dispatch(channel, message)
+
+class RedisBroker(MessageBroker):
+    """Broker sobre Redis pub/sub: cada worker se suscribe a los canales de sus sockets"""
+    
+    def __init__(self, url: str = "redis://localhost:6379/0", client: Any = None, reconnect_min: float = 0.1, reconnect_max: float = 30.0):
+        super().__init__()
+        if client is None and aioredis is None:
+            raise RuntimeError("RedisBroker requiere el paquete redis")
+        self.url = url
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self._client = client
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        # El lector duerme mientras no haya canales, en lugar de sondear
+        self._has_subscriptions = asyncio.Event()
+        self._resubscribe_pending = False
+        self.reader_healthy = True
+        self.reader_errors = 0
+        self.reconnects = 0
+        self.bad_messages = 0
+        self.last_reader_error: Optional[str] = None
+    
+    async def start(self):
+        if self._client is None:
+            self._client = aioredis.from_url(self.url)
+        if self._pubsub is None:
+            self._pubsub = self._client.pubsub()
+            self._reader = asyncio.create_task(self._read())
+    
+    async def close(self):
+        await super().close()
+        self._has_subscriptions.clear()
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            self._pubsub = None
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+    
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        await self.start()
+        self.published += 1
+        await self._client.publish(channel, wire.dumps(message))
+    
+    async def subscribe(self, channel: str, handler: Handler):
+        await self.start()
+        await super().subscribe(channel, handler)
+        await self._pubsub.subscribe(channel)
+        self._has_subscriptions.set()
+    
+    async def unsubscribe(self, channel: str):
+        await super().unsubscribe(channel)
+        if not self._handlers:
+            self._has_subscriptions.clear()
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(channel)
+    
+    async def _read(self):
+        backoff = self.reconnect_min
+        while True:
+            await self._has_subscriptions.wait()
+            try:
+                if self._resubscribe_pending:
+                    await self._resubscribe()
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Conexión caída o Redis reiniciado: sin esto el worker dejaría de recibir en silencio
+                self.reader_healthy = False
+                self.reader_errors += 1
+                self.last_reader_error = repr(e)
+                self._resubscribe_pending = True
+                logger.warning("Lectura de Redis pub/sub fallida (%r); reintento en %.2fs", e, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.reconnect_max)
+                continue
+            
+            self.reader_healthy = True
+            backoff = self.reconnect_min
+            if message is None or message.get("type") != "message":
+                continue
+            
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode("utf-8")
+            try:
+                payload = wire.loads(message["data"])
+            except ValueError:
+                self.bad_messages += 1
+                logger.warning("Mensaje ilegible descartado en el canal %s", channel)
+                continue
+            await self._dispatch(channel, payload)
+    
+    async def _resubscribe(self):
+        """Sustituir el pubsub por uno nuevo suscrito a los canales actuales"""
+        old, self._pubsub = self._pubsub, self._client.pubsub()
+        try:
+            await old.close()
+        except Exception:
+            pass
+        channels = list(self._handlers)
+        if channels:
+            await self._pubsub.subscribe(*channels)
+        self._resubscribe_pending = False
+        self.reconnects += 1
+        logger.info("Resuscrito a %d canales de Redis pub/sub", len(channels))
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "reader": {
+                "running": self._reader is not None and not self._reader.done(),
+                "healthy": self.reader_healthy,
+                "errors": self.reader_errors,
+                "reconnects": self.reconnects,
+                "bad_messages": self.bad_messages,
+                "last_error": self.last_reader_error
+            }
+        }
+
+def create_broker(url: str = "memory://") -> MessageBroker:
+    """Broker según URL: `memory://` o `redis://...`"""
+    if url.startswith("memory://"):
+        return InMemoryBroker()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBroker(url)
+    raise ValueError(f"Backend de broker no soportado: {url}")
\ No newline at end of file
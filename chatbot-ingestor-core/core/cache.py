@@ -0,0 +1,76 @@
+from typing import Any, Dict, Hashable, Optional
+from collections import OrderedDict
+import hashlib
+import json
+import time
+
+def fingerprint(value: Any) -> str:
+    """Huella canónica de un valor (JSON ordenado + blake2b)"""
+    payload = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+class LRUCache:
+    """Caché LRU acotada con TTL opcional y métricas de aciertos"""
+    
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Obtener valor y marcarlo como usado recientemente"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        
+        expires_at, value = entry
+        if expires_at and expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return default
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def set(self, key: Hashable, value: Any):
+        """Guardar valor, expulsando el menos usado si se supera el límite"""
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Eliminar una entrada"""
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+    
+    def clear(self):
+        """Vaciar la caché"""
+        self._entries.clear()
+    
+    def keys(self):
+        """Claves actuales (copia)"""
+        return list(self._entries.keys())
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de uso de la caché"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
\ No newline at end of file
@@ -0,0 +1,133 @@
+# Duplicado en agents-market-analyzer/utils/compression.py (los proyectos se despliegan por
+# separado y no comparten paquete): cualquier cambio debe llevarse a ambas copias
+from typing import Any, Dict, Optional
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Brotli es opcional: sin él solo se ofrece gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP = "gzip"
+BROTLI = "br"
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Codificaciones aceptadas por el cliente con su peso q"""
+    accepted: Dict[str, float] = {}
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        # wbits=31: formato gzip (cabecera + CRC), no deflate crudo
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+class _BrotliCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+    
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+class CompressionMiddleware:
+    """Compresión gzip/brotli de respuestas HTTP a partir de un tamaño mínimo"""
+    
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+    
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        accepted = parse_accept_encoding(accept_encoding)
+        candidates = [BROTLI, GZIP] if brotli is not None else [GZIP]
+        weights = {name: accepted.get(name, accepted.get("*", 0.0)) for name in candidates}
+        best = max(candidates, key=lambda name: weights[name])
+        return best if weights[best] > 0 else None
+    
+    def _compressor(self, encoding: str) -> Any:
+        if encoding == BROTLI:
+            return _BrotliCompressor(self.brotli_quality)
+        return _GzipCompressor(self.gzip_level)
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = self.negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start: Message = {}
+        compressor = None
+        passthrough = False
+        
+        async def send_compressed(message: Message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                # Las cabeceras se envían cuando se sabe si el cuerpo se comprime
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if passthrough:
+                await send(message)
+                return
+            
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                if "content-encoding" in headers or (len(body) < self.minimum_size and not more_body):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                
+                compressor = self._compressor(encoding)
+                data = compressor.compress(body)
+                if not more_body:
+                    data += compressor.finish()
+                    headers["Content-Length"] = str(len(data))
+                else:
+                    del headers["Content-Length"]
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                await send(start)
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+            
+            data = compressor.compress(body)
+            if not more_body:
+                data += compressor.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+        
+        await self.app(scope, receive, send_compressed)
\ No newline at end of file
@@ -8,26 +8,84 @@ from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
 from api.models.db_models import Session as DBSession, Message as DBMessage
+from .cache import LRUCache
+from .jsonpatch import Patch, make_patch
 
 class ContextData(BaseModel):
     """Modelo para los datos del contexto"""
     session_id: str
     user_role: str
+    tenant_id: Optional[str] = None
     created_at: datetime
+    context_version: int = 0
     data: Dict[str, Any]
     validation_state: Dict[str, Any]
     agent_triggers: Dict[str, Any]
 
+class ContextSnapshots:
+    """Últimas versiones de sesión servidas, para responder solo con diferencias"""
+    
+    def __init__(self, max_size: int = 2048):
+        self._snapshots = LRUCache(max_size=max_size)
+    
+    def record(self, session_id: str, version: int, document: Dict[str, Any]):
+        """Guardar el documento servido para `version` (debe ser una copia propia)"""
+        self._snapshots.set((session_id, version), document)
+    
+    def delta(self, session_id: str, since: int, document: Dict[str, Any]) -> Optional[Patch]:
+        """Patch desde la versión `since`; None si ya no se conserva"""
+        base = self._snapshots.get((session_id, since))
+        return None if base is None else make_patch(base, document)
+    
+    def stats(self) -> Dict[str, Any]:
+        return self._snapshots.stats()
+
+class ContextStream:
+    """Último contexto enviado por un socket, para mandar solo diferencias"""
+    
+    def __init__(self):
+        self.version: Optional[int] = None
+        self._context: Optional[Dict[str, Any]] = None
+        self._completion: Dict[str, float] = {}
+    
+    def snapshot(self, context: Dict[str, Any], completion: Dict[str, float]) -> Dict[str, Any]:
+        """Estado completo; pasa a ser la base de los siguientes deltas"""
+        document = ContextData(**context).model_dump(mode="json")
+        self.version = document["context_version"]
+        self._context = document
+        self._completion = dict(completion)
+        return {"context_version": self.version, "context": document, "completion_status": dict(completion)}
+    
+    def delta(self, context: Dict[str, Any], completion: Dict[str, float]) -> Dict[str, Any]:
+        """Patch del contexto y categorías de completitud que cambiaron desde el último envío"""
+        if self._context is None:
+            return self.snapshot(context, completion)
+        
+        document = ContextData(**context).model_dump(mode="json")
+        changed = {category: value for category, value in completion.items() if self._completion.get(category) != value}
+        changed.update({category: None for category in self._completion if category not in completion})
+        payload = {
+            "base_version": self.version,
+            "context_version": document["context_version"],
+            "patch": make_patch(self._context, document),
+            "completion": changed
+        }
+        self.version = document["context_version"]
+        self._context = document
+        self._completion = dict(completion)
+        return payload
+
 class ContextManager:
     """Gestiona el contexto JSON por sesión con persistencia"""
     
     def __init__(self, db: AsyncSession):
         self.db = db
     
-    async def create_session(self, user_role: str) -> str:
+    async def create_session(self, user_role: str, tenant_id: Optional[str] = None) -> str:
         """Crear nueva sesión con contexto inicial"""
         session = DBSession(
             user_role=user_role,
+            tenant_id=tenant_id,
             context={},
             completion_status={},
             validation_state={},
@@ -44,14 +102,30 @@ class ContextManager:
         if not session:
             raise ValueError(f"Sesión no encontrada: {session_id}")
         
-        context = session.context or {}
+        # Copia nueva: mutar el mismo dict no marca la columna JSON como modificada
+        context = dict(session.context or {})
         context[field] = value
         session.context = context
+        session.context_version = (session.context_version or 0) + 1
         
         await self.db.commit()
         await self.db.refresh(session)
         return context
     
+    async def update_agent_trigger(self, session_id: str, agent_name: str, **fields: Any) -> Dict[str, Any]:
+        """Actualizar estado/resultados de un agente en `agent_triggers`"""
+        session = await self._get_session(session_id)
+        if not session:
+            raise ValueError(f"Sesión no encontrada: {session_id}")
+        
+        agent_triggers = dict(session.agent_triggers or {})
+        agent_triggers[agent_name] = {**(agent_triggers.get(agent_name) or {}), **fields}
+        session.agent_triggers = agent_triggers
+        session.context_version = (session.context_version or 0) + 1
+        
+        await self.db.commit()
+        return agent_triggers[agent_name]
+    
     async def get_context(self, session_id: str) -> Dict[str, Any]:
         """Obtener contexto completo de sesión"""
         session = await self._get_session(session_id)
@@ -61,7 +135,9 @@ class ContextManager:
         return {
             "session_id": session.id,
             "user_role": session.user_role,
+            "tenant_id": session.tenant_id,
             "created_at": session.created_at,
+            "context_version": session.context_version or 0,
             "data": session.context or {},
             "validation_state": session.validation_state or {},
             "agent_triggers": session.agent_triggers or {}
@@ -87,6 +163,11 @@ class ContextManager:
         
         return completion
     
+    async def release(self):
+        """Cerrar la transacción abierta y devolver la conexión al pool"""
+        await self.db.commit()
+        await self.db.close()
+    
     async def _get_session(self, session_id: str) -> Optional[DBSession]:
         """Obtener sesión de la base de datos"""
         result = await self.db.execute(
@@ -0,0 +1,16 @@
+from typing import Optional
+
+class AgentInvocationError(Exception):
+    """Error al invocar un agente"""
+    
+    def __init__(self, agent_name: str, message: str, status: Optional[int] = None, retryable: bool = True):
+        super().__init__(message)
+        self.agent_name = agent_name
+        self.status = status
+        self.retryable = retryable
+
+class AgentUnavailableError(AgentInvocationError):
+    """El circuito del agente está abierto y la llamada se rechaza sin intentarla"""
+    
+    def __init__(self, agent_name: str):
+        super().__init__(agent_name, f"Agente no disponible (circuito abierto): {agent_name}", retryable=False)
\ No newline at end of file
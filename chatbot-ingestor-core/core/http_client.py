@@ -0,0 +1,173 @@
+# Duplicado en agents-market-analyzer/integrations/http_client.py (los proyectos se despliegan por
+# separado y no comparten paquete): cualquier cambio debe llevarse a ambas copias,
+# salvo los timeouts por defecto, que difieren a propósito
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import unquote
+import re
+import aiohttp
+
+# URLs de socket Unix, de más a menos explícita:
+#   unix://%2Frun%2Fapp.socket/ruta/http  ruta del socket codificada como host
+#   unix:///run/app.socket:/ruta/http     ruta del socket y ruta HTTP separadas por ":"
+#   unix:///run/app.sock/ruta/http        sin separador, el socket termina en ".sock"
+UNIX_SCHEME = "unix://"
+_SOCK_SUFFIX = re.compile(r"\.sock(?=/|$)")
+
+def split_unix_url(url: str) -> Tuple[Optional[str], str]:
+    """Separar una URL `unix://` en (ruta del socket, URL HTTP); (None, url) si es TCP"""
+    if not url.startswith(UNIX_SCHEME):
+        return None, url
+    
+    rest = url[len(UNIX_SCHEME):]
+    if not rest.startswith("/"):
+        host, _, http_path = rest.partition("/")
+        return unquote(host), "http://localhost/" + http_path
+    
+    path, query_mark, query = rest.partition("?")
+    query = query_mark + query
+    if ":" in path:
+        socket_path, _, http_path = path.partition(":")
+        return socket_path, "http://localhost/" + http_path.lstrip("/") + query
+    
+    match = _SOCK_SUFFIX.search(path)
+    if match is None:
+        return path, "http://localhost/" + query
+    return path[:match.end()], "http://localhost" + (path[match.end():] or "/") + query
+
+class HTTPClientPool:
+    """Sesión aiohttp compartida con pool de conexiones afinado y métricas"""
+    
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive_timeout: float = 30.0,
+        ttl_dns_cache: int = 300,
+        total_timeout: Optional[float] = None,
+        connect_timeout: float = 5.0,
+        sock_read_timeout: Optional[float] = 900.0
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        # Sin límite total por defecto: un agente puede tardar minutos en responder;
+        # `sock_read` corta las conexiones que dejan de recibir datos
+        self.timeout = aiohttp.ClientTimeout(
+            total=total_timeout,
+            connect=connect_timeout,
+            sock_read=sock_read_timeout
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        # Una sesión por socket Unix: el conector UDS va ligado a una sola ruta
+        self._unix_sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._closed = False
+        self._counters = {"requests": 0, "connections_created": 0, "connections_reused": 0}
+    
+    async def start(self):
+        """Abrir la sesión y el pool de conexiones"""
+        if self._session is not None and not self._session.closed:
+            return
+        
+        self._closed = False
+        self._connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.ttl_dns_cache,
+            use_dns_cache=True
+        )
+        self._session = aiohttp.ClientSession(
+            connector=self._connector,
+            timeout=self.timeout,
+            trace_configs=[self._trace_config()]
+        )
+    
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Obtener la sesión compartida (se abre si aún no existe)"""
+        self._check_open()
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+    
+    def _check_open(self):
+        if self._closed:
+            raise RuntimeError("El pool HTTP está cerrado")
+    
+    def request_timeout(self, total: Optional[float]) -> aiohttp.ClientTimeout:
+        """Timeout de una petición con límite total propio (p. ej. por agente)"""
+        return aiohttp.ClientTimeout(total=total, connect=self.timeout.connect, sock_read=self.timeout.sock_read)
+    
+    async def session_for(self, url: str) -> Tuple[aiohttp.ClientSession, str]:
+        """Sesión adecuada para `url` y la URL a usar con ella (TCP o socket Unix)"""
+        socket_path, http_url = split_unix_url(url)
+        if socket_path is None:
+            return await self.get_session(), url
+        
+        self._check_open()
+        session = self._unix_sessions.get(socket_path)
+        if session is None or session.closed:
+            session = self._unix_sessions[socket_path] = aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(
+                    path=socket_path,
+                    limit=self.limit_per_host,
+                    keepalive_timeout=self.keepalive_timeout
+                ),
+                timeout=self.timeout,
+                trace_configs=[self._trace_config()]
+            )
+        return session, http_url
+    
+    async def close(self):
+        """Cerrar la sesión y liberar todas las conexiones"""
+        if self._session is not None:
+            await self._session.close()
+        for session in self._unix_sessions.values():
+            await session.close()
+        self._session = None
+        self._connector = None
+        self._unix_sessions = {}
+        self._closed = True
+    
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de utilización del pool"""
+        in_use, idle = self._usage(self._connector)
+        return {
+            "open": self._session is not None and not self._session.closed,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "in_use": in_use,
+            "idle": idle,
+            "utilization": in_use / self.limit if self.limit else 0.0,
+            "unix_sockets": {path: dict(zip(("in_use", "idle"), self._usage(session.connector))) for path, session in self._unix_sessions.items()},
+            **self._counters
+        }
+    
+    @staticmethod
+    def _usage(connector: Optional[aiohttp.BaseConnector]) -> Tuple[int, int]:
+        """Conexiones en uso y ociosas de un conector"""
+        if connector is None:
+            return 0, 0
+        in_use = len(getattr(connector, "_acquired", ()))
+        idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        return in_use, idle
+    
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        """Contadores de peticiones y de conexiones nuevas vs reutilizadas"""
+        counters = self._counters
+        
+        async def on_request_start(session, ctx, params):
+            counters["requests"] += 1
+        
+        async def on_connection_create_end(session, ctx, params):
+            counters["connections_created"] += 1
+        
+        async def on_connection_reuseconn(session, ctx, params):
+            counters["connections_reused"] += 1
+        
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
\ No newline at end of file
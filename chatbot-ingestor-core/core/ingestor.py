@@ -1,10 +1,13 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 from datetime import datetime
+import asyncio
 from pydantic import BaseModel
 
 from .context import ContextManager
 from .validation import ValidationEngine, ValidationResult
 from .orchestrator import AgentOrchestrator
+from .admission import INTERACTIVE
+from .scheduler import AgentScheduler
 
 class ProcessResult(BaseModel):
     """Resultado del procesamiento de un mensaje"""
@@ -17,10 +20,13 @@ class ProcessResult(BaseModel):
 class ChatbotIngestor:
     """Motor principal - integra todos los componentes"""
     
-    def __init__(self, context_manager: ContextManager, validation_engine: ValidationEngine, agent_orchestrator: AgentOrchestrator):
+    def __init__(self, context_manager: ContextManager, validation_engine: ValidationEngine, agent_orchestrator: AgentOrchestrator, agent_scheduler: Optional[AgentScheduler] = None):
         self.context = context_manager
         self.validation = validation_engine
         self.orchestrator = agent_orchestrator
+        self.scheduler = agent_scheduler or AgentScheduler(agent_orchestrator)
+        # Los agentes de un mismo nivel terminan a la vez y comparten la sesión de BD
+        self._persist_lock = asyncio.Lock()
     
     async def process_message(self, text: str, session_id: str, user_role: str) -> ProcessResult:
         """Procesar mensaje del usuario - flujo principal"""
@@ -28,9 +34,10 @@ class ChatbotIngestor:
         intent, extracted_data = await self._extract_intent_and_data(text)
         
         # 2. Actualizar contexto
-        context = await self.context.get_context(session_id)
         for field, value in extracted_data.items():
             await self.context.update_context(session_id, field, value)
+        # Leer después de actualizar para llevar la versión nueva del contexto
+        context = await self.context.get_context(session_id)
         
         # 3. Validar nueva información
         validation_results = {}
@@ -38,10 +45,11 @@ class ChatbotIngestor:
             validation_results[field] = await self.validation.validate_field(field, value, context)
         
         # 4. Verificar triggers de agentes
-        triggered_agents = await self.orchestrator.check_triggers(context)
-        agent_results = {}
-        for agent_name in triggered_agents:
-            agent_results[agent_name] = await self.orchestrator.invoke_agent(agent_name, context)
+        # Solo se evalúan los agentes que observan los campos modificados
+        changed_fields = [f"data.{field}" for field in extracted_data]
+        triggered_agents = await self.orchestrator.check_triggers(context, changed=changed_fields)
+        # Los agentes disparados se ejecutan por niveles de dependencia en paralelo
+        agent_results = await self.run_agents(session_id, context, triggered_agents) if triggered_agents else {}
         
         # 5. Generar respuesta contextual
         next_action = await self.validation.suggest_next_action(context)
@@ -50,10 +58,49 @@ class ChatbotIngestor:
             response_text=self._generate_response(intent, validation_results, agent_results),
             context_updated=context,
             validation_status=validation_results,
-            agents_triggered=triggered_agents,
+            agents_triggered=triggered_agents + [name for name in agent_results if name not in triggered_agents],
             next_suggested_action=next_action
         )
     
+    async def run_agents(
+        self,
+        session_id: str,
+        context: Dict[str, Any],
+        agent_names: List[str],
+        lane: str = INTERACTIVE,
+        exclude: Iterable[str] = ()
+    ) -> Dict[str, Dict[str, Any]]:
+        """Ejecutar agentes y sus dependientes, guardando su estado en `agent_triggers`"""
+        entries: Dict[str, Dict[str, Any]] = {}
+        ran = set(exclude)
+        
+        async def persist(name: str, entry: Dict[str, Any]):
+            async with self._persist_lock:
+                entries[name] = await self.context.update_agent_trigger(session_id, name, **entry)
+        
+        pending = [name for name in agent_names if name not in ran]
+        while pending:
+            # Los agentes pueden tardar minutos: sin conexión de BD retenida mientras
+            # tanto; cada `persist` la toma solo para guardar su resultado
+            await self.context.release()
+            schedule = await self.scheduler.run(context, pending, lane=lane, include_dependents=True, on_result=persist)
+            ran.update(name for level in schedule.levels for name in level)
+            changed = [f"agent_triggers.{name}" for name in list(schedule.results) + list(schedule.errors)]
+            if not changed:
+                break
+            
+            context = await self.context.get_context(session_id)
+            pending = [name for name in await self.orchestrator.check_triggers(context, changed=changed) if name not in ran]
+        return entries
+    
+    async def agent_state_changed(self, session_id: str, agent_names: List[str], lane: str = INTERACTIVE) -> Dict[str, Dict[str, Any]]:
+        """Disparar los agentes que observan el estado de `agent_names` tras un cambio externo"""
+        context = await self.context.get_context(session_id)
+        triggered = await self.orchestrator.check_triggers(context, changed=[f"agent_triggers.{name}" for name in agent_names])
+        if not triggered:
+            return {}
+        return await self.run_agents(session_id, context, triggered, lane=lane, exclude=agent_names)
+    
     async def _extract_intent_and_data(self, text: str) -> tuple[str, Dict[str, Any]]:
         """Extraer intención y datos del mensaje del usuario"""
         # Implementación básica - se puede mejorar con NLP
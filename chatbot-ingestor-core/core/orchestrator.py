@@ -1,57 +1,406 @@
-from typing import Any, Callable, Dict, List, Optional
-import aiohttp
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Union
+import asyncio
+import copy
+import time
 from pydantic import BaseModel
 
+from .admission import BATCH, INTERACTIVE, FairQueue
+from .batching import AgentBatcher
+from .cache import LRUCache, fingerprint
+from .exceptions import AgentInvocationError, AgentUnavailableError
+from .http_client import HTTPClientPool
+from .jsonpatch import make_patch
+from .resilience import AgentCallStats, RetryPolicy
+from .singleflight import SingleFlight
+from .transports import INPROCESS_SCHEME, AgentTransport, HTTPTransport, InProcessTransport
+from .triggers import WATCH_ALL, compile_trigger, watch_keys_for
+
+TriggerCondition = Union[Callable[[Dict[str, Any]], bool], Dict[str, Any]]
+
+# Metadatos de sesión que no influyen en el resultado de un agente
+_VOLATILE_CONTEXT_KEYS = ("session_id", "created_at", "context_version")
+
 class AgentConfig(BaseModel):
     """Configuración de un agente"""
     name: str
     trigger_condition: Callable[[Dict[str, Any]], bool]
     endpoint: str
+    trigger_spec: Optional[Dict[str, Any]] = None
+    watches: FrozenSet[str] = frozenset({WATCH_ALL})
+    depends_on: List[str] = []
+    idempotent: bool = True
+    hedge: bool = False
+    cacheable: bool = True
+    shared_cache: bool = False
+    batch_endpoint: Optional[str] = None
+    delta: bool = False
+    max_concurrency: Optional[int] = None
+    timeout: Optional[float] = None
 
 class AgentOrchestrator:
     """Disparador de agentes post-validación"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        http_client: Optional[HTTPClientPool] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        hedge_min_samples: int = 20,
+        result_cache_size: int = 512,
+        result_cache_ttl: Optional[float] = 300.0,
+        batch_window: float = 0.005,
+        max_batch: int = 32,
+        context_snapshot_size: int = 2048,
+        admission: Optional[FairQueue] = None
+    ):
         self.registered_agents: Dict[str, AgentConfig] = {}
-        self._session: Optional[aiohttp.ClientSession] = None
+        self._watch_index: Dict[str, Set[str]] = {}
+        self._registration_order: Dict[str, int] = {}
+        self.http_client = http_client or HTTPClientPool()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.hedge_min_samples = hedge_min_samples
+        self._call_stats: Dict[str, AgentCallStats] = {}
+        self._result_cache = LRUCache(max_size=result_cache_size, ttl=result_cache_ttl)
+        self._inflight = SingleFlight()
+        self._http_transport = HTTPTransport(self.http_client)
+        self._local_transport = InProcessTransport()
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._batchers: Dict[str, AgentBatcher] = {}
+        # Último contexto entregado a cada (agente, sesión): base de los deltas
+        self._sent_contexts = LRUCache(max_size=context_snapshot_size)
+        self._delta_counters = {"full": 0, "delta": 0, "mismatches": 0}
+        # Toda invocación real pasa por la cola justa (prioridad, tenant y límites)
+        self.admission = admission or FairQueue()
     
-    async def register_agent(self, name: str, trigger_condition: Callable[[Dict[str, Any]], bool], endpoint: str):
+    async def register_agent(
+        self,
+        name: str,
+        trigger_condition: TriggerCondition,
+        endpoint: str,
+        required_fields: Optional[List[str]] = None,
+        idempotent: bool = True,
+        hedge: bool = False,
+        cacheable: bool = True,
+        batch_endpoint: Optional[str] = None,
+        delta: bool = False,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        shared_cache: bool = False
+    ):
         """Registrar agente con condición de disparo"""
-        self.registered_agents[name] = AgentConfig(
-            name=name,
-            trigger_condition=trigger_condition,
-            endpoint=endpoint
-        )
-    
-    async def check_triggers(self, context: Dict[str, Any]) -> List[str]:
-        """Verificar qué agentes deben ejecutarse"""
+        options = {
+            "name": name,
+            "endpoint": endpoint,
+            "idempotent": idempotent,
+            "hedge": hedge,
+            "cacheable": cacheable,
+            "batch_endpoint": batch_endpoint,
+            "delta": delta,
+            "max_concurrency": max_concurrency,
+            "timeout": timeout,
+            "shared_cache": shared_cache
+        }
+        if isinstance(trigger_condition, dict):
+            compiled = compile_trigger(trigger_condition, required_fields)
+            config = AgentConfig(
+                trigger_condition=compiled,
+                trigger_spec=trigger_condition,
+                watches=compiled.watches,
+                depends_on=compiled.depends_on,
+                **options
+            )
+        else:
+            config = AgentConfig(trigger_condition=trigger_condition, **options)
+        
+        self.unregister_agent(name)
+        self._batchers.pop(name, None)
+        self._forget_sent_contexts(name)
+        self.registered_agents[name] = config
+        self.admission.set_agent_limit(name, max_concurrency)
+        self._registration_order.setdefault(name, len(self._registration_order))
+        for key in config.watches:
+            self._watch_index.setdefault(key, set()).add(name)
+    
+    def bind_local_agent(self, name: str, agent: Any):
+        """Enlazar un agente Python para endpoints `inprocess://<name>`"""
+        self._local_transport.bind(name, agent)
+    
+    def unregister_agent(self, name: str):
+        """Eliminar agente y sus entradas del índice de observación"""
+        config = self.registered_agents.pop(name, None)
+        if config is None:
+            return
+        self.admission.set_agent_limit(name, None)
+        for key in config.watches:
+            watchers = self._watch_index.get(key)
+            if watchers:
+                watchers.discard(name)
+                if not watchers:
+                    del self._watch_index[key]
+    
+    async def check_triggers(self, context: Dict[str, Any], changed: Optional[Iterable[str]] = None) -> List[str]:
+        """Verificar qué agentes deben ejecutarse (solo los que observan `changed`, si se indica)"""
+        if changed is None:
+            candidates = self.registered_agents.keys()
+        else:
+            candidates = set(self._watch_index.get(WATCH_ALL, ()))
+            for path in changed:
+                for key in watch_keys_for(path):
+                    candidates.update(self._watch_index.get(key, ()))
+            candidates = sorted(candidates, key=self._registration_order.__getitem__)
+        
         triggered_agents = []
-        for name, config in self.registered_agents.items():
-            if config.trigger_condition(context):
+        for name in candidates:
+            if self.registered_agents[name].trigger_condition(context):
                 triggered_agents.append(name)
         return triggered_agents
     
-    async def invoke_agent(self, agent_name: str, context: Dict[str, Any]) -> Dict[str, Any]:
+    async def invoke_agent(self, agent_name: str, context: Dict[str, Any], use_cache: bool = True, lane: str = INTERACTIVE) -> Dict[str, Any]:
         """Invocar agente específico con contexto"""
         if agent_name not in self.registered_agents:
             raise ValueError(f"Agente no encontrado: {agent_name}")
         
         agent = self.registered_agents[agent_name]
+        if not agent.cacheable:
+            return await self._admitted_invoke(agent, context, lane)
+        
+        cache_key = self.cache_key(agent, context)
+        if use_cache:
+            cached = self._result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        # Llamadas concurrentes con la misma huella comparten una sola invocación
+        return await self._inflight.do(cache_key, lambda: self._invoke_and_cache(agent, context, cache_key, lane))
+    
+    async def _invoke_and_cache(self, agent: AgentConfig, context: Dict[str, Any], cache_key: tuple, lane: str) -> Dict[str, Any]:
+        result = await self._admitted_invoke(agent, context, lane)
+        # Un 200 con success=False es un fallo del agente y no debe memoizarse
+        if not (isinstance(result, dict) and result.get("success") is False):
+            self._result_cache.set(cache_key, result)
+        return result
+    
+    async def _admitted_invoke(self, agent: AgentConfig, context: Dict[str, Any], lane: str) -> Dict[str, Any]:
+        # También las que irán en lote: cada contexto se admite con su tenant y su
+        # carril antes de unirse, así que un lote no supera los huecos concedidos
+        async with self.admission.slot(agent.name, self._tenant_of(context), lane):
+            return await self._invoke_with_resilience(agent, context, lane)
+    
+    @staticmethod
+    def _tenant_of(context: Dict[str, Any]) -> str:
+        """Clave de reparto justo: el tenant de la sesión o, sin él, la propia sesión"""
+        return str(context.get("tenant_id") or context.get("session_id") or "default")
+    
+    def cache_key(self, agent: AgentConfig, context: Dict[str, Any]) -> tuple:
+        """Clave de caché y de coalescencia: agente, sesión (salvo `shared_cache`) y huella de su entrada"""
+        scope = None if agent.shared_cache else context.get("session_id")
+        # Con condición compilada solo cuentan los resultados de sus dependencias;
+        # con una opaca, los de todos los demás agentes
+        if agent.trigger_spec is not None:
+            inputs = agent.depends_on
+        else:
+            inputs = [name for name in (context.get("agent_triggers") or {}) if name != agent.name]
+        return (agent.name, scope, self.context_fingerprint(context, inputs))
+    
+    @staticmethod
+    def context_fingerprint(context: Dict[str, Any], agent_inputs: Iterable[str] = ()) -> str:
+        """Huella canónica del contexto relevante para un agente"""
+        relevant = {k: v for k, v in context.items() if k not in _VOLATILE_CONTEXT_KEYS and k != "agent_triggers"}
+        agent_triggers = context.get("agent_triggers") or {}
+        relevant["agent_triggers"] = {name: agent_triggers.get(name) for name in sorted(agent_inputs)}
+        return fingerprint(relevant)
+    
+    def invalidate_results(self, agent_name: Optional[str] = None):
+        """Vaciar la caché de resultados (de un agente o completa)"""
+        if agent_name is None:
+            self._result_cache.clear()
+            return
+        for key in [key for key in self._result_cache.keys() if key[0] == agent_name]:
+            self._result_cache.pop(key)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Métricas de la caché de resultados de agentes"""
+        return self._result_cache.stats()
+    
+    def coalescing_stats(self) -> Dict[str, int]:
+        """Métricas de llamadas idénticas agrupadas"""
+        return self._inflight.stats()
+    
+    def batching_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Métricas de lotes por agente"""
+        return {name: batcher.stats() for name, batcher in self._batchers.items()}
+    
+    def admission_stats(self) -> Dict[str, Any]:
+        """Colas y ocupación de la admisión de invocaciones"""
+        return self.admission.stats()
+    
+    def delta_stats(self) -> Dict[str, Any]:
+        """Contextos enviados completos vs como delta"""
+        return {**self._delta_counters, "snapshots": len(self._sent_contexts)}
+    
+    async def _invoke_with_resilience(self, agent: AgentConfig, context: Dict[str, Any], lane: str = INTERACTIVE) -> Dict[str, Any]:
+        """Invocar con circuito, reintentos y hedging"""
+        agent_name = agent.name
+        stats = self._stats(agent_name)
+        attempts = self.retry_policy.max_attempts if agent.idempotent else 1
         
-        if self._session is None:
-            self._session = aiohttp.ClientSession()
+        for attempt in range(attempts):
+            if not stats.breaker.allow():
+                stats.rejected += 1
+                raise AgentUnavailableError(agent_name)
+            
+            stats.calls += 1
+            try:
+                result = await self._hedged_post(agent, context, stats, lane)
+            except asyncio.CancelledError:
+                # Sin veredicto sobre el agente, pero la sonda de half_open no puede quedar tomada
+                stats.breaker.release()
+                raise
+            except AgentInvocationError as e:
+                stats.failures += 1
+                if not e.retryable:
+                    # El agente respondió (p. ej. 4xx): está sano aunque la petición no sea válida
+                    stats.breaker.record_success()
+                    raise
+                stats.breaker.record_failure()
+                if attempt == attempts - 1 or stats.breaker.is_open:
+                    raise
+                stats.retries += 1
+                await asyncio.sleep(self.retry_policy.delay(attempt))
+            except Exception:
+                # Error inesperado (transporte, serialización...): cuenta como fallo y no se reintenta
+                stats.failures += 1
+                stats.breaker.record_failure()
+                raise
+            else:
+                stats.breaker.record_success()
+                return result
+    
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Estado de circuitos, reintentos, hedging y latencias por agente"""
+        return {name: stats.snapshot() for name, stats in self._call_stats.items()}
+    
+    def _stats(self, agent_name: str) -> AgentCallStats:
+        stats = self._call_stats.get(agent_name)
+        if stats is None:
+            stats = self._call_stats[agent_name] = AgentCallStats(self.failure_threshold, self.recovery_timeout)
+        return stats
+    
+    async def _hedged_post(self, agent: AgentConfig, context: Dict[str, Any], stats: AgentCallStats, lane: str = INTERACTIVE) -> Dict[str, Any]:
+        """Enviar la petición; si supera el p95 se lanza una segunda y gana la primera en responder"""
+        transport = self._transport_for(agent)
+        can_hedge = agent.hedge and transport.supports_hedging and len(stats.latency) >= self.hedge_min_samples
+        hedge_after = stats.latency.percentile(95) if can_hedge else None
+        if hedge_after is None:
+            return await self._send(transport, agent, context, stats, lane)
         
+        primary = asyncio.ensure_future(self._send(transport, agent, context, stats, lane))
+        pending = {primary}
         try:
-            async with self._session.post(agent.endpoint, json=context) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    raise Exception(f"Error al invocar agente: {response.status}")
-        except Exception as e:
-            raise Exception(f"Error al comunicarse con el agente: {str(e)}")
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if primary in done:
+                return primary.result()
+            
+            stats.hedged += 1
+            hedge = asyncio.ensure_future(self._send(transport, agent, context, stats, lane))
+            pending.add(hedge)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            stats.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def _transport_for(self, agent: AgentConfig) -> AgentTransport:
+        """El transporte se elige por el esquema del endpoint configurado"""
+        if agent.endpoint.startswith(INPROCESS_SCHEME):
+            return self._local_transport
+        return self._http_transport
+    
+    async def _send(self, transport: AgentTransport, agent: AgentConfig, context: Dict[str, Any], stats: AgentCallStats, lane: str = INTERACTIVE) -> Dict[str, Any]:
+        """Un único intento de invocación, midiendo la latencia de los éxitos"""
+        start = time.monotonic()
+        if agent.delta and transport is self._http_transport and context.get("session_id"):
+            result = await self._deliver_delta(transport, agent, context, lane)
+        else:
+            result = await self._deliver(transport, agent, context, lane)
+        stats.latency.record(time.monotonic() - start)
+        return result
+    
+    def _uses_batcher(self, agent: AgentConfig, lane: str) -> bool:
+        # Solo el trabajo de fondo espera a formar lote: un turno de chat no paga la ventana
+        return lane == BATCH and bool(agent.batch_endpoint) and self._transport_for(agent) is self._http_transport
+    
+    async def _deliver(self, transport: AgentTransport, agent: AgentConfig, payload: Dict[str, Any], lane: str = INTERACTIVE) -> Dict[str, Any]:
+        if self._uses_batcher(agent, lane):
+            return await self._batcher_for(agent).submit(payload)
+        return await transport.send(agent.name, agent.endpoint, payload, agent.timeout)
+    
+    async def _deliver_delta(self, transport: AgentTransport, agent: AgentConfig, context: Dict[str, Any], lane: str = INTERACTIVE) -> Dict[str, Any]:
+        """Enviar solo los cambios respecto al último contexto entregado al agente"""
+        key = (agent.name, context["session_id"])
+        snapshot = copy.deepcopy(context)
+        digest = fingerprint(snapshot)
+        full = {**context, "context_digest": digest}
+        previous = self._sent_contexts.get(key)
+        
+        if previous is None:
+            self._delta_counters["full"] += 1
+            result = await self._deliver(transport, agent, full, lane)
+        else:
+            base_digest, base = previous
+            delta = {
+                "session_id": context["session_id"],
+                "context_delta": {
+                    "base_digest": base_digest,
+                    "digest": digest,
+                    "context_version": context.get("context_version"),
+                    "patch": make_patch(base, snapshot)
+                }
+            }
+            try:
+                self._delta_counters["delta"] += 1
+                result = await self._deliver(transport, agent, delta, lane)
+            except AgentInvocationError as e:
+                if e.status != 409:
+                    raise
+                self._delta_counters["mismatches"] += 1
+                self._delta_counters["full"] += 1
+                result = await self._deliver(transport, agent, full, lane)
+        
+        self._sent_contexts.set(key, (digest, snapshot))
+        return result
+    
+    def _forget_sent_contexts(self, agent_name: str):
+        for key in [key for key in self._sent_contexts.keys() if key[0] == agent_name]:
+            self._sent_contexts.pop(key)
+    
+    def _batcher_for(self, agent: AgentConfig) -> AgentBatcher:
+        batcher = self._batchers.get(agent.name)
+        if batcher is None:
+            async def send_batch(payloads: List[Dict[str, Any]]) -> List[Any]:
+                return await self._http_transport.send_batch(agent.name, agent.batch_endpoint, payloads, agent.timeout)
+            
+            batcher = self._batchers[agent.name] = AgentBatcher(
+                send_batch,
+                window=self.batch_window,
+                max_batch=self.max_batch
+            )
+        return batcher
     
     async def close(self):
-        """Cerrar sesión HTTP"""
-        if self._session:
-            await self._session.close()
-            self._session = None 
\ No newline at end of file
+        """Cancelar los lotes en curso y cerrar sesión HTTP"""
+        for batcher in self._batchers.values():
+            await batcher.close()
+        await self.http_client.close() 
\ No newline at end of file
@@ -0,0 +1,170 @@
+from typing import Any, Callable, Dict, Optional
+from collections import OrderedDict
+import asyncio
+import time
+
+class TokenBucket:
+    """Cubo de tokens: `rate` tokens por segundo con ráfagas de hasta `burst`"""
+    
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+    
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+    
+    def wait(self, now: Optional[float] = None) -> float:
+        """0 si hay un token disponible o los segundos hasta el siguiente, sin consumirlo"""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+    
+    def take(self, now: Optional[float] = None) -> float:
+        """Consumir un token; devuelve 0 si se concede o los segundos hasta el siguiente"""
+        retry_after = self.wait(now)
+        if not retry_after:
+            self.tokens -= 1
+        return retry_after
+
+class RateLimiter:
+    """Un cubo de tokens por clave (sesión, IP...), con número de claves acotado"""
+    
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+    
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+    
+    def check(self, key: str) -> float:
+        """Como `acquire` pero sin consumir el token si se admitiría"""
+        if self.rate <= 0:
+            return 0.0
+        retry_after = self._bucket(key).wait()
+        if retry_after:
+            self.limited += 1
+        return retry_after
+    
+    def acquire(self, key: str) -> float:
+        """0 si se admite; si no, segundos recomendados antes de reintentar"""
+        if self.rate <= 0:
+            self.allowed += 1
+            return 0.0
+        
+        retry_after = self._bucket(key).take()
+        if retry_after:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return retry_after
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "keys": len(self._buckets),
+            "allowed": self.allowed,
+            "limited": self.limited
+        }
+
+class RateLimits:
+    """Límites de entrada de la API: creación de sesiones y mensajes de chat"""
+    
+    def __init__(self, session_create_per_ip: RateLimiter, chat_per_session: RateLimiter, chat_per_ip: RateLimiter):
+        self.session_create_per_ip = session_create_per_ip
+        self.chat_per_session = chat_per_session
+        self.chat_per_ip = chat_per_ip
+    
+    def chat(self, session_id: str, client_ip: Optional[str]) -> float:
+        """Admitir un mensaje de chat si lo permiten los cubos de la IP y de la sesión"""
+        retry_after = (client_ip is not None and self.chat_per_ip.check(client_ip)) or self.chat_per_session.check(session_id)
+        if retry_after:
+            return retry_after
+        if client_ip is not None:
+            self.chat_per_ip.acquire(client_ip)
+        self.chat_per_session.acquire(session_id)
+        return 0.0
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "session_create_per_ip": self.session_create_per_ip.stats(),
+            "chat_per_session": self.chat_per_session.stats(),
+            "chat_per_ip": self.chat_per_ip.stats()
+        }
+
+class LoadShedder:
+    """Control de admisión global según el retraso del event loop y la cola de agentes"""
+    
+    def __init__(
+        self,
+        max_loop_lag: float = 0.25,
+        max_queue_depth: int = 256,
+        queue_depth: Optional[Callable[[], int]] = None,
+        probe_interval: float = 0.1,
+        retry_after: float = 1.0
+    ):
+        self.max_loop_lag = max_loop_lag
+        self.max_queue_depth = max_queue_depth
+        self.queue_depth = queue_depth or (lambda: 0)
+        self.probe_interval = probe_interval
+        # Espera sugerida a los clientes rechazados por sobrecarga
+        self.retry_after = retry_after
+        self.loop_lag = 0.0
+        self.max_observed_lag = 0.0
+        self.shed = {"loop_lag": 0, "queue_depth": 0}
+        self._probe: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        if self.probe_interval and self._probe is None:
+            self._probe = asyncio.create_task(self._measure())
+    
+    async def close(self):
+        if self._probe is not None:
+            self._probe.cancel()
+            try:
+                await self._probe
+            except asyncio.CancelledError:
+                pass
+            self._probe = None
+    
+    async def _measure(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.probe_interval)
+            self.loop_lag = max(0.0, time.monotonic() - start - self.probe_interval)
+            self.max_observed_lag = max(self.max_observed_lag, self.loop_lag)
+    
+    def check(self) -> Optional[str]:
+        """Motivo de sobrecarga (None si se puede admitir trabajo nuevo)"""
+        if self.max_loop_lag and self.loop_lag > self.max_loop_lag:
+            self.shed["loop_lag"] += 1
+            return "loop_lag"
+        if self.max_queue_depth and self.queue_depth() > self.max_queue_depth:
+            self.shed["queue_depth"] += 1
+            return "queue_depth"
+        return None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loop_lag": self.loop_lag,
+            "max_observed_lag": self.max_observed_lag,
+            "max_loop_lag": self.max_loop_lag,
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "shed": dict(self.shed)
+        }
\ No newline at end of file
@@ -0,0 +1,134 @@
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.models.db_models import AgentRegistration
+from .orchestrator import AgentOrchestrator
+from .triggers import compile_trigger
+
+logger = logging.getLogger(__name__)
+
+# Opciones de register_agent que se guardan tal cual en la columna `options`
+_OPTION_KEYS = ("idempotent", "hedge", "cacheable", "delta", "max_concurrency", "timeout", "shared_cache")
+
+# Intentos de tomar la siguiente revisión cuando otros workers escriben a la vez
+_REVISION_ATTEMPTS = 10
+
+class AgentRegistry:
+    """Registro de agentes persistido en BD y compartido por todos los workers"""
+    
+    def __init__(self, session_factory: Callable[[], AsyncSession], poll_interval: float = 5.0):
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.revision = 0
+        self._poller: Optional[asyncio.Task] = None
+    
+    async def save(self, orchestrator: AgentOrchestrator, name: str, trigger_condition: Dict[str, Any], endpoint: str, required_fields: Optional[List[str]] = None, batch_endpoint: Optional[str] = None, **options: Any) -> int:
+        """Registrar (o actualizar) un agente; devuelve la revisión asignada"""
+        # Validar antes de persistir: una condición inválida no debe llegar a otros workers
+        compile_trigger(trigger_condition, required_fields)
+        
+        def update(row: Optional[AgentRegistration]) -> AgentRegistration:
+            row = row or AgentRegistration(name=name)
+            row.endpoint = endpoint
+            row.trigger_condition = trigger_condition
+            row.required_fields = required_fields
+            row.batch_endpoint = batch_endpoint
+            row.options = {key: options[key] for key in _OPTION_KEYS if key in options}
+            row.active = True
+            return row
+        
+        revision = await self._write(name, update)
+        await self.sync(orchestrator)
+        return revision
+    
+    async def remove(self, orchestrator: AgentOrchestrator, name: str) -> bool:
+        """Dar de baja un agente (se conserva la fila para propagar la baja)"""
+        def update(row: Optional[AgentRegistration]) -> Optional[AgentRegistration]:
+            if row is None or not row.active:
+                return None
+            row.active = False
+            return row
+        
+        if await self._write(name, update) is None:
+            return False
+        await self.sync(orchestrator)
+        return True
+    
+    async def _write(self, name: str, update: Callable[[Optional[AgentRegistration]], Optional[AgentRegistration]]) -> Optional[int]:
+        """Guardar `update(fila)` con la siguiente revisión; None si `update` no cambia nada"""
+        for attempt in range(_REVISION_ATTEMPTS):
+            async with self.session_factory() as db:
+                # Antes de tocar la fila: el autoflush de la consulta no debe ver una revisión vacía
+                revision = (await db.scalar(select(func.max(AgentRegistration.revision))) or 0) + 1
+                row = update(await db.get(AgentRegistration, name))
+                if row is None:
+                    return None
+                row.revision = revision
+                db.add(row)
+                try:
+                    await db.commit()
+                    return revision
+                except IntegrityError:
+                    await db.rollback()
+                    if attempt == _REVISION_ATTEMPTS - 1:
+                        raise
+    
+    async def sync(self, orchestrator: AgentOrchestrator) -> int:
+        """Aplicar al orquestador los cambios posteriores a la última revisión vista"""
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(AgentRegistration)
+                .where(AgentRegistration.revision > self.revision)
+                .order_by(AgentRegistration.revision)
+            )
+            rows = result.scalars().all()
+        
+        for row in rows:
+            try:
+                if row.active:
+                    await orchestrator.register_agent(
+                        name=row.name,
+                        trigger_condition=row.trigger_condition,
+                        endpoint=row.endpoint,
+                        required_fields=row.required_fields,
+                        batch_endpoint=row.batch_endpoint,
+                        **(row.options or {})
+                    )
+                else:
+                    orchestrator.unregister_agent(row.name)
+            except Exception:
+                # Un registro inválido no debe bloquear los posteriores: se omite y se avanza
+                logger.exception("Registro del agente %s (revisión %d) no aplicable; se omite", row.name, row.revision)
+            self.revision = max(self.revision, row.revision)
+        return len(rows)
+    
+    async def start(self, orchestrator: AgentOrchestrator):
+        """Cargar el registro completo y seguir los cambios de otros workers"""
+        await self.sync(orchestrator)
+        if self.poll_interval and self._poller is None:
+            self._poller = asyncio.create_task(self._poll(orchestrator))
+    
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+    
+    async def _poll(self, orchestrator: AgentOrchestrator):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.sync(orchestrator)
+            except SQLAlchemyError as e:
+                # BD no disponible momentáneamente: se reintenta en el siguiente ciclo
+                logger.warning("Sincronización del registro de agentes fallida (%r); reintento en %.1fs", e, self.poll_interval)
+            except Exception:
+                # Cualquier otro error tampoco puede detener la sincronización para siempre
+                logger.exception("Error inesperado sincronizando el registro de agentes")
\ No newline at end of file
@@ -0,0 +1,112 @@
+from typing import Any, Dict, Optional
+from collections import deque
+import random
+import time
+
+class RetryPolicy:
+    """Reintentos con backoff exponencial y jitter completo"""
+    
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.1, max_delay: float = 2.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+    
+    def delay(self, attempt: int) -> float:
+        """Espera antes del reintento `attempt` (0 = primer reintento)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+class CircuitBreaker:
+    """Circuito closed/open/half_open por agente"""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+    
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+    
+    def allow(self) -> bool:
+        """Indica si se permite una llamada; en half_open deja pasar una sola sonda"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        
+        return True
+    
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+    
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+    
+    def release(self):
+        """Liberar la sonda sin resultado (p. ej. llamada cancelada): la siguiente llamada sondea"""
+        self._probe_in_flight = False
+
+class LatencyTracker:
+    """Ventana deslizante de latencias para calcular percentiles"""
+    
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+    
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+    
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+    
+    def __len__(self) -> int:
+        return len(self._samples)
+
+class AgentCallStats:
+    """Estado de resiliencia y contadores de un agente"""
+    
+    def __init__(self, failure_threshold: int, recovery_timeout: float):
+        self.breaker = CircuitBreaker(failure_threshold, recovery_timeout)
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.rejected = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "p50": self.latency.percentile(50),
+            "p95": self.latency.percentile(95)
+        }
\ No newline at end of file
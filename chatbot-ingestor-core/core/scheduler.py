@@ -0,0 +1,162 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+import asyncio
+import time
+from pydantic import BaseModel
+
+from .admission import BATCH, INTERACTIVE
+from .orchestrator import AgentOrchestrator
+from .triggers import agent_completed, result_entry
+
+# Se llama con (agente, entrada de agent_triggers) al terminar cada agente
+ResultCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+class ScheduleReport(BaseModel):
+    """Resultado de una ejecución del grafo de agentes"""
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    skipped: List[str] = []
+    levels: List[List[str]] = []
+    timings: Dict[str, Dict[str, float]] = {}
+    critical_path: List[str] = []
+    critical_path_time: float = 0.0
+    total_time: float = 0.0
+
+class AgentScheduler:
+    """Ejecuta agentes según su grafo `depends_on`, en paralelo y con límite global"""
+    
+    def __init__(self, orchestrator: AgentOrchestrator, max_concurrency: int = 4):
+        self.orchestrator = orchestrator
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+    
+    def build_levels(self, agent_names: Iterable[str]) -> List[List[str]]:
+        """Ordenar agentes en niveles topológicos (Kahn)"""
+        names = list(dict.fromkeys(agent_names))
+        deps = self._dependencies(names)
+        remaining = {name: set(deps[name]) for name in names}
+        levels = []
+        
+        while remaining:
+            ready = [name for name in names if name in remaining and not remaining[name]]
+            if not ready:
+                raise ValueError(f"Dependencias cíclicas entre agentes: {', '.join(remaining)}")
+            levels.append(ready)
+            for name in ready:
+                del remaining[name]
+            for pending in remaining.values():
+                pending.difference_update(ready)
+        
+        return levels
+    
+    def with_dependents(self, agent_names: Iterable[str]) -> List[str]:
+        """`agent_names` más los agentes registrados que dependen de ellos, transitivamente"""
+        names = list(dict.fromkeys(agent_names))
+        selected = set(names)
+        added = True
+        while added:
+            added = False
+            for name, config in self.orchestrator.registered_agents.items():
+                if name not in selected and selected.intersection(config.depends_on):
+                    names.append(name)
+                    selected.add(name)
+                    added = True
+        return names
+    
+    async def run(
+        self,
+        context: Dict[str, Any],
+        agent_names: Optional[Iterable[str]] = None,
+        lane: str = INTERACTIVE,
+        include_dependents: bool = False,
+        on_result: Optional[ResultCallback] = None
+    ) -> ScheduleReport:
+        """Ejecutar agentes; cada uno arranca en cuanto terminan sus dependencias"""
+        names = list(self.orchestrator.registered_agents) if agent_names is None else list(dict.fromkeys(agent_names))
+        for name in names:
+            if name not in self.orchestrator.registered_agents:
+                raise ValueError(f"Agente no encontrado: {name}")
+        requested = set(names)
+        if include_dependents:
+            names = self.with_dependents(names)
+        
+        report = ScheduleReport(levels=self.build_levels(names))
+        first_level = set(report.levels[0]) if report.levels else set()
+        deps = self._dependencies(names)
+        done = {name: asyncio.Event() for name in names}
+        shared_results: Dict[str, Any] = {}
+        run_start = time.monotonic()
+        
+        async def run_agent(name: str):
+            try:
+                for dep in deps[name]:
+                    await done[dep].wait()
+                
+                external = [d for d in self._declared_dependencies(name) if d not in done]
+                if any(dep not in shared_results for dep in deps[name]) or not all(agent_completed(context, d) for d in external):
+                    report.skipped.append(name)
+                    return
+                
+                agent_context = {
+                    **context,
+                    "agent_triggers": {
+                        **(context.get("agent_triggers") or {}),
+                        **{dep: result_entry(shared_results[dep]) for dep in deps[name]}
+                    }
+                }
+                # Los dependientes añadidos se disparan solo si su condición se cumple ya con los resultados
+                if name not in requested and not self.orchestrator.registered_agents[name].trigger_condition(agent_context):
+                    report.skipped.append(name)
+                    return
+                
+                async with self._semaphore:
+                    start = time.monotonic()
+                    try:
+                        result = await self.orchestrator.invoke_agent(name, agent_context, lane=lane if name in first_level else BATCH)
+                    except Exception as e:
+                        report.errors[name] = str(e)
+                        if on_result is not None:
+                            await on_result(name, {"status": "failed", "error": str(e)})
+                        return
+                    finally:
+                        end = time.monotonic()
+                        report.timings[name] = {
+                            "start": start - run_start,
+                            "end": end - run_start,
+                            "duration": end - start
+                        }
+                
+                shared_results[name] = result
+                report.results[name] = result
+                if on_result is not None:
+                    await on_result(name, result_entry(result))
+            finally:
+                done[name].set()
+        
+        await asyncio.gather(*(run_agent(name) for name in names))
+        
+        report.total_time = time.monotonic() - run_start
+        report.critical_path, report.critical_path_time = self._critical_path(report, deps)
+        return report
+    
+    def _declared_dependencies(self, name: str) -> List[str]:
+        return self.orchestrator.registered_agents[name].depends_on
+    
+    def _dependencies(self, names: List[str]) -> Dict[str, List[str]]:
+        """Dependencias de cada agente restringidas al conjunto a ejecutar"""
+        selected = set(names)
+        return {name: [d for d in self._declared_dependencies(name) if d in selected] for name in names}
+    
+    def _critical_path(self, report: ScheduleReport, deps: Dict[str, List[str]]) -> tuple[List[str], float]:
+        """Camino más largo (por duración medida) a través del grafo ejecutado"""
+        best: Dict[str, tuple[float, List[str]]] = {}
+        for level in report.levels:
+            for name in level:
+                if name not in report.timings:
+                    continue
+                previous = max((best[d] for d in deps[name] if d in best), key=lambda item: item[0], default=(0.0, []))
+                best[name] = (previous[0] + report.timings[name]["duration"], previous[1] + [name])
+        
+        if not best:
+            return [], 0.0
+        total, path = max(best.values(), key=lambda item: item[0])
+        return path, total
\ No newline at end of file
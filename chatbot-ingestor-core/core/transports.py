@@ -0,0 +1,125 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import aiohttp
+
+from . import wire
+from .exceptions import AgentInvocationError
+from .http_client import HTTPClientPool
+
+# Esquema de endpoint para agentes enlazados en el mismo proceso
+INPROCESS_SCHEME = "inprocess://"
+
+# Errores de un agente local que pueden desaparecer al reintentar (red hacia su proveedor de IA);
+# el resto (ValueError, KeyError...) son fallos deterministas y no se reintentan
+_TRANSIENT_LOCAL_ERRORS = (ConnectionError, TimeoutError, asyncio.TimeoutError, aiohttp.ClientError)
+
+class AgentTransport(ABC):
+    """Medio por el que se entrega el contexto a un agente"""
+    
+    # Solo tiene sentido duplicar peticiones cuando hay red de por medio
+    supports_hedging = False
+    
+    @abstractmethod
+    async def send(self, agent_name: str, endpoint: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Un único intento de invocación; `timeout` limita su duración total"""
+        pass
+
+class HTTPTransport(AgentTransport):
+    """POST al endpoint remoto del agente (TCP o `unix://`), en MessagePack+zstd si el agente lo soporta"""
+    
+    supports_hedging = True
+    
+    def __init__(self, http_client: HTTPClientPool):
+        self.http_client = http_client
+        # Formato y compresión que cada endpoint anunció en sus respuestas
+        self._peer_formats: Dict[str, Tuple[str, bool]] = {}
+    
+    async def send(self, agent_name: str, endpoint: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        content_type, compress = self._peer_formats.get(endpoint, (wire.JSON, False))
+        body, headers = wire.encode(payload, content_type, compress)
+        headers["Accept"] = wire.accept_header()
+        headers["Accept-Encoding"] = wire.accept_encoding_header()
+        
+        session, url = await self.http_client.session_for(endpoint)
+        options = {"timeout": self.http_client.request_timeout(timeout)} if timeout else {}
+        try:
+            async with session.post(url, data=body, headers=headers, **options) as response:
+                if response.status == 415 and content_type != wire.JSON:
+                    # El endpoint ya no acepta el formato binario: volver a JSON
+                    self._peer_formats.pop(endpoint, None)
+                    return await self.send(agent_name, endpoint, payload, timeout)
+                if response.status == 200:
+                    return self._decode_response(agent_name, endpoint, response, await response.read())
+                raise AgentInvocationError(
+                    agent_name,
+                    f"Error al invocar agente: {response.status}",
+                    status=response.status,
+                    retryable=response.status >= 500 or response.status == 429
+                )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise AgentInvocationError(agent_name, f"Error al comunicarse con el agente: {str(e)}")
+    
+    def _decode_response(self, agent_name: str, endpoint: str, response: aiohttp.ClientResponse, raw: bytes) -> Any:
+        """Decodificar la respuesta y recordar qué formatos acepta el endpoint"""
+        response_type = response.content_type
+        if wire.supports(response_type):
+            # Accept-Encoding en una respuesta anuncia las codificaciones aceptadas (RFC 7694)
+            accepts_zstd = wire.ZSTD in response.headers.get("Accept-Encoding", "")
+            self._peer_formats[endpoint] = (response_type, accepts_zstd)
+        
+        try:
+            return wire.decode(raw, response_type, response.headers.get("Content-Encoding"))
+        except ValueError as e:
+            raise AgentInvocationError(agent_name, f"Respuesta del agente ilegible: {str(e)}", retryable=False)
+    
+    async def send_batch(self, agent_name: str, endpoint: str, payloads: List[Dict[str, Any]], timeout: Optional[float] = None) -> List[Any]:
+        """POST de varios contextos en una sola petición; devuelve resultado o excepción por elemento"""
+        body = await self.send(agent_name, endpoint, {"contexts": payloads}, timeout)
+        items = body.get("results", [])
+        if len(items) != len(payloads):
+            raise AgentInvocationError(agent_name, "Respuesta de lote con tamaño inesperado", retryable=False)
+        
+        return [item.get("result") if item.get("ok") else self._item_error(agent_name, item) for item in items]
+    
+    @staticmethod
+    def _item_error(agent_name: str, item: Dict[str, Any]) -> AgentInvocationError:
+        status = item.get("status")
+        return AgentInvocationError(
+            agent_name,
+            f"Error en agente: {item.get('error')}",
+            status=status,
+            retryable=status is None or status >= 500 or status == 429
+        )
+
+class InProcessTransport(AgentTransport):
+    """Llama a `execute()` de agentes Python en el mismo event loop, sin serializar"""
+    
+    def __init__(self):
+        self.bindings: Dict[str, Any] = {}
+    
+    def bind(self, name: str, agent: Any):
+        """Enlazar un objeto con método `async execute(context)`"""
+        if not callable(getattr(agent, "execute", None)):
+            raise ValueError(f"El agente local {name} no define execute()")
+        self.bindings[name] = agent
+    
+    async def send(self, agent_name: str, endpoint: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        target = endpoint[len(INPROCESS_SCHEME):] or agent_name
+        agent = self.bindings.get(target)
+        if agent is None:
+            raise AgentInvocationError(agent_name, f"Agente local no enlazado: {target}", retryable=False)
+        
+        # El contexto se comparte por referencia: los agentes no deben mutarlo
+        try:
+            result = await asyncio.wait_for(agent.execute(payload), timeout)
+        except asyncio.TimeoutError:
+            raise AgentInvocationError(agent_name, f"El agente local no respondió en {timeout}s")
+        except _TRANSIENT_LOCAL_ERRORS as e:
+            raise AgentInvocationError(agent_name, f"Error en agente local: {str(e)}")
+        except Exception as e:
+            raise AgentInvocationError(agent_name, f"Error en agente local: {str(e)}", retryable=False)
+        
+        if hasattr(result, "model_dump"):
+            return result.model_dump()
+        return result
\ No newline at end of file
@@ -0,0 +1,112 @@
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set
+from pydantic import BaseModel
+
+# Clave de observación para condiciones opacas: se evalúan en cada turno
+WATCH_ALL = "*"
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+class CompiledTrigger(BaseModel):
+    """Condición de disparo compilada a partir de una especificación JSON"""
+    spec: Dict[str, Any]
+    predicate: Predicate
+    watches: FrozenSet[str]
+    depends_on: List[str] = []
+    
+    def __call__(self, context: Dict[str, Any]) -> bool:
+        return self.predicate(context)
+
+def agent_completed(context: Dict[str, Any], agent_name: str) -> bool:
+    """Indica si un agente ya dejó resultados completos en el contexto"""
+    entry = (context.get("agent_triggers") or {}).get(agent_name)
+    if isinstance(entry, dict):
+        return entry.get("status", "completed") == "completed"
+    return bool(entry)
+
+def result_entry(result: Any) -> Dict[str, Any]:
+    """Entrada de `agent_triggers` para el resultado de un agente"""
+    failed = isinstance(result, dict) and result.get("success") is False
+    return {"status": "failed" if failed else "completed", "result": result}
+
+def completion_ratio(context: Dict[str, Any]) -> float:
+    """Completitud general de la sesión (misma fórmula que ContextManager)"""
+    completion = context.get("completion_status") or {}
+    if "general" in completion:
+        return completion["general"]
+    
+    data = context.get("data") or {}
+    if not data:
+        return 0.0
+    return sum(1 for v in data.values() if v is not None) / len(data)
+
+def watch_keys_for(path: str) -> List[str]:
+    """Claves del índice que deben consultarse cuando cambia `path`"""
+    keys = [path]
+    if "." in path:
+        keys.append(path.split(".", 1)[0] + ".*")
+    return keys
+
+def compile_trigger(spec: Dict[str, Any], required_fields: Optional[Iterable[str]] = None) -> CompiledTrigger:
+    """Compilar una especificación de disparo a un predicado"""
+    predicates: List[Predicate] = []
+    watches: Set[str] = set()
+    depends_on = list(spec.get("depends_on", []))
+    fields = list(spec.get("required_fields", required_fields or []))
+    
+    for key, value in spec.items():
+        if key == "completion_threshold":
+            threshold = float(value)
+            predicates.append(lambda ctx, t=threshold: completion_ratio(ctx) >= t)
+            watches.update({"data.*", "completion_status"})
+        
+        elif key in ("required_fields", "required_fields_present"):
+            if key == "required_fields_present" and not value:
+                continue
+            if key == "required_fields" and "required_fields_present" in spec:
+                continue
+            if not fields:
+                raise ValueError("required_fields_present requiere una lista required_fields")
+            predicates.append(lambda ctx, fs=tuple(fields): all((ctx.get("data") or {}).get(f) for f in fs))
+            watches.update(f"data.{f}" for f in fields)
+        
+        elif key == "depends_on":
+            predicates.append(lambda ctx, deps=tuple(value): all(agent_completed(ctx, d) for d in deps))
+            watches.update(f"agent_triggers.{d}" for d in value)
+        
+        elif key == "all_analyses_complete":
+            if value and not depends_on:
+                raise ValueError("all_analyses_complete requiere depends_on")
+        
+        elif key.endswith("_complete"):
+            agent_name = key[:-len("_complete")]
+            predicates.append(lambda ctx, a=agent_name, v=bool(value): agent_completed(ctx, a) == v)
+            watches.add(f"agent_triggers.{agent_name}")
+            if value and agent_name not in depends_on:
+                depends_on.append(agent_name)
+        
+        elif key == "fields_equal":
+            for field, expected in value.items():
+                predicates.append(lambda ctx, f=field, e=expected: (ctx.get("data") or {}).get(f) == e)
+                watches.add(f"data.{field}")
+        
+        elif key in ("all", "any"):
+            children = [compile_trigger(child, required_fields) for child in value]
+            combine = all if key == "all" else any
+            predicates.append(lambda ctx, cs=tuple(children), c=combine: c(child(ctx) for child in cs))
+            for child in children:
+                watches.update(child.watches)
+        
+        elif key == "not":
+            child = compile_trigger(value, required_fields)
+            predicates.append(lambda ctx, c=child: not c(ctx))
+            watches.update(child.watches)
+        
+        else:
+            raise ValueError(f"Condición de disparo no soportada: {key}")
+    
+    return CompiledTrigger(
+        spec=spec,
+        predicate=lambda ctx, ps=tuple(predicates): all(p(ctx) for p in ps),
+        watches=frozenset(watches) or frozenset({WATCH_ALL}),
+        depends_on=depends_on
+    )
\ No newline at end of file
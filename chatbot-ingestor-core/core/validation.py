@@ -1,5 +1,31 @@
-from typing import Any, Dict, List, Optional
-from pydantic import BaseModel
+from typing import Any, Dict, Hashable, List, Mapping, Optional
+import numpy as np
+from pydantic import BaseModel, ConfigDict
+
+from .cache import LRUCache, fingerprint
+
+# Bits de error para la validación masiva (un bit por tipo de regla)
+ERROR_TYPE = 1
+ERROR_MIN_LENGTH = 2
+ERROR_MAX_LENGTH = 4
+ERROR_MIN_VALUE = 8
+ERROR_MAX_VALUE = 16
+
+_ERROR_NAMES = {
+    ERROR_TYPE: "type",
+    ERROR_MIN_LENGTH: "min_length",
+    ERROR_MAX_LENGTH: "max_length",
+    ERROR_MIN_VALUE: "min_value",
+    ERROR_MAX_VALUE: "max_value",
+}
+
+# Tipos de NumPy compatibles con cada tipo de regla (según isinstance)
+_DTYPE_KINDS = {
+    bool: "b",
+    int: "biu",
+    float: "f",
+    str: "U",
+}
 
 class ValidationResult(BaseModel):
     """Resultado de una validación"""
@@ -7,12 +33,120 @@ class ValidationResult(BaseModel):
     message: str
     suggestions: List[str] = []
 
+class BulkValidationResult(BaseModel):
+    """Resultado de una validación masiva por columnas"""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    
+    rows: int
+    error_bitmaps: Dict[str, np.ndarray]
+    invalid_rows: np.ndarray
+    report: Dict[str, Dict[str, Any]]
+    
+    @property
+    def is_valid(self) -> bool:
+        return not bool(self.invalid_rows.any())
+
+class _VersionedDict(dict):
+    """Diccionario que avisa de cada modificación a través de `_touch`"""
+    
+    def _touch(self):
+        """Llamado tras cada modificación; por defecto no hace nada"""
+        pass
+    
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._touch()
+    
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._touch()
+    
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            super().__setitem__(key, value)
+        self._touch()
+    
+    def pop(self, *args):
+        result = super().pop(*args)
+        self._touch()
+        return result
+    
+    def popitem(self):
+        result = super().popitem()
+        self._touch()
+        return result
+    
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+    
+    def clear(self):
+        super().clear()
+        self._touch()
+
+class _FieldRuleSet(_VersionedDict):
+    """Reglas de un campo: editarlas en sitio también cambia la versión del conjunto"""
+    
+    def __init__(self, rules: Mapping[str, Any], on_change):
+        super().__init__(rules)
+        self._on_change = on_change
+    
+    def _touch(self):
+        self._on_change()
+
+class FieldRules(_VersionedDict):
+    """Diccionario de reglas por campo que versiona cada modificación"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.version = 0
+        for key, value in dict(*args, **kwargs).items():
+            dict.__setitem__(self, key, self._wrap(value))
+    
+    def _wrap(self, rules: Any) -> Any:
+        return _FieldRuleSet(rules, self._touch) if isinstance(rules, Mapping) else rules
+    
+    def _touch(self):
+        self.version += 1
+    
+    def __setitem__(self, key, value):
+        super().__setitem__(key, self._wrap(value))
+    
+    def update(self, *args, **kwargs):
+        super().update({key: self._wrap(value) for key, value in dict(*args, **kwargs).items()})
+
 class ValidationEngine:
     """Validación en tiempo real con feedback contextual"""
     
-    def __init__(self):
-        self.field_rules: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, cache_size: int = 4096):
+        self._field_rules = FieldRules()
+        self._rules_epoch = 0
         self.structure_rules: Dict[str, List[str]] = {}
+        self._cache = LRUCache(max_size=cache_size)
+    
+    @property
+    def field_rules(self) -> FieldRules:
+        return self._field_rules
+    
+    @field_rules.setter
+    def field_rules(self, rules: Dict[str, Dict[str, Any]]):
+        # Reemplazar el conjunto completo también invalida la caché
+        self._rules_epoch += self._field_rules.version + 1
+        self._field_rules = FieldRules(rules)
+    
+    @property
+    def rules_version(self) -> int:
+        """Versión del conjunto de reglas; cambia con cada edición"""
+        return self._rules_epoch + self._field_rules.version
+    
+    def invalidate_cache(self):
+        """Vaciar la caché (p. ej. tras modificar una regla en sitio)"""
+        self._cache.clear()
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Métricas de la caché de resultados de validación"""
+        return {**self._cache.stats(), "rules_version": self.rules_version}
     
     async def validate_field(self, field: str, value: Any, context: Dict[str, Any]) -> ValidationResult:
         """Validar campo individual con contexto"""
@@ -22,7 +156,29 @@ class ValidationEngine:
                 message="No hay reglas de validación para este campo"
             )
         
-        rules = self.field_rules[field]
+        # Las reglas no dependen del contexto, así que el resultado se memoiza por
+        # (campo, versión de reglas, huella del valor)
+        key = (field, self.rules_version, self._value_key(value))
+        cached = self._cache.get(key)
+        if cached is not None:
+            # Copia: quien reciba el resultado puede modificarlo sin afectar a la caché
+            return cached.model_copy(deep=True)
+        
+        result = self._check_field_rules(self.field_rules[field], value)
+        self._cache.set(key, result.model_copy(deep=True))
+        return result
+    
+    @staticmethod
+    def _value_key(value: Any) -> Hashable:
+        """Clave de caché para un valor; incluye el tipo porque 1 == True == 1.0"""
+        try:
+            hash(value)
+        except TypeError:
+            return (type(value), fingerprint(value))
+        return (type(value), value)
+    
+    def _check_field_rules(self, rules: Dict[str, Any], value: Any) -> ValidationResult:
+        """Aplicar las reglas de un campo a un valor"""
         errors = []
         suggestions = []
         
@@ -37,12 +193,117 @@ class ValidationEngine:
             if "max_length" in rules and len(value) > rules["max_length"]:
                 errors.append(f"El texto no debe exceder {rules['max_length']} caracteres")
         
+        # Validación de rango para números
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            if "min_value" in rules and value < rules["min_value"]:
+                errors.append(f"El valor debe ser al menos {rules['min_value']}")
+            if "max_value" in rules and value > rules["max_value"]:
+                errors.append(f"El valor no debe exceder {rules['max_value']}")
+        
         return ValidationResult(
             is_valid=len(errors) == 0,
             message=", ".join(errors) if errors else "Campo válido",
             suggestions=suggestions
         )
     
+    def validate_columns(self, columns: Mapping[str, Any]) -> BulkValidationResult:
+        """Validar datos por columnas (dict de arrays o DataFrame) con máscaras vectorizadas"""
+        arrays = {name: self._as_column(columns[name]) for name in list(columns.keys())}
+        lengths = {len(array) for array in arrays.values()}
+        if len(lengths) > 1:
+            raise ValueError("Todas las columnas deben tener la misma longitud")
+        rows = lengths.pop() if lengths else 0
+        
+        error_bitmaps: Dict[str, np.ndarray] = {}
+        report: Dict[str, Dict[str, Any]] = {}
+        invalid_rows = np.zeros(rows, dtype=bool)
+        
+        for name, array in arrays.items():
+            if name not in self.field_rules:
+                continue
+            bitmap = self._column_error_bitmap(array, self.field_rules[name])
+            error_bitmaps[name] = bitmap
+            invalid = bitmap != 0
+            invalid_rows |= invalid
+            report[name] = {
+                "rows": rows,
+                "invalid": int(invalid.sum()),
+                "errors": {
+                    error_name: int(np.count_nonzero(bitmap & bit))
+                    for bit, error_name in _ERROR_NAMES.items()
+                    if bitmap.size and np.any(bitmap & bit)
+                }
+            }
+        
+        return BulkValidationResult(
+            rows=rows,
+            error_bitmaps=error_bitmaps,
+            invalid_rows=invalid_rows,
+            report=report
+        )
+    
+    @staticmethod
+    def _as_column(values: Any) -> np.ndarray:
+        """Convertir una columna a array sin coerciones de tipo implícitas"""
+        # Los arrays y Series ya tienen dtype declarado; las listas se tratan como
+        # object para que [1, "x"] no se convierta en strings y difiera de validate_field
+        if isinstance(values, np.ndarray) or hasattr(values, "to_numpy"):
+            return np.asarray(values)
+        column = np.empty(len(values), dtype=object)
+        column[:] = list(values)
+        return column
+    
+    def _column_error_bitmap(self, array: np.ndarray, rules: Dict[str, Any]) -> np.ndarray:
+        """Calcular el bitmap de errores de una columna según sus reglas"""
+        bitmap = np.zeros(len(array), dtype=np.uint8)
+        kind = array.dtype.kind
+        
+        # Máscaras de tipo: rápidas para dtypes nativos, elemento a elemento para object
+        if kind == "O":
+            is_str = np.fromiter((isinstance(v, str) for v in array), dtype=bool, count=len(array))
+            is_number = np.fromiter(
+                (isinstance(v, (int, float)) and not isinstance(v, bool) for v in array),
+                dtype=bool,
+                count=len(array)
+            )
+        else:
+            is_str = np.full(len(array), kind == "U")
+            is_number = np.full(len(array), kind in "iuf")
+        
+        if "type" in rules:
+            expected = rules["type"]
+            if kind == "O":
+                type_ok = np.fromiter((isinstance(v, expected) for v in array), dtype=bool, count=len(array))
+            else:
+                expected_types = expected if isinstance(expected, tuple) else (expected,)
+                kinds = "".join(_DTYPE_KINDS.get(t, "") for t in expected_types)
+                type_ok = np.full(len(array), kind in kinds)
+            bitmap[~type_ok] |= ERROR_TYPE
+        
+        if ("min_length" in rules or "max_length" in rules) and is_str.any():
+            if kind == "U":
+                text_lengths = np.char.str_len(array)
+            else:
+                text_lengths = np.fromiter(
+                    (len(v) if isinstance(v, str) else 0 for v in array),
+                    dtype=np.int64,
+                    count=len(array)
+                )
+            if "min_length" in rules:
+                bitmap[is_str & (text_lengths < rules["min_length"])] |= ERROR_MIN_LENGTH
+            if "max_length" in rules:
+                bitmap[is_str & (text_lengths > rules["max_length"])] |= ERROR_MAX_LENGTH
+        
+        if ("min_value" in rules or "max_value" in rules) and is_number.any():
+            numbers = np.zeros(len(array), dtype=np.float64)
+            numbers[is_number] = array[is_number].astype(np.float64)
+            if "min_value" in rules:
+                bitmap[is_number & (numbers < rules["min_value"])] |= ERROR_MIN_VALUE
+            if "max_value" in rules:
+                bitmap[is_number & (numbers > rules["max_value"])] |= ERROR_MAX_VALUE
+        
+        return bitmap
+    
     async def validate_structure(self, context: Dict[str, Any], target_step: str) -> ValidationResult:
         """Validar completitud para avanzar de paso"""
         if target_step not in self.structure_rules:
@@ -69,4 +330,4 @@ class ValidationEngine:
             if missing:
                 return f"Por favor, proporciona información sobre: {', '.join(missing)}"
         
-        return "Todos los campos requeridos han sido completados" 
\ No newline at end of file
+        return "Todos los campos requeridos han sido completados"
\ No newline at end of file
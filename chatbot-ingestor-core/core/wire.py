@@ -0,0 +1,109 @@
+# Duplicado en agents-market-analyzer/utils/wire.py (los proyectos se despliegan por
+# separado y no comparten paquete): cualquier cambio debe llevarse a ambas copias
+from typing import Any, Dict, Optional, Tuple
+from datetime import date, datetime
+import io
+import json
+import os
+
+# orjson, MessagePack y zstd son opcionales: sin ellos todo viaja como JSON
+# (módulo json estándar) sin comprimir
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ZSTD = "zstd"
+
+# Por debajo de este tamaño comprimir no compensa la CPU
+COMPRESSION_THRESHOLD = 1024
+
+# Límites al descomprimir: unos pocos KB de zstd pueden expandirse a GB
+MAX_DECOMPRESSED_SIZE = int(os.getenv("WIRE_MAX_DECOMPRESSED_SIZE", str(64 * 1024 * 1024)))
+MAX_WINDOW_SIZE = 8 * 1024 * 1024
+
+def accept_header() -> str:
+    """Formatos de respuesta aceptados, por orden de preferencia"""
+    return f"{MSGPACK}, {JSON};q=0.5" if msgpack else JSON
+
+def accept_encoding_header() -> str:
+    return ZSTD if zstandard else "identity"
+
+def supports(content_type: str) -> bool:
+    return content_type == JSON or (content_type == MSGPACK and msgpack is not None)
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def dumps(payload: Any, sort_keys: bool = False) -> bytes:
+    """JSON compacto en UTF-8 (orjson si está disponible)"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(payload, default=_default, option=option)
+    return json.dumps(payload, default=_default, separators=(",", ":"), sort_keys=sort_keys).encode("utf-8")
+
+def loads(body: Any) -> Any:
+    """Parsear JSON desde bytes o str"""
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+def encode(payload: Any, content_type: str = JSON, compress: bool = False) -> Tuple[bytes, Dict[str, str]]:
+    """Serializar `payload`; devuelve el cuerpo y las cabeceras Content-Type/Content-Encoding"""
+    if content_type == MSGPACK and msgpack is not None:
+        body = msgpack.packb(payload, default=_default, use_bin_type=True)
+    else:
+        content_type = JSON
+        body = dumps(payload)
+    
+    headers = {"Content-Type": content_type}
+    if compress and zstandard is not None and len(body) >= COMPRESSION_THRESHOLD:
+        body = zstandard.ZstdCompressor(level=3).compress(body)
+        headers["Content-Encoding"] = ZSTD
+    return body, headers
+
+def decode(body: bytes, content_type: Optional[str], content_encoding: Optional[str] = None) -> Any:
+    """Deserializar un cuerpo según sus cabeceras"""
+    if content_encoding == ZSTD:
+        if zstandard is None:
+            raise ValueError("Cuerpo comprimido con zstd pero zstandard no está instalado")
+        body = _decompress(body)
+    
+    media_type = (content_type or JSON).split(";")[0].strip()
+    if media_type == MSGPACK:
+        if msgpack is None:
+            raise ValueError("Cuerpo MessagePack pero msgpack no está instalado")
+        return msgpack.unpackb(body, raw=False)
+    return loads(body) if body else None
+
+def _decompress(body: bytes, limit: int = MAX_DECOMPRESSED_SIZE) -> bytes:
+    """Descomprimir zstd sin pasar de `limit` bytes; ValueError si el cuerpo es inválido o excesivo"""
+    decompressor = zstandard.ZstdDecompressor(max_window_size=MAX_WINDOW_SIZE)
+    try:
+        with decompressor.stream_reader(io.BytesIO(body), read_across_frames=True) as reader:
+            output = reader.read(limit + 1)
+    except zstandard.ZstdError as e:
+        raise ValueError(f"Cuerpo zstd inválido: {str(e)}")
+    if len(output) > limit:
+        raise ValueError(f"Cuerpo zstd demasiado grande (más de {limit} bytes descomprimido)")
+    return output
+
+def negotiate(accept: Optional[str], accept_encoding: Optional[str]) -> Tuple[str, bool]:
+    """Elegir formato de respuesta y si comprimir a partir de Accept/Accept-Encoding"""
+    content_type = JSON
+    if msgpack is not None and accept and MSGPACK in accept:
+        content_type = MSGPACK
+    compress = zstandard is not None and bool(accept_encoding) and ZSTD in accept_encoding
+    return content_type, compress
\ No newline at end of file
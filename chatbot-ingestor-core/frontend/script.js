@@ -5,6 +5,11 @@ class ChatbotUI {
         this.sessionId = null;
         this.ws = null;
         
+        // Estado local que el servidor actualiza con deltas (protocol=delta)
+        this.context = null;
+        this.contextVersion = null;
+        this.completion = {};
+        
         // Elementos del DOM
         this.userRoleSelect = document.getElementById('userRole');
         this.startSessionBtn = document.getElementById('startSession');
@@ -53,15 +58,32 @@ class ChatbotUI {
     }
     
     connectWebSocket() {
-        this.ws = new WebSocket(`${this.wsUrl}/${this.sessionId}`);
+        this.ws = new WebSocket(`${this.wsUrl}/${this.sessionId}?protocol=delta`);
         
         this.ws.onmessage = (event) => {
             const data = JSON.parse(event.data);
             
-            if (data.type === 'message') {
+            if (data.type === 'ping') {
+                // Latido del servidor: sin respuesta el socket se da por muerto
+                this.ws.send(JSON.stringify({ type: 'pong' }));
+            } else if (data.type === 'snapshot') {
+                this.context = data.data.context;
+                this.contextVersion = data.data.context_version;
+                this.completion = data.data.completion_status;
+                this.updateContext(this.context);
+                this.updateCompletionStatus(this.completion);
+            } else if (data.type === 'delta') {
+                this.addMessage('Bot', data.data.response, 'bot');
+                this.applyDelta(data.data);
+            } else if (data.type === 'message') {
                 this.addMessage('Bot', data.data.response, 'bot');
                 this.updateContext(data.data.context);
-                this.updateCompletionStatus(data.data.context.completion_status);
+            } else if (data.type === 'status') {
+                // Avisos del servidor: resultados de agentes o difusiones
+                const text = data.data.agent
+                    ? `Agente ${data.data.agent}: ${data.data.status}`
+                    : JSON.stringify(data.data);
+                this.addMessage('Sistema', text, 'bot');
             } else if (data.type === 'error') {
                 this.addMessage('Error', data.data.error, 'error');
             }
@@ -89,6 +111,33 @@ class ChatbotUI {
         }));
     }
     
+    applyDelta(delta) {
+        // Un salto de versión significa que falta algún cambio: pedir el estado completo
+        if (this.context === null || delta.base_version !== this.contextVersion) {
+            this.ws.send(JSON.stringify({ type: 'resync' }));
+            return;
+        }
+        
+        try {
+            this.context = applyPatch(this.context, delta.patch);
+        } catch (error) {
+            console.error('Patch inválido:', error);
+            this.ws.send(JSON.stringify({ type: 'resync' }));
+            return;
+        }
+        this.contextVersion = delta.context_version;
+        for (const [category, value] of Object.entries(delta.completion)) {
+            if (value === null) {
+                delete this.completion[category];
+            } else {
+                this.completion[category] = value;
+            }
+        }
+        
+        if (delta.patch.length) this.updateContext(this.context);
+        if (Object.keys(delta.completion).length) this.updateCompletionStatus(this.completion);
+    }
+    
     addMessage(sender, text, type) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${type}`;
@@ -119,6 +168,38 @@ class ChatbotUI {
     }
 }
 
+// Aplicar un JSON Patch (add/remove/replace) sobre el documento
+function applyPatch(document, patch) {
+    for (const op of patch) {
+        if (op.path === '') {
+            document = op.value;
+            continue;
+        }
+        
+        const tokens = op.path.split('/').slice(1).map(token => token.replace(/~1/g, '/').replace(/~0/g, '~'));
+        const last = tokens.pop();
+        let target = document;
+        for (const token of tokens) {
+            if (target === null || typeof target !== 'object' || !(token in target)) {
+                throw new Error(`Ruta de patch inválida: ${op.path}`);
+            }
+            target = target[token];
+        }
+        
+        if (Array.isArray(target)) {
+            const index = last === '-' ? target.length : Number(last);
+            if (op.op === 'add') target.splice(index, 0, op.value);
+            else if (op.op === 'remove') target.splice(index, 1);
+            else target[index] = op.value;
+        } else if (op.op === 'remove') {
+            delete target[last];
+        } else {
+            target[last] = op.value;
+        }
+    }
+    return document;
+}
+
 // Inicializar la UI cuando el DOM esté listo
 document.addEventListener('DOMContentLoaded', () => {
     const chatbot = new ChatbotUI();
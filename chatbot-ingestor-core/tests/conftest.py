@@ -0,0 +1,52 @@
+"""Aplicación de pruebas con el router real y turnos de chat simulados (sin BD)"""
+from contextlib import asynccontextmanager
+import asyncio
+
+from fastapi import FastAPI
+import pytest
+
+from api.connections import ConnectionManager
+from api.dependencies import get_chat_turn, get_connection_manager, get_load_shedder, get_rate_limits
+from api.routes import router
+from core.ingestor import ProcessResult
+from core.ratelimit import LoadShedder, RateLimiter, RateLimits
+
+class SlowIngestor:
+    """Ingestor cuyos turnos tardan `delay` segundos (agentes lentos)"""
+    
+    def __init__(self, delay: float):
+        self.delay = delay
+    
+    async def process_message(self, text: str, session_id: str, role: str) -> ProcessResult:
+        await asyncio.sleep(self.delay)
+        return ProcessResult(
+            response_text=f"eco: {text}",
+            context_updated={},
+            validation_status={},
+            agents_triggered=[],
+            next_suggested_action=None
+        )
+
+@pytest.fixture
+def make_app():
+    """Fábrica de apps con `connections` propio y turnos de `delay` segundos"""
+    def factory(connections: ConnectionManager, delay: float = 0.0) -> FastAPI:
+        @asynccontextmanager
+        async def lifespan(app: FastAPI):
+            await connections.start()
+            yield
+            await connections.close()
+        
+        @asynccontextmanager
+        async def slow_turn():
+            yield SlowIngestor(delay)
+        
+        app = FastAPI(lifespan=lifespan)
+        app.include_router(router)
+        unlimited = RateLimiter(rate=0, burst=0)
+        app.dependency_overrides[get_chat_turn] = lambda: slow_turn
+        app.dependency_overrides[get_connection_manager] = lambda: connections
+        app.dependency_overrides[get_rate_limits] = lambda: RateLimits(unlimited, unlimited, unlimited)
+        app.dependency_overrides[get_load_shedder] = lambda: LoadShedder(probe_interval=0)
+        return app
+    return factory
\ No newline at end of file
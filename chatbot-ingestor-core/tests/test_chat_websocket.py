@@ -0,0 +1,46 @@
+"""Socket de chat: latido y reaping mientras un turno espera a los agentes"""
+from fastapi.testclient import TestClient
+import pytest
+
+from api.connections import ConnectionManager
+from core.broker import InMemoryBroker
+
+def chat_until_reply(websocket) -> tuple:
+    """Responder a los pings hasta recibir la respuesta del turno"""
+    pings = 0
+    while True:
+        message = websocket.receive_json()
+        if message["type"] == "ping":
+            pings += 1
+            websocket.send_json({"type": "pong"})
+        elif message["type"] == "message":
+            return message, pings
+        else:
+            pytest.fail(f"Trama inesperada: {message}")
+
+def test_turn_longer_than_heartbeat_keeps_socket_open(make_app):
+    # Un turno de 1 s frente a un latido de 0.1 s: sin leer pongs durante el
+    # turno, el reaper cerraría el socket con 1001 antes de la respuesta
+    connections = ConnectionManager(InMemoryBroker(), ping_interval=0.1, idle_timeout=0.3, reap_interval=0.02)
+    with TestClient(make_app(connections, delay=1.0)) as client:
+        with client.websocket_connect("/chat/s1") as websocket:
+            websocket.send_json({"text": "hola", "timestamp": "2024-01-01T00:00:00"})
+            reply, pings = chat_until_reply(websocket)
+            assert reply["data"]["response"] == "eco: hola"
+            assert pings >= 5
+            
+            # El socket sigue sirviendo turnos después
+            websocket.send_json({"text": "otra", "timestamp": "2024-01-01T00:00:01"})
+            reply, _ = chat_until_reply(websocket)
+            assert reply["data"]["response"] == "eco: otra"
+        
+        assert connections.stats()["reaped"] == {"idle": 0, "heartbeat": 0}
+
+def test_turns_are_answered_in_order(make_app):
+    connections = ConnectionManager(InMemoryBroker(), ping_interval=0, reap_interval=0)
+    with TestClient(make_app(connections, delay=0.05)) as client:
+        with client.websocket_connect("/chat/s1") as websocket:
+            for i in range(3):
+                websocket.send_json({"text": str(i), "timestamp": "2024-01-01T00:00:00"})
+            replies = [chat_until_reply(websocket)[0]["data"]["response"] for _ in range(3)]
+    assert replies == ["eco: 0", "eco: 1", "eco: 2"]
\ No newline at end of file
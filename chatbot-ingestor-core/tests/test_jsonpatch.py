@@ -0,0 +1,125 @@
+"""JSON Patch de contexto: ida y vuelta, deltas por socket y reenvío completo ante un salto"""
+from datetime import datetime
+import copy
+
+import pytest
+
+from core.context import ContextStream
+from core.exceptions import AgentInvocationError
+from core.jsonpatch import apply_patch, make_patch
+from core.orchestrator import AgentOrchestrator
+
+OLD = {
+    "data": {"company_name": "ACME", "sector": None, "a/b": 1, "x~y": 2},
+    "validation_state": {"company_name": {"is_valid": True}},
+    "tags": ["a", "b"],
+    "removed": True
+}
+NEW = {
+    "data": {"company_name": "ACME Corp", "sector": "retail", "a/b": 3, "x~y": 2, "employees": 40},
+    "validation_state": {"company_name": {"is_valid": True}, "sector": {"is_valid": True}},
+    "tags": ["a", "b", "c"]
+}
+
+def test_patch_round_trip():
+    before = copy.deepcopy(OLD)
+    patch = make_patch(OLD, NEW)
+    
+    assert apply_patch(OLD, patch) == NEW
+    assert OLD == before
+    assert make_patch(NEW, NEW) == []
+    assert {"op": "remove", "path": "/removed"} in patch
+    # Las claves con "/" y "~" se escapan según RFC 6901
+    assert {"op": "replace", "path": "/data/a~1b", "value": 3} in patch
+
+def test_patch_distinguishes_types():
+    assert make_patch({"v": 1}, {"v": True}) == [{"op": "replace", "path": "/v", "value": True}]
+
+def test_patch_on_wrong_base_fails():
+    patch = make_patch(OLD, NEW)
+    with pytest.raises(ValueError, match="Ruta de patch inválida"):
+        apply_patch({"data": {}}, patch)
+    with pytest.raises(ValueError, match="no soportada"):
+        apply_patch(OLD, [{"op": "move", "from": "/tags", "path": "/labels"}])
+
+def context(version: int, **data) -> dict:
+    return {
+        "session_id": "s1",
+        "user_role": "analyst",
+        "tenant_id": "t1",
+        "created_at": datetime(2024, 1, 1),
+        "context_version": version,
+        "data": data,
+        "validation_state": {},
+        "agent_triggers": {}
+    }
+
+def test_context_stream_deltas_apply_on_the_client():
+    stream = ContextStream()
+    first = stream.snapshot(context(1, company_name="ACME"), {"general": 0.5})
+    client_version, client_context = first["context_version"], first["context"]
+    assert client_context["tenant_id"] == "t1"
+    
+    for version, fields in ((2, {"company_name": "ACME", "sector": "retail"}), (3, {"sector": "retail"})):
+        delta = stream.delta(context(version, **fields), {"general": 1.0})
+        assert delta["base_version"] == client_version
+        client_context = apply_patch(client_context, delta["patch"])
+        client_version = delta["context_version"]
+    
+    assert client_version == 3
+    assert client_context == stream.snapshot(context(3, sector="retail"), {"general": 1.0})["context"]
+
+def test_context_stream_resync_after_a_version_gap():
+    stream = ContextStream()
+    stream.snapshot(context(1, company_name="ACME"), {})
+    stream.delta(context(2, company_name="ACME Corp"), {})
+    # El cliente perdió el delta 2 (sigue en la versión 1): el siguiente no aplica sobre su base
+    delta = stream.delta(context(3, company_name="ACME Corp", sector="retail"), {})
+    assert delta["base_version"] == 2
+    
+    # Pide resync y recibe el estado completo, base de los deltas siguientes
+    resync = stream.snapshot(context(3, company_name="ACME Corp", sector="retail"), {})
+    assert resync["context_version"] == 3
+    following = stream.delta(context(4, company_name="ACME Corp", sector="food"), {})
+    assert following["base_version"] == 3
+    assert apply_patch(resync["context"], following["patch"])["data"]["sector"] == "food"
+
+class DeltaAgent:
+    """Agente HTTP simulado que guarda la última base por sesión, como ContextCache"""
+    
+    def __init__(self):
+        self.contexts = {}
+        self.received = []
+    
+    async def send(self, agent_name, endpoint, payload, timeout=None):
+        delta = payload.get("context_delta")
+        if delta is None:
+            self.received.append("full")
+            self.contexts[payload["session_id"]] = (payload["context_digest"], {k: v for k, v in payload.items() if k != "context_digest"})
+        else:
+            base = self.contexts.get(payload["session_id"])
+            if base is None or base[0] != delta["base_digest"]:
+                raise AgentInvocationError(agent_name, "Contexto base no disponible", status=409, retryable=False)
+            self.received.append("delta")
+            self.contexts[payload["session_id"]] = (delta["digest"], apply_patch(base[1], delta["patch"]))
+        return {"success": True, "seen": self.contexts[payload["session_id"]][1]["data"]}
+
+async def test_orchestrator_resends_full_context_when_agent_lost_the_base():
+    orchestrator = AgentOrchestrator()
+    agent = DeltaAgent()
+    orchestrator._http_transport.send = agent.send
+    await orchestrator.register_agent("analyzer", {"completion_threshold": 0}, "http://analyzer/execute", delta=True, cacheable=False)
+    
+    try:
+        await orchestrator.invoke_agent("analyzer", {"session_id": "s1", "data": {"a": 1}})
+        result = await orchestrator.invoke_agent("analyzer", {"session_id": "s1", "data": {"a": 2}})
+        assert result["seen"] == {"a": 2}
+        
+        # El agente se reinicia y pierde su caché: el delta siguiente tiene un salto
+        agent.contexts.clear()
+        result = await orchestrator.invoke_agent("analyzer", {"session_id": "s1", "data": {"a": 3}})
+        assert result["seen"] == {"a": 3}
+        assert agent.received == ["full", "delta", "full"]
+        assert orchestrator.delta_stats()["mismatches"] == 1
+    finally:
+        await orchestrator.close()
\ No newline at end of file
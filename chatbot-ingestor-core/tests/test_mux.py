@@ -0,0 +1,123 @@
+"""Socket multiplexado: sesiones en paralelo, orden por sesión y tramas inválidas"""
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from api.connections import ConnectionManager, MultiplexedSessions
+from api.models.schemas import MuxControl
+from core.broker import InMemoryBroker
+
+class RecordingWriter:
+    def __init__(self):
+        self.sent = []
+        self.in_flight = 0
+    
+    def send(self, message):
+        self.sent.append(message)
+
+def close(session_id: str) -> MuxControl:
+    return MuxControl(type="close", session_id=session_id)
+
+async def test_sessions_run_in_parallel_but_frames_of_a_session_in_order():
+    log, active = [], set()
+    
+    async def handler(session_id, frame):
+        assert session_id not in active
+        active.add(session_id)
+        log.append(("start", session_id, frame))
+        await asyncio.sleep(0.02)
+        log.append(("end", session_id, frame))
+        active.discard(session_id)
+    
+    sessions = MultiplexedSessions(RecordingWriter(), handler)
+    for session_id in ("a", "b"):
+        assert sessions.open(session_id)
+        sessions.submit(session_id, 1)
+        sessions.submit(session_id, 2)
+    await asyncio.sleep(0.1)
+    
+    assert [frame for event, session_id, frame in log if event == "start" and session_id == "a"] == [1, 2]
+    # La segunda sesión arrancó antes de que terminara el primer turno de la primera
+    assert log.index(("start", "b", 1)) < log.index(("end", "a", 1))
+    assert sessions.processed == 4
+    await sessions.cancel()
+
+async def test_backpressure_and_session_limit():
+    release = asyncio.Event()
+    
+    async def handler(session_id, frame):
+        await release.wait()
+    
+    sessions = MultiplexedSessions(RecordingWriter(), handler, max_sessions=1, max_pending=2)
+    assert sessions.open("a")
+    assert not sessions.open("b")
+    sessions.submit("a", 0)
+    await asyncio.sleep(0)
+    assert sessions.submit("a", 1) and sessions.submit("a", 2)
+    assert not sessions.submit("a", 3)
+    # `close` se admite siempre
+    assert sessions.submit("a", close("a"))
+    assert sessions.backpressure == 1
+    release.set()
+    await asyncio.sleep(0.01)
+    await sessions.cancel()
+
+async def test_reopen_while_closing_waits_for_the_previous_worker():
+    log, active = [], set()
+    
+    async def handler(session_id, frame):
+        assert session_id not in active, "dos tareas procesando la misma sesión"
+        active.add(session_id)
+        await asyncio.sleep(0.02)
+        log.append(frame if not isinstance(frame, MuxControl) else frame.type)
+        active.discard(session_id)
+    
+    sessions = MultiplexedSessions(RecordingWriter(), handler)
+    sessions.open("a")
+    sessions.submit("a", 1)
+    sessions.submit("a", close("a"))
+    assert "a" not in sessions
+    sessions.open("a")
+    sessions.submit("a", 2)
+    await asyncio.sleep(0.15)
+    
+    assert log == [1, "close", 2]
+    await sessions.cancel()
+
+async def test_handler_errors_are_reported_on_the_session_only():
+    writer = RecordingWriter()
+    
+    async def handler(session_id, frame):
+        if frame == "boom":
+            raise RuntimeError("fallo del turno")
+        writer.send({"type": "ok", "session_id": session_id})
+    
+    sessions = MultiplexedSessions(writer, handler)
+    sessions.open("a")
+    sessions.submit("a", "boom")
+    sessions.submit("a", "fine")
+    await asyncio.sleep(0.01)
+    
+    assert [(m["type"], m["session_id"]) for m in writer.sent] == [("error", "a"), ("ok", "a")]
+    assert writer.sent[0]["data"]["error"] == "fallo del turno"
+    await sessions.cancel()
+
+def test_malformed_frame_leaves_the_socket_open(make_app):
+    connections = ConnectionManager(InMemoryBroker(), ping_interval=0, reap_interval=0)
+    with TestClient(make_app(connections)) as client:
+        with client.websocket_connect("/mux") as websocket:
+            websocket.send_text("{no es json")
+            error = websocket.receive_json()
+            assert error["type"] == "error" and error["data"]["code"] == "invalid_frame"
+            
+            websocket.send_json({"session_id": "s1", "text": "sin timestamp"})
+            assert websocket.receive_json()["data"]["code"] == "invalid_frame"
+            
+            # Las sesiones siguen funcionando por el mismo socket
+            websocket.send_json({"session_id": "s1", "text": "hola", "timestamp": "2024-01-01T00:00:00"})
+            reply = websocket.receive_json()
+            assert (reply["type"], reply["session_id"], reply["data"]["response"]) == ("message", "s1", "eco: hola")
+            
+            websocket.send_json({"type": "close", "session_id": "s1"})
+            closed = websocket.receive_json()
+            assert (closed["type"], closed["session_id"]) == ("closed", "s1")
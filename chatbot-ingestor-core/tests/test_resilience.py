@@ -0,0 +1,132 @@
+"""Circuito, reintentos y hedging de las invocaciones de agentes"""
+import asyncio
+import time
+
+import pytest
+
+from core.exceptions import AgentInvocationError, AgentUnavailableError
+from core.orchestrator import AgentOrchestrator
+from core.resilience import CircuitBreaker, RetryPolicy
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=60)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    
+    breaker.record_success()
+    assert breaker.consecutive_failures == 0
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+
+def test_breaker_half_opens_with_a_single_probe(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30)
+    breaker.record_failure()
+    assert not breaker.allow()
+    
+    now[0] += 30
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Solo una sonda a la vez
+    assert not breaker.allow()
+    
+    # Sonda fallida: vuelve a abrirse y espera otro recovery_timeout
+    breaker.record_failure()
+    assert breaker.is_open and not breaker.allow()
+    now[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+def test_cancelled_probe_is_released():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+class FlakyEndpoint:
+    """Respuestas programadas: excepciones, segundos de espera o resultados"""
+    
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+    
+    async def send(self, agent_name, endpoint, payload, timeout=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else {"success": True}
+        if isinstance(outcome, float):
+            await asyncio.sleep(outcome)
+            return {"success": True, "slow": True}
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+async def orchestrator_with(endpoint: FlakyEndpoint, **options) -> AgentOrchestrator:
+    orchestrator = AgentOrchestrator(retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001), **options)
+    orchestrator._http_transport.send = endpoint.send
+    return orchestrator
+
+def transient() -> AgentInvocationError:
+    return AgentInvocationError("agent", "HTTP 503", status=503)
+
+async def test_idempotent_calls_retry_transient_errors():
+    endpoint = FlakyEndpoint(transient(), transient(), {"success": True, "n": 1})
+    orchestrator = await orchestrator_with(endpoint)
+    await orchestrator.register_agent("agent", {"completion_threshold": 0}, "http://agents/agent", cacheable=False)
+    
+    assert await orchestrator.invoke_agent("agent", {"session_id": "s1"}) == {"success": True, "n": 1}
+    metrics = orchestrator.metrics()["agent"]
+    assert (endpoint.calls, metrics["retries"], metrics["failures"], metrics["circuit"]) == (3, 2, 2, "closed")
+    await orchestrator.close()
+
+async def test_non_retryable_and_non_idempotent_calls_fail_fast():
+    endpoint = FlakyEndpoint(AgentInvocationError("agent", "HTTP 422", status=422, retryable=False), transient())
+    orchestrator = await orchestrator_with(endpoint)
+    await orchestrator.register_agent("agent", {"completion_threshold": 0}, "http://agents/agent", cacheable=False)
+    await orchestrator.register_agent("writer", {"completion_threshold": 0}, "http://agents/writer", cacheable=False, idempotent=False)
+    
+    with pytest.raises(AgentInvocationError, match="422"):
+        await orchestrator.invoke_agent("agent", {"session_id": "s1"})
+    with pytest.raises(AgentInvocationError, match="503"):
+        await orchestrator.invoke_agent("writer", {"session_id": "s1"})
+    assert endpoint.calls == 2
+    # Un 4xx demuestra que el agente responde: no cuenta para el circuito
+    assert orchestrator.metrics()["agent"]["consecutive_failures"] == 0
+    await orchestrator.close()
+
+async def test_open_circuit_rejects_without_calling_the_agent():
+    endpoint = FlakyEndpoint(*[transient()] * 4)
+    orchestrator = await orchestrator_with(endpoint, failure_threshold=2, recovery_timeout=60)
+    await orchestrator.register_agent("agent", {"completion_threshold": 0}, "http://agents/agent", cacheable=False)
+    
+    with pytest.raises(AgentInvocationError):
+        await orchestrator.invoke_agent("agent", {"session_id": "s1"})
+    assert endpoint.calls == 2
+    with pytest.raises(AgentUnavailableError):
+        await orchestrator.invoke_agent("agent", {"session_id": "s1"})
+    assert endpoint.calls == 2
+    assert orchestrator.metrics()["agent"]["circuit"] == "open"
+    await orchestrator.close()
+
+async def test_slow_call_is_hedged_and_the_hedge_wins():
+    endpoint = FlakyEndpoint(*[{"success": True}] * 3, 1.0, {"success": True, "hedge": True})
+    orchestrator = await orchestrator_with(endpoint, hedge_min_samples=3)
+    await orchestrator.register_agent("agent", {"completion_threshold": 0}, "http://agents/agent", cacheable=False, hedge=True)
+    for _ in range(3):
+        await orchestrator.invoke_agent("agent", {"session_id": "s1"})
+    
+    start = time.monotonic()
+    result = await orchestrator.invoke_agent("agent", {"session_id": "s1"})
+    
+    assert result == {"success": True, "hedge": True}
+    assert time.monotonic() - start < 0.5
+    metrics = orchestrator.metrics()["agent"]
+    assert (metrics["hedged"], metrics["hedge_wins"]) == (1, 1)
+    await orchestrator.close()
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""Ejecución del grafo `depends_on` de agentes (AgentScheduler)"""
+import asyncio
+
+import pytest
+
+from core.orchestrator import AgentOrchestrator
+from core.scheduler import AgentScheduler
+
+class RecordingAgent:
+    """Agente local que anota el orden de ejecución y el contexto recibido"""
+    
+    def __init__(self, name: str, log: list, delay: float = 0.0, fail: bool = False):
+        self.name = name
+        self.log = log
+        self.delay = delay
+        self.fail = fail
+        self.contexts = []
+    
+    async def execute(self, context):
+        self.contexts.append(context)
+        self.log.append(("start", self.name))
+        await asyncio.sleep(self.delay)
+        self.log.append(("end", self.name))
+        if self.fail:
+            raise ValueError(f"{self.name} falla")
+        return {"success": True, "agent": self.name}
+
+@pytest.fixture
+async def orchestrator():
+    orchestrator = AgentOrchestrator()
+    yield orchestrator
+    await orchestrator.close()
+
+async def register(orchestrator: AgentOrchestrator, name: str, log: list, depends_on=(), **options) -> RecordingAgent:
+    agent = RecordingAgent(name, log, **options)
+    spec = {"depends_on": list(depends_on)} if depends_on else {"completion_threshold": 0}
+    await orchestrator.register_agent(name, spec, f"inprocess://{name}", cacheable=False)
+    orchestrator.bind_local_agent(name, agent)
+    return agent
+
+def position(log: list, event: str, name: str) -> int:
+    return log.index((event, name))
+
+async def test_cycle_raises(orchestrator):
+    log = []
+    await register(orchestrator, "a", log, depends_on=["c"])
+    await register(orchestrator, "b", log, depends_on=["a"])
+    await register(orchestrator, "c", log, depends_on=["b"])
+    scheduler = AgentScheduler(orchestrator)
+    
+    with pytest.raises(ValueError, match="cíclicas"):
+        scheduler.build_levels(["a", "b", "c"])
+    with pytest.raises(ValueError, match="cíclicas"):
+        await scheduler.run({"session_id": "s1"})
+    assert log == []
+
+async def test_dependents_run_after_their_dependencies(orchestrator):
+    log = []
+    await register(orchestrator, "fetch", log, delay=0.02)
+    await register(orchestrator, "other", log, delay=0.01)
+    await register(orchestrator, "analyze", log, depends_on=["fetch"])
+    report_agent = await register(orchestrator, "report", log, depends_on=["analyze", "other"])
+    
+    report = await AgentScheduler(orchestrator).run({"session_id": "s1", "agent_triggers": {}})
+    
+    assert report.levels == [["fetch", "other"], ["analyze"], ["report"]]
+    assert not report.errors and not report.skipped
+    assert position(log, "end", "fetch") < position(log, "start", "analyze")
+    assert position(log, "end", "analyze") < position(log, "start", "report")
+    assert position(log, "end", "other") < position(log, "start", "report")
+    # Los independientes del primer nivel arrancan juntos
+    assert {position(log, "start", "fetch"), position(log, "start", "other")} == {0, 1}
+    # El dependiente recibe los resultados de sus dependencias en agent_triggers
+    triggers = report_agent.contexts[0]["agent_triggers"]
+    assert triggers["analyze"] == {"status": "completed", "result": {"success": True, "agent": "analyze"}}
+    assert report.critical_path == ["fetch", "analyze", "report"]
+
+async def test_failed_dependency_skips_dependents(orchestrator):
+    log = []
+    await register(orchestrator, "fetch", log, fail=True)
+    await register(orchestrator, "analyze", log, depends_on=["fetch"])
+    
+    report = await AgentScheduler(orchestrator).run({"session_id": "s1"})
+    
+    assert "fetch" in report.errors
+    assert report.skipped == ["analyze"]
+    assert ("start", "analyze") not in log
+
+async def test_include_dependents_schedules_transitive_dependents(orchestrator):
+    log = []
+    await register(orchestrator, "fetch", log)
+    await register(orchestrator, "analyze", log, depends_on=["fetch"])
+    await register(orchestrator, "report", log, depends_on=["analyze"])
+    await register(orchestrator, "unrelated", log)
+    persisted = []
+    
+    async def on_result(name, entry):
+        persisted.append(name)
+    
+    report = await AgentScheduler(orchestrator).run(
+        {"session_id": "s1", "agent_triggers": {}},
+        agent_names=["fetch"],
+        include_dependents=True,
+        on_result=on_result
+    )
+    
+    assert report.levels == [["fetch"], ["analyze"], ["report"]]
+    assert persisted == ["fetch", "analyze", "report"]
+    assert ("start", "unrelated") not in log
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""Cola de salida acotada de los sockets de chat (SocketWriter)"""
+import asyncio
+
+import pytest
+
+from api.connections import SLOW_CONSUMER_CLOSE_CODE, SocketWriter
+from core import wire
+
+class FakeSocket:
+    """WebSocket que retiene los envíos hasta que se abre `gate`"""
+    
+    def __init__(self, send_delay: float = 0.0):
+        self.sent = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.send_delay = send_delay
+    
+    async def send_text(self, text: str):
+        await self.gate.wait()
+        await asyncio.sleep(self.send_delay)
+        self.sent.append(wire.loads(text))
+    
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+def status(agent: str, seq: int) -> dict:
+    return {"type": "status", "data": {"agent": agent, "seq": seq}}
+
+async def test_messages_are_sent_in_order_and_flushed_on_close():
+    socket = FakeSocket()
+    writer = SocketWriter(socket, max_size=8)
+    writer.start()
+    for i in range(5):
+        assert writer.send({"type": "message", "data": {"i": i}})
+    await writer.close(flush=True)
+    
+    assert [message["data"]["i"] for message in socket.sent] == [0, 1, 2, 3, 4]
+    assert not writer.send({"type": "message", "data": {}})
+
+async def test_coalesce_replaces_queued_status_in_place():
+    socket = FakeSocket()
+    socket.gate.clear()
+    writer = SocketWriter(socket, max_size=8, policy="coalesce")
+    writer.start()
+    writer.send({"type": "message", "data": {"i": 0}})
+    await asyncio.sleep(0)
+    writer.send(status("a", 1))
+    writer.send(status("b", 1))
+    writer.send({"type": "message", "data": {"i": 1}})
+    writer.send(status("a", 2))
+    
+    socket.gate.set()
+    await writer.close(flush=True)
+    # El estado nuevo de `a` ocupa el hueco del antiguo, por delante de mensajes posteriores
+    assert [(m["type"], m["data"].get("agent"), m["data"].get("seq", m["data"].get("i"))) for m in socket.sent] == [
+        ("message", None, 0), ("status", "a", 2), ("status", "b", 1), ("message", None, 1)
+    ]
+    assert writer.coalesced == 1
+
+async def test_snapshot_with_later_deltas_is_not_replaced():
+    socket = FakeSocket()
+    socket.gate.clear()
+    writer = SocketWriter(socket, max_size=8, policy="coalesce")
+    writer.start()
+    writer.send({"type": "message", "data": {}})
+    await asyncio.sleep(0)
+    writer.send({"type": "snapshot", "data": {"context_version": 1}})
+    writer.send({"type": "delta", "data": {"base_version": 1, "context_version": 2}})
+    writer.send({"type": "snapshot", "data": {"context_version": 3}})
+    
+    socket.gate.set()
+    await writer.close(flush=True)
+    assert [m["type"] for m in socket.sent] == ["message", "snapshot", "delta", "snapshot"]
+    assert writer.coalesced == 0
+
+async def test_drop_oldest_discards_status_events_first():
+    socket = FakeSocket()
+    socket.gate.clear()
+    writer = SocketWriter(socket, max_size=3, policy="drop_oldest")
+    writer.start()
+    writer.send({"type": "message", "data": {"i": 0}})
+    await asyncio.sleep(0)
+    writer.send(status("a", 1))
+    writer.send({"type": "message", "data": {"i": 1}})
+    writer.send(status("a", 2))
+    assert writer.send({"type": "message", "data": {"i": 2}})
+    
+    socket.gate.set()
+    await writer.close(flush=True)
+    assert writer.dropped == 1
+    assert [m["data"].get("seq", m["data"].get("i")) for m in socket.sent] == [0, 1, 2, 2]
+    assert socket.closed_with is None
+
+@pytest.mark.parametrize("policy", ["disconnect", "drop_oldest"])
+async def test_full_queue_without_room_closes_the_slow_consumer(policy):
+    socket = FakeSocket()
+    socket.gate.clear()
+    writer = SocketWriter(socket, max_size=2, policy=policy)
+    writer.start()
+    for i in range(3):
+        assert writer.send({"type": "message", "data": {"i": i}})
+        await asyncio.sleep(0)
+    
+    assert not writer.send({"type": "message", "data": {"i": 3}})
+    await writer.close(flush=False)
+    assert writer.slow_consumer
+    assert socket.closed_with == SLOW_CONSUMER_CLOSE_CODE
+
+async def test_send_timeout_closes_the_slow_consumer():
+    socket = FakeSocket()
+    socket.gate.clear()
+    writer = SocketWriter(socket, send_timeout=0.05)
+    writer.start()
+    writer.send({"type": "message", "data": {}})
+    await asyncio.sleep(0.1)
+    
+    assert writer.slow_consumer and writer.closed
+    await writer.close()
+    assert socket.closed_with == SLOW_CONSUMER_CLOSE_CODE
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""Condiciones de disparo compiladas, índice de observación y cambios de estado de agentes"""
+import pytest
+
+from core.ingestor import ChatbotIngestor
+from core.orchestrator import AgentOrchestrator
+from core.triggers import WATCH_ALL, compile_trigger
+from core.validation import ValidationEngine
+
+def test_compiled_spec_combines_keys_with_and():
+    trigger = compile_trigger({
+        "completion_threshold": 0.5,
+        "required_fields_present": True,
+        "fields_equal": {"country": "ES"}
+    }, required_fields=["company_name"])
+    
+    assert trigger.watches == {"data.*", "completion_status", "data.company_name", "data.country"}
+    assert trigger({"data": {"company_name": "ACME", "country": "ES"}})
+    assert not trigger({"data": {"company_name": "ACME", "country": "FR"}})
+    assert not trigger({"data": {"company_name": None, "country": "ES", "x": 1}})
+
+def test_agent_completion_keys_become_dependencies():
+    trigger = compile_trigger({"primary_complete": True, "depends_on": ["market"]})
+    
+    assert trigger.depends_on == ["market", "primary"]
+    assert trigger.watches == {"agent_triggers.primary", "agent_triggers.market"}
+    assert not trigger({"agent_triggers": {"primary": {"status": "completed"}}})
+    assert trigger({"agent_triggers": {"primary": {"status": "completed"}, "market": {"status": "completed"}}})
+    assert not trigger({"agent_triggers": {"primary": {"status": "failed"}, "market": {"status": "completed"}}})
+
+def test_nested_specs_and_invalid_keys():
+    trigger = compile_trigger({"any": [{"fields_equal": {"plan": "pro"}}, {"not": {"report_complete": True}}]})
+    assert trigger.depends_on == []
+    assert trigger.watches == {"data.plan", "agent_triggers.report"}
+    assert trigger({"data": {"plan": "free"}, "agent_triggers": {}})
+    assert not trigger({"data": {"plan": "free"}, "agent_triggers": {"report": {"status": "completed"}}})
+    
+    with pytest.raises(ValueError, match="no soportada"):
+        compile_trigger({"unknown_key": 1})
+    with pytest.raises(ValueError, match="required_fields"):
+        compile_trigger({"required_fields_present": True})
+
+async def test_check_triggers_only_evaluates_watchers_of_changed_paths():
+    orchestrator = AgentOrchestrator()
+    evaluated = []
+    
+    def opaque(context):
+        evaluated.append("opaque")
+        return True
+    
+    await orchestrator.register_agent("company", {"required_fields": ["company_name"]}, "http://agents/company")
+    await orchestrator.register_agent("sector", {"fields_equal": {"sector": "retail"}}, "http://agents/sector")
+    await orchestrator.register_agent("opaque", opaque, "http://agents/opaque")
+    assert orchestrator.registered_agents["opaque"].watches == frozenset({WATCH_ALL})
+    
+    context = {"data": {"company_name": "ACME", "sector": "retail"}}
+    assert await orchestrator.check_triggers(context, changed=["data.company_name"]) == ["company", "opaque"]
+    assert await orchestrator.check_triggers(context) == ["company", "sector", "opaque"]
+    assert evaluated == ["opaque", "opaque"]
+    await orchestrator.close()
+
+class MemoryContext:
+    """ContextManager en memoria con la interfaz que usa ChatbotIngestor"""
+    
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.agent_triggers = {}
+    
+    async def get_context(self, session_id: str):
+        return {"session_id": session_id, "data": {"company_name": "ACME"}, "agent_triggers": dict(self.agent_triggers)}
+    
+    async def update_agent_trigger(self, session_id: str, agent_name: str, **fields):
+        self.agent_triggers[agent_name] = {**self.agent_triggers.get(agent_name, {}), **fields}
+        return self.agent_triggers[agent_name]
+    
+    async def release(self):
+        pass
+
+class EchoAgent:
+    def __init__(self, name: str, calls: list):
+        self.name = name
+        self.calls = calls
+    
+    async def execute(self, context):
+        self.calls.append(self.name)
+        return {"success": True, "agent": self.name}
+
+async def make_ingestor(calls: list) -> ChatbotIngestor:
+    orchestrator = AgentOrchestrator()
+    # `reviewer` observa agent_triggers.primary sin depender de él (dentro de `any`)
+    specs = {
+        "primary": {"required_fields": ["company_name"]},
+        "secondary": {"primary_complete": True},
+        "reviewer": {"any": [{"primary_complete": True}]}
+    }
+    for name, spec in specs.items():
+        await orchestrator.register_agent(name, spec, f"inprocess://{name}", cacheable=False)
+        orchestrator.bind_local_agent(name, EchoAgent(name, calls))
+    return ChatbotIngestor(MemoryContext("s1"), ValidationEngine(), orchestrator)
+
+async def test_agent_results_trigger_agents_watching_agent_state():
+    calls = []
+    ingestor = await make_ingestor(calls)
+    context = await ingestor.context.get_context("s1")
+    
+    entries = await ingestor.run_agents("s1", context, ["primary"])
+    
+    assert calls[0] == "primary" and sorted(calls[1:]) == ["reviewer", "secondary"]
+    assert {name: entry["status"] for name, entry in entries.items()} == {
+        "primary": "completed", "secondary": "completed", "reviewer": "completed"
+    }
+    await ingestor.orchestrator.close()
+
+async def test_state_from_the_api_triggers_watchers_but_not_the_source():
+    calls = []
+    ingestor = await make_ingestor(calls)
+    await ingestor.context.update_agent_trigger("s1", "primary", status="completed", result={})
+    
+    entries = await ingestor.agent_state_changed("s1", ["primary"])
+    
+    assert sorted(entries) == ["reviewer", "secondary"]
+    assert "primary" not in calls
+    await ingestor.orchestrator.close()
\ No newline at end of file